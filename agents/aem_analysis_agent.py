@@ -3,10 +3,23 @@ AEM 分析 Agent
 负责分析 AEM 组件源代码
 支持结构化输出，优先分析重要文件（HTL, Dialog, JS）
 """
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from typing import Dict, List, Optional, Tuple
 from langchain_core.tools import tool
+from pydantic import BaseModel, Field
 from agents.base_agent import BaseAgent
 from tools import read_file, list_files
 from utils.schemas import FileAnalysisResult
+from utils.file_analysis_cache import file_analysis_cache
+from utils.llm_cache import cached_run
+from utils.model_router import model_router, tier_index
+from utils.static_analyzers import analyze_statically, has_static_analyzer
+from utils.parsers import coerce_structured_output
+from utils.prompt_cleaner import PromptCleaner
+from utils.source_minifier import remap_line_references
 from utils.aem_utils import (
     prioritize_aem_files,
     categorize_aem_files,
@@ -15,6 +28,76 @@ from utils.aem_utils import (
     extract_dialog_properties
 )
 
+logger = logging.getLogger(__name__)
+
+# 压缩后的内容在 prompt 中的说明
+MINIFIED_NOTE = " (minified: indentation, blank lines and comments removed)"
+
+_TIER_AGENT_LOCK = threading.Lock()
+
+AEM_ANALYSIS_SYSTEM_PROMPT = """You are an AEM (Adobe Experience Manager) expert analyst.
+Your task is to analyze AEM component source code files with focus on conversion to React.
+
+IMPORTANT ANALYSIS PRIORITIES:
+1. HTL Templates (*.html) - MOST CRITICAL
+   - Extract UI structure (HTML elements, structure hierarchy)
+   - Identify data-sly-* usage (data-sly-use, data-sly-repeat, data-sly-resource)
+   - Extract Sling Model references
+   - Identify UI patterns (buttons, forms, lists, cards, dialogs, etc.)
+   - Extract event handlers (onclick, onchange, etc.)
+   - Note conditional rendering logic
+
+2. Dialog XML (_cq_dialog.xml) - CRITICAL
+   - Extract all property definitions (fields, types, labels)
+   - Identify required vs optional fields
+   - Extract default values
+   - Note field types (textfield, textarea, select, checkbox, etc.)
+   - Extract tabs and field groups (for organizing props in React)
+
+3. JavaScript Files (*.js) - IMPORTANT
+   - Extract client-side interactions
+   - Identify event handlers and callbacks
+   - Note DOM manipulations
+   - Extract any data fetching logic
+   - Identify component lifecycle hooks usage
+
+4. Java Sling Models (*.java) - CRITICAL
+   - Extract class name and package
+   - Extract @Model annotation (resourceType, adaptables, adapters)
+   - Extract all fields with their types and annotations (@ValueMapValue, @Required, @NotNull, etc.)
+   - Extract @PostConstruct methods (data transformation logic)
+   - Extract getter methods (to understand field access)
+   - Extract validation rules (@Required, @NotNull, @Size, @Min, @Max, etc.)
+   - Note: This information is critical for generating accurate TypeScript interfaces
+   - Note: @PostConstruct methods need to be converted to React useEffect or useMemo hooks
+
+5. CSS Files (*.css) - Will be provided later
+   - Note: Styling approach will be handled separately
+
+For each file, provide:
+- File type (htl, dialog, js, java, css, etc.)
+- Purpose/functionality (what this file does)
+- Dependencies (components, services, resources referenced)
+- Key features and behaviors (UI elements, interactions)
+- Configuration details (props, settings, options)
+- Conversion notes (how this should be converted to React)
+
+Output format should be structured and clear for downstream agents."""
+
+BATCH_ANALYSIS_INSTRUCTIONS = """
+
+BATCH MODE:
+You will receive several small files from the same AEM component in one request.
+Analyze each file independently and return one analysis per file in the "analyses" list,
+in the same order as the input, with "file_path" exactly as given in the file header."""
+
+
+class FileAnalysisBatch(BaseModel):
+    """批量分析结果：每个输入文件一个 FileAnalysisResult"""
+    analyses: List[FileAnalysisResult] = Field(
+        description="One analysis per input file, in input order"
+    )
+
 
 @tool
 def analyze_htl_file(file_path: str) -> str:
@@ -41,7 +124,15 @@ def analyze_script_file(file_path: str) -> str:
 class AEMAnalysisAgent(BaseAgent):
     """AEM 分析 Agent - 逐个文件分析"""
 
-    def __init__(self):
+    # 分析 prompt 版本：修改系统提示词或 analyze_file 的提示模板后递增，使文件分析缓存失效
+    ANALYSIS_PROMPT_VERSION = "1"
+
+    def __init__(self, model_name: Optional[str] = None):
+        """
+        Args:
+            model_name: 使用的模型（None 表示 Config.LLM_MODEL）；
+                分析时按文件类型路由到其他档位的模型（见 utils.model_router）
+        """
         from tools import (
             list_files,
             search_files_by_pattern,
@@ -68,66 +159,208 @@ class AEMAnalysisAgent(BaseAgent):
             find_css_for_component_in_similar_paths
         ]
 
-        system_prompt = """You are an AEM (Adobe Experience Manager) expert analyst.
-Your task is to analyze AEM component source code files with focus on conversion to React.
-
-IMPORTANT ANALYSIS PRIORITIES:
-1. HTL Templates (*.html) - MOST CRITICAL
-   - Extract UI structure (HTML elements, structure hierarchy)
-   - Identify data-sly-* usage (data-sly-use, data-sly-repeat, data-sly-resource)
-   - Extract Sling Model references
-   - Identify UI patterns (buttons, forms, lists, cards, dialogs, etc.)
-   - Extract event handlers (onclick, onchange, etc.)
-   - Note conditional rendering logic
-
-2. Dialog XML (_cq_dialog.xml) - CRITICAL
-   - Extract all property definitions (fields, types, labels)
-   - Identify required vs optional fields
-   - Extract default values
-   - Note field types (textfield, textarea, select, checkbox, etc.)
-   - Extract tabs and field groups (for organizing props in React)
-
-3. JavaScript Files (*.js) - IMPORTANT
-   - Extract client-side interactions
-   - Identify event handlers and callbacks
-   - Note DOM manipulations
-   - Extract any data fetching logic
-   - Identify component lifecycle hooks usage
-
-4. Java Sling Models (*.java) - CRITICAL
-   - Extract class name and package
-   - Extract @Model annotation (resourceType, adaptables, adapters)
-   - Extract all fields with their types and annotations (@ValueMapValue, @Required, @NotNull, etc.)
-   - Extract @PostConstruct methods (data transformation logic)
-   - Extract getter methods (to understand field access)
-   - Extract validation rules (@Required, @NotNull, @Size, @Min, @Max, etc.)
-   - Note: This information is critical for generating accurate TypeScript interfaces
-   - Note: @PostConstruct methods need to be converted to React useEffect or useMemo hooks
-
-5. CSS Files (*.css) - Will be provided later
-   - Note: Styling approach will be handled separately
-
-For each file, provide:
-- File type (htl, dialog, js, java, css, etc.)
-- Purpose/functionality (what this file does)
-- Dependencies (components, services, resources referenced)
-- Key features and behaviors (UI elements, interactions)
-- Configuration details (props, settings, options)
-- Conversion notes (how this should be converted to React)
-
-Output format should be structured and clear for downstream agents."""
-
         super().__init__(
             name="AEMAnalysisAgent",
-            system_prompt=system_prompt,
+            system_prompt=AEM_ANALYSIS_SYSTEM_PROMPT,
             tools=tools,
+            model_name=model_name,
             temperature=0.2,
             output_schema=FileAnalysisResult  # 使用结构化输出
         )
+        self._tier_agents: Dict[str, BaseAgent] = {}
 
     def analyze_file(self, file_path: str) -> dict:
-        """分析单个文件并返回结构化结果"""
+        """
+        分析单个文件并返回结构化结果
+
+        配置类文件（.content.xml、_cq_editConfig.xml、clientlib 清单、CSS、.properties）
+        直接用规则解析；内容相同的文件（跨组件、跨运行）复用缓存的分析结果，不再调用模型
+        """
+        from config import Config
         file_content = read_file(file_path)
+        file_type, _ = identify_aem_file_type(file_path)
+
+        if Config.STATIC_ANALYSIS:
+            analysis = analyze_statically(file_path, file_content)
+            if analysis is not None:
+                logger.debug(f"Analyzed {file_path} statically")
+                return analysis
+
+        return file_analysis_cache.get_or_compute(
+            file_content,
+            file_type,
+            self.ANALYSIS_PROMPT_VERSION,
+            file_path,
+            compute=lambda: self._analyze_file_content(file_path, file_content)
+        )
+
+    def analyze_files(self, file_paths: List[str], max_concurrency: Optional[int] = None,
+                      batch_small_files: Optional[bool] = None) -> List[dict]:
+        """
+        并发分析多个文件
+
+        最多同时发起 max_concurrency 个 LLM 调用；返回结果与 file_paths 顺序一致
+        （调用方按 prioritize_aem_files 排好的顺序传入，下游 prompt 保持确定）。
+        开启批量分析时，同一组件的小文件按 token 预算合并为一次调用（见 plan_analysis_batches）。
+
+        Args:
+            file_paths: 文件路径列表（同一组件的文件）
+            max_concurrency: 最大并发数（None 表示使用 Config.ANALYSIS_CONCURRENCY）
+            batch_small_files: 是否批量分析小文件（None 表示使用 Config.ANALYSIS_BATCHING）
+
+        Returns:
+            分析结果列表（与 file_paths 一一对应）
+        """
+        from config import Config
+        if max_concurrency is None:
+            max_concurrency = Config.ANALYSIS_CONCURRENCY
+        if batch_small_files is None:
+            batch_small_files = Config.ANALYSIS_BATCHING
+
+        if batch_small_files and len(file_paths) > 1:
+            units = self.plan_analysis_batches(file_paths)
+        else:
+            units = [[(file_path, None, None)] for file_path in file_paths]
+
+        def analyze_unit(unit: List[Tuple[str, Optional[str], Optional[str]]]) -> List[dict]:
+            if len(unit) > 1:
+                return self._analyze_batch(unit)
+            return [self._analyze_file_safely(unit[0][0])]
+
+        if max_concurrency <= 1 or len(units) <= 1:
+            unit_results = [analyze_unit(unit) for unit in units]
+        else:
+            workers = min(max_concurrency, len(units))
+            logger.info(
+                f"Analyzing {len(file_paths)} files in {len(units)} calls with concurrency {workers}"
+            )
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aem-analysis") as executor:
+                # executor.map 按输入顺序返回结果
+                unit_results = list(executor.map(analyze_unit, units))
+
+        results_by_path = {}
+        for unit, analyses in zip(units, unit_results):
+            for (file_path, _, _), analysis in zip(unit, analyses):
+                results_by_path[file_path] = analysis
+        return [results_by_path[file_path] for file_path in file_paths]
+
+    def plan_analysis_batches(self, file_paths: List[str]) -> List[List[Tuple[str, Optional[str], Optional[str]]]]:
+        """
+        将文件划分为分析单元
+
+        不超过 Config.ANALYSIS_BATCH_FILE_TOKENS 的小文件（dialog、短 JS、短 HTL 片段等）按顺序装入批次，
+        每批总量不超过 Config.ANALYSIS_BATCH_TOKENS、文件数不超过 Config.ANALYSIS_BATCH_MAX_FILES；
+        大的 HTL、Java 文件、已缓存的文件和可规则分析的配置类文件单独处理。
+
+        Args:
+            file_paths: 文件路径列表
+
+        Returns:
+            分析单元列表，每个单元为 [(file_path, content, file_type), ...]
+        """
+        from config import Config
+        from utils.token_budget import estimate_tokens
+
+        units = []
+        batch = []
+        batch_tokens = 0
+
+        def flush():
+            nonlocal batch, batch_tokens
+            if len(batch) == 1:
+                # 单个文件走常规分析（带类型专用提示）
+                units.append([(batch[0][0], None, None)])
+            elif batch:
+                units.append(batch)
+            batch = []
+            batch_tokens = 0
+
+        for file_path in file_paths:
+            if Config.STATIC_ANALYSIS and has_static_analyzer(file_path):
+                # 规则分析不需要调用模型
+                units.append([(file_path, None, None)])
+                continue
+
+            content = read_file(file_path)
+            file_type, _ = identify_aem_file_type(file_path)
+            tokens = estimate_tokens(content)
+            cache_key = file_analysis_cache.make_key(content, file_type, self.ANALYSIS_PROMPT_VERSION)
+
+            if tokens > Config.ANALYSIS_BATCH_FILE_TOKENS or file_analysis_cache.get(cache_key) is not None:
+                units.append([(file_path, None, None)])
+                continue
+
+            if batch and (batch_tokens + tokens > Config.ANALYSIS_BATCH_TOKENS
+                          or len(batch) >= Config.ANALYSIS_BATCH_MAX_FILES):
+                flush()
+            batch.append((file_path, content, file_type))
+            batch_tokens += tokens
+
+        flush()
+        return units
+
+    def agent_for_model(self, model_name: str) -> "AEMAnalysisAgent":
+        """指定模型的分析 Agent（与当前模型相同时返回自身，其余按需创建并复用）"""
+        if model_name == self.model_name:
+            return self
+        with _TIER_AGENT_LOCK:
+            agent = self._tier_agents.get(model_name)
+            if agent is None:
+                agent = self._tier_agents[model_name] = AEMAnalysisAgent(model_name=model_name)
+        return agent
+
+    def batch_agent_for_model(self, model_name: str) -> "AEMBatchAnalysisAgent":
+        """指定模型的批量分析 Agent（输出 schema 不同，按需创建并复用）"""
+        key = f"batch:{model_name}"
+        with _TIER_AGENT_LOCK:
+            agent = self._tier_agents.get(key)
+            if agent is None:
+                agent = self._tier_agents[key] = AEMBatchAnalysisAgent(model_name=model_name)
+        return agent
+
+    def _analyze_batch(self, batch: List[Tuple[str, str, str]]) -> List[dict]:
+        """批量分析一组小文件，模型未返回的文件退回单独分析"""
+        # 批次使用其中要求最高的档位
+        tier = max(
+            (model_router.select_tier(node='analyze_aem_files', file_path=file_path, content=content)
+             for file_path, content, _ in batch),
+            key=tier_index
+        )
+        try:
+            analyses = self.batch_agent_for_model(model_router.model_for(tier)).analyze_batch(batch)
+        except Exception as e:
+            logger.warning(f"Batch analysis of {len(batch)} files failed, analyzing individually: {e}")
+            analyses = {}
+
+        results = []
+        for file_path, content, file_type in batch:
+            analysis = analyses.get(file_path)
+            if analysis is None:
+                results.append(self._analyze_file_safely(file_path))
+                continue
+            cache_key = file_analysis_cache.make_key(content, file_type, self.ANALYSIS_PROMPT_VERSION)
+            file_analysis_cache.put(cache_key, analysis)
+            results.append(analysis)
+        return results
+
+    def _analyze_file_safely(self, file_path: str) -> dict:
+        """分析单个文件，异常时返回错误结果而不是抛出"""
+        try:
+            return self.analyze_file(file_path)
+        except Exception as e:
+            logger.error(f"Error analyzing file {file_path}: {e}")
+            return {
+                "file_path": file_path,
+                "file_type": "unknown",
+                "purpose": f"Error: {str(e)}",
+                "dependencies": [],
+                "key_features": [],
+                "configuration": {},
+                "analysis": f"Error analyzing file: {str(e)}"
+            }
+
+    def _analyze_file_content(self, file_path: str, file_content: str) -> dict:
+        """调用模型分析文件内容"""
         file_type, priority = identify_aem_file_type(file_path)
 
         # 根据文件类型构建针对性的提示
@@ -286,22 +519,35 @@ Focus on extracting:
 This information is critical for generating accurate TypeScript interfaces.
 """
 
+        prompt_content, line_map = prompt_file_content(file_path, file_content, file_type)
         prompt = f"""Analyze this AEM component file for React conversion:
 
 File path: {file_path}
 File type: {file_type} (priority: {priority})
-File content:
-{file_content}
+File content{MINIFIED_NOTE if line_map else ''}:
+{prompt_content}
 {type_specific_prompt}
 
 Provide a structured analysis following the required format, with emphasis on React conversion requirements."""
 
         try:
-            result = self.run(prompt, return_structured=True)
-
-            # 如果返回的是结构化对象，转换为字典
+            # 按文件类型和规模选择模型档位；结构化输出退回为文本时先本地修复，
+            # 仍然无效才升级到更大的模型
+            tier = model_router.select_tier(
+                node='analyze_aem_files', file_path=file_path, content=file_content
+            )
+            result, tier = model_router.run_with_escalation(
+                lambda model_name: coerce_structured_output(
+                    cached_run(self.agent_for_model(model_name), prompt, return_structured=True),
+                    FileAnalysisResult
+                ),
+                tier,
+                is_valid=lambda result: isinstance(result, FileAnalysisResult)
+            )
+
+            # 如果返回的是结构化对象，转换为字典（模型引用的是压缩后内容的行号，还原为原文件行号）
             if isinstance(result, FileAnalysisResult):
-                return result.model_dump()
+                return remap_line_references(result.model_dump(), line_map)
             # 如果解析失败，返回原始结果
             elif isinstance(result, str):
                 return {
@@ -311,7 +557,7 @@ Provide a structured analysis following the required format, with emphasis on Re
                     "dependencies": [],
                     "key_features": [],
                     "configuration": {},
-                    "analysis": result
+                    "analysis": remap_line_references(result, line_map)
                 }
             else:
                 return {
@@ -329,3 +575,108 @@ Provide a structured analysis following the required format, with emphasis on Re
                 "configuration": {},
                 "analysis": f"Error analyzing file: {str(e)}"
             }
+
+
+class AEMBatchAnalysisAgent(BaseAgent):
+    """AEM 批量分析 Agent - 一次调用分析同一组件的多个小文件"""
+
+    def __init__(self, model_name: Optional[str] = None):
+        super().__init__(
+            name="AEMBatchAnalysisAgent",
+            system_prompt=AEM_ANALYSIS_SYSTEM_PROMPT + BATCH_ANALYSIS_INSTRUCTIONS,
+            tools=[],  # 文件内容已内联在 prompt 中
+            model_name=model_name,
+            temperature=0.2,
+            output_schema=FileAnalysisBatch
+        )
+
+    def analyze_batch(self, batch: List[Tuple[str, str, str]]) -> Dict[str, dict]:
+        """
+        批量分析文件
+
+        Args:
+            batch: [(file_path, content, file_type), ...]
+
+        Returns:
+            {file_path: 分析结果字典}（模型未返回或无法对应的文件不包含在内）
+        """
+        sections = []
+        line_maps = {}
+        for index, (file_path, content, file_type) in enumerate(batch, start=1):
+            prompt_content, line_maps[file_path] = prompt_file_content(file_path, content, file_type)
+            sections.append(
+                f"### File {index}\n"
+                f"File path: {file_path}\n"
+                f"File type: {file_type}\n"
+                f"File content{MINIFIED_NOTE if line_maps[file_path] else ''}:\n{prompt_content}"
+            )
+
+        prompt = f"""Analyze these {len(batch)} small files from one AEM component for React conversion.
+
+{chr(10).join(sections)}
+
+Return exactly {len(batch)} analyses in the "analyses" list, in the same order as the files above."""
+
+        result = coerce_structured_output(cached_run(self, prompt, return_structured=True), FileAnalysisBatch)
+        if not isinstance(result, FileAnalysisBatch):
+            logger.warning(f"{self.name}: structured output missing, got {type(result).__name__}")
+            return {}
+
+        analyses = match_batch_analyses([file_path for file_path, _, _ in batch],
+                                        [analysis.model_dump() for analysis in result.analyses])
+        return {file_path: remap_line_references(analysis, line_maps.get(file_path))
+                for file_path, analysis in analyses.items()}
+
+
+def prompt_file_content(file_path: str, content: str,
+                        file_type: Optional[str]) -> Tuple[str, Optional[List[int]]]:
+    """
+    内联到分析 prompt 中的文件内容
+
+    Config.PROMPT_MINIFY 启用时经 PromptCleaner 去掉注释并压缩（见 utils.source_minifier），
+    压缩不合并行，模型引用的行号可以用 line_map 还原
+
+    Returns:
+        (内容, line_map)：压缩后行号到原文件行号的映射，未压缩时为 None
+    """
+    from config import Config
+    if not Config.PROMPT_MINIFY:
+        return content, None
+    cleaned = PromptCleaner.clean_file_content_with_line_map(
+        content, file_type, minify=True, file_path=file_path
+    )
+    return cleaned['content'], cleaned['line_map']
+
+
+def match_batch_analyses(expected_paths: List[str], analyses: List[dict]) -> Dict[str, dict]:
+    """
+    将批量分析结果对应到文件路径
+
+    先按完整路径对应；模型改写了路径（如只保留文件名）时，按文件名对应到唯一的文件。
+    不按顺序对应：顺序错位时结果会被分配给错误的文件并写入分析缓存，
+    无法对应的文件由调用方退回单独分析
+
+    Args:
+        expected_paths: 批次中的文件路径
+        analyses: 模型返回的分析结果字典
+
+    Returns:
+        {file_path: 分析结果字典}
+    """
+    by_path: Dict[str, dict] = {}
+    unmatched = []
+    for analysis in analyses:
+        file_path = analysis.get('file_path')
+        if file_path in expected_paths and file_path not in by_path:
+            by_path[file_path] = analysis
+        else:
+            unmatched.append(analysis)
+
+    names = [os.path.basename(path.replace('\\', '/')) for path in expected_paths]
+    for analysis in unmatched:
+        name = os.path.basename(str(analysis.get('file_path') or '').replace('\\', '/'))
+        if name and names.count(name) == 1:
+            file_path = expected_paths[names.index(name)]
+            by_path.setdefault(file_path, {**analysis, 'file_path': file_path})
+
+    return by_path
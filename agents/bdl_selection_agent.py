@@ -3,8 +3,10 @@ BDL 组件选择 Agent
 根据 AEM 组件分析结果选择对应的 BDL 组件
 支持结构化输出
 """
+from typing import Optional
 from langchain_core.tools import tool
 from agents.base_agent import BaseAgent
+from utils.model_router import model_router
 from tools import list_files, read_file
 from utils.schemas import BDLComponentSelection
 
@@ -32,7 +34,7 @@ def read_bdl_component(bdl_component_path: str) -> str:
 class BDLSelectionAgent(BaseAgent):
     """BDL 组件选择 Agent"""
     
-    def __init__(self):
+    def __init__(self, model_name: Optional[str] = None):
         from tools import (
             search_files_by_pattern,
             find_files_by_name,
@@ -120,6 +122,7 @@ IMPORTANT:
             name="BDLSelectionAgent",
             system_prompt=system_prompt,
             tools=tools,
+            model_name=model_name or model_router.model_for(model_router.select_tier(node='select_bdl_components')),
             temperature=0.3,
             output_schema=BDLComponentSelection  # 使用结构化输出
         )
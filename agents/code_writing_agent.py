@@ -3,8 +3,12 @@
 根据 AEM 源代码和选定的 BDL 组件生成 React 代码
 支持结构化输出
 """
+from typing import Any, Dict, List, Optional
 from langchain_core.tools import tool
 from agents.base_agent import BaseAgent
+from utils.model_router import model_router
+from utils.file_context_builder import build_code_generation_prompt_parts, build_static_prompt_prefix
+from utils.token_budget import estimate_tokens
 from tools import read_file, write_file, create_directory
 from utils.schemas import CodeGenerationResult
 
@@ -30,7 +34,7 @@ def create_component_directory(directory_path: str) -> str:
 class CodeWritingAgent(BaseAgent):
     """代码编写 Agent"""
     
-    def __init__(self):
+    def __init__(self, model_name: Optional[str] = None):
         from tools import (
             list_files,
             search_files_by_pattern,
@@ -76,11 +80,44 @@ Code requirements:
 - Use BDL-specific patterns and conventions
 
 Output the complete React component code."""
+        # 系统提示词占用的输入预算（静态前缀由 build_code_generation_prompt_parts 计入）
+        instruction_tokens = estimate_tokens(system_prompt)
+        # 文件类型说明和转换原则与具体组件无关，放在系统提示词末尾，每次请求的前缀字节级一致，可命中 prefix caching
+        system_prompt = f"{system_prompt}\n\n{build_static_prompt_prefix()}"
         
         super().__init__(
             name="CodeWritingAgent",
             system_prompt=system_prompt,
             tools=tools,
+            model_name=model_name or model_router.model_for(model_router.select_tier(node='write_code')),
             temperature=0.2,
             output_schema=CodeGenerationResult  # 使用结构化输出
         )
+        self.instruction_tokens = instruction_tokens
+    
+    def build_prompt(self, file_analyses: List[Dict[str, Any]], base_prompt: str,
+                     dependency_tree: Optional[Dict[str, Dict]] = None) -> str:
+        """
+        构建代码生成的用户 prompt
+        
+        静态的文件类型说明已在系统提示词中，这里只包含本次运行的任务和文件分析，
+        按 Config.MAX_INPUT_TOKENS 扣除系统提示词后的预算打包
+        
+        Args:
+            file_analyses: 文件分析结果列表
+            base_prompt: 基础 prompt（本次运行的任务内容）
+            dependency_tree: 依赖树（依赖组件的文件按深度降低优先级）
+        
+        Returns:
+            用户 prompt
+        """
+        from config import Config
+        
+        _, variable_suffix = build_code_generation_prompt_parts(
+            file_analyses,
+            base_prompt,
+            max_tokens=Config.MAX_INPUT_TOKENS,
+            dependency_tree=dependency_tree,
+            reserved_tokens=self.instruction_tokens
+        )
+        return variable_suffix
@@ -1,11 +1,31 @@
 """
 代码修正 Agent
 根据 review 结果修正代码
+
+补丁模式（CORRECTION_MODE=patch）下 Agent 只输出 SEARCH/REPLACE 编辑块，
+由 correct() 在本地应用并校验，无法应用时退回完整重新生成
 """
+import logging
+import time
+from typing import Any, Dict, Optional
 from langchain_core.tools import tool
 from agents.base_agent import BaseAgent
+from config import Config
+from utils.code_patch import (
+    FULL_OUTPUT_INSTRUCTIONS,
+    PATCH_OUTPUT_INSTRUCTIONS,
+    PatchError,
+    apply_correction_response,
+    correction_stats,
+    summarize_edits,
+)
+from utils.llm_cache import cached_run
+from utils.model_router import model_router
+from utils.token_budget import estimate_tokens
 from tools import read_file, write_file
 
+logger = logging.getLogger(__name__)
+
 
 @tool
 def read_code_for_correction(file_path: str) -> str:
@@ -22,17 +42,26 @@ def write_corrected_code(file_path: str, code: str) -> str:
 class CorrectAgent(BaseAgent):
     """代码修正 Agent"""
     
-    def __init__(self):
+    def __init__(self, model_name: Optional[str] = None, output_mode: Optional[str] = None):
+        """
+        Args:
+            model_name: 模型名称（None 时按 correct_code 节点路由）
+            output_mode: 'patch' 输出编辑块，'full' 输出完整代码（None 时使用 Config.CORRECTION_MODE）
+        """
         from tools import search_text_in_files, get_file_info
         
+        self.output_mode = (output_mode or Config.CORRECTION_MODE).lower()
         tools = [
             read_code_for_correction,
-            write_corrected_code,
             search_text_in_files,
             get_file_info
         ]
+        if self.output_mode != 'patch':
+            # 补丁模式下由 correct() 应用编辑并写入文件，Agent 不直接写文件
+            tools.insert(1, write_corrected_code)
+        output_instructions = PATCH_OUTPUT_INSTRUCTIONS if self.output_mode == 'patch' else FULL_OUTPUT_INSTRUCTIONS
         
-        system_prompt = """You are a code correction expert specializing in fixing React code based on review feedback.
+        system_prompt = f"""You are a code correction expert specializing in fixing React code based on review feedback.
 
 YOUR TASK:
 Fix ALL issues identified by review agents while maintaining original functionality.
@@ -84,13 +113,7 @@ CORRECTION GUIDELINES:
 - Ensure fixes don't introduce new issues
 - Provide corrected code that compiles and runs
 
-OUTPUT:
-Provide the COMPLETE corrected code, not just changes. The corrected code should:
-- Fix all critical and high-severity issues
-- Compile without errors
-- Follow BDL conventions
-- Be security-compliant
-- Maintain original functionality
+{output_instructions}
 
 IMPORTANT:
 - If this is an iteration (not first correction), check previous corrections to avoid regressions
@@ -101,5 +124,97 @@ IMPORTANT:
             name="CorrectAgent",
             system_prompt=system_prompt,
             tools=tools,
+            model_name=model_name or model_router.model_for(model_router.select_tier(node='correct_code')),
             temperature=0.2
         )
+    
+    def _call(self, request: str) -> str:
+        """调用模型：补丁模式下 Agent 没有写文件工具，响应只由输入决定，经过缓存和 cassette"""
+        if self.output_mode == 'patch':
+            return cached_run(self, request)
+        return self.run(request)
+    
+    def correct(self, prompt: str, code: str, code_file_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        执行一次修正：补丁模式下应用编辑块，无法应用时退回完整重新生成
+        
+        Args:
+            prompt: 修正 prompt（通常来自 prompt_enhancer.build_correction_prompt，不含当前代码）
+            code: 当前代码
+            code_file_path: 代码文件路径（提供时写入修正后的代码）
+        
+        Returns:
+            {'code', 'mode', 'edits', 'edit_summaries', 'fallback', 'input_tokens', 'output_tokens',
+             'latency', 'error'}（edit_summaries 为每个编辑块 SEARCH 的第一行，完整代码时为空）
+        """
+        start = time.perf_counter()
+        output_tokens = 0
+        input_tokens = 0
+        fallback = False
+        error = None
+        corrected = code
+        mode = 'full'
+        edits = 0
+        edit_summaries = []
+        
+        request = f"{prompt}\n\nCurrent code:\n```jsx\n{code}\n```"
+        if self.output_mode == 'patch':
+            patch_request = request + "\n\nRespond with SEARCH/REPLACE blocks only."
+            input_tokens += estimate_tokens(patch_request)
+            response = self._call(patch_request)
+            output_tokens += estimate_tokens(response)
+            try:
+                corrected, mode, edits = apply_correction_response(code, response)
+                edit_summaries = summarize_edits(response)
+            except PatchError as e:
+                logger.warning(f"Patch could not be applied ({e}), falling back to full regeneration")
+                fallback = True
+                error = str(e)
+        
+        if self.output_mode != 'patch' or fallback:
+            full_request = (
+                request + "\n\nOutput the COMPLETE corrected code in a single ```jsx code block "
+                "(do not output SEARCH/REPLACE blocks or diffs)."
+            )
+            input_tokens += estimate_tokens(full_request)
+            # 完整模式下 Agent 可能通过 write_corrected_code 工具写入文件，此时以文件为准
+            # （响应可能只是 "I've updated the file" 之类的说明）
+            can_write = bool(code_file_path) and self.output_mode != 'patch'
+            before = read_file(code_file_path) if can_write else ''
+            response = self._call(full_request)
+            output_tokens += estimate_tokens(response)
+            written = read_file(code_file_path) if can_write else ''
+            if written and written not in (code, before) and not written.startswith('Error'):
+                corrected, mode, edits, error = written, 'full', 1, None
+                edit_summaries = []
+            else:
+                try:
+                    corrected, mode, edits = apply_correction_response(code, response)
+                    edit_summaries = summarize_edits(response) if mode != 'full' else []
+                    error = None
+                except PatchError as e:
+                    corrected, mode, edits, error = code, 'full', 0, str(e)
+                    edit_summaries = []
+                    logger.error(f"Correction produced no usable code: {e}")
+        
+        if code_file_path and corrected != code:
+            write_file(code_file_path, corrected)
+        
+        latency = time.perf_counter() - start
+        correction_stats.record(mode, output_tokens, estimate_tokens(corrected), latency, fallback,
+                                input_tokens=input_tokens)
+        logger.info(
+            f"Correction ({mode}{', fallback' if fallback else ''}): {edits} edits, "
+            f"~{input_tokens} input / ~{output_tokens} output tokens, {latency:.1f}s"
+        )
+        return {
+            'code': corrected,
+            'mode': mode,
+            'edits': edits,
+            'edit_summaries': edit_summaries,
+            'fallback': fallback,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'latency': latency,
+            'error': error,
+        }
@@ -45,11 +45,72 @@ class Config:
     LLM_API_BASE: str = os.getenv("LLM_API_BASE", "")
     LLM_API_KEY: str = os.getenv("LLM_API_KEY", "")
     LLM_MODEL: str = os.getenv("LLM_MODEL", "ep-20250118160000-xxxxx")
+    # 模型分级路由：配置类文件/CSS/简单审查用 fast，HTL 分析和代码编写/修正用 large（未设置时均为 LLM_MODEL）
+    MODEL_ROUTING: bool = os.getenv("MODEL_ROUTING", "true").lower() in ("1", "true", "yes")
+    LLM_MODEL_FAST: str = os.getenv("LLM_MODEL_FAST", "") or LLM_MODEL
+    LLM_MODEL_STANDARD: str = os.getenv("LLM_MODEL_STANDARD", "") or LLM_MODEL
+    LLM_MODEL_LARGE: str = os.getenv("LLM_MODEL_LARGE", "") or LLM_MODEL
+    # 输入超过 LARGE_INPUT_TOKENS 时提升一个档位；非 HTL 文件小于 SMALL_INPUT_TOKENS 时使用 fast
+    MODEL_ROUTING_LARGE_INPUT_TOKENS: int = int(os.getenv("MODEL_ROUTING_LARGE_INPUT_TOKENS", "6000"))
+    MODEL_ROUTING_SMALL_INPUT_TOKENS: int = int(os.getenv("MODEL_ROUTING_SMALL_INPUT_TOKENS", "800"))
     
     # 工作流配置
     MAX_ITERATIONS: int = int(os.getenv("MAX_ITERATIONS", "5"))
     MAX_TOKENS: int = int(os.getenv("MAX_TOKENS", "8192"))
+    # 输入 prompt 的 token 预算（超出时按优先级降级为摘要或丢弃）
+    MAX_INPUT_TOKENS: int = int(os.getenv("MAX_INPUT_TOKENS", "60000"))
     TEMPERATURE: float = float(os.getenv("TEMPERATURE", "0.7"))
+    # LLM 限流：每分钟请求数、每分钟 token 数（0 表示不限）和全局并发上限
+    LLM_RPM: int = int(os.getenv("LLM_RPM", "60"))
+    LLM_TPM: int = int(os.getenv("LLM_TPM", "300000"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    # 熔断器：连续失败次数阈值、打开后的恢复等待时间（秒）；重试预算：重试调用占首次调用的比例上限
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RECOVERY_SECONDS: float = float(os.getenv("CIRCUIT_RECOVERY_SECONDS", "30"))
+    RETRY_BUDGET_RATIO: float = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+    # 文件分析的最大并发 LLM 调用数
+    ANALYSIS_CONCURRENCY: int = int(os.getenv("ANALYSIS_CONCURRENCY", "4"))
+    # review_code 中并发执行的审查 Agent 数（1 表示按原顺序串行）
+    REVIEW_CONCURRENCY: int = int(os.getenv("REVIEW_CONCURRENCY", "6"))
+    # 分级审查：静态检查 → 核心审查 → 一致性审查，较低一级未通过时跳过之后的级别
+    REVIEW_GATING: bool = os.getenv("REVIEW_GATING", "true").lower() in ("1", "true", "yes")
+    # 增量审查：修正后只重新执行关注范围被 diff 触及（或上一轮未通过）的审查，其余沿用上一轮结论
+    INCREMENTAL_REVIEW: bool = os.getenv("INCREMENTAL_REVIEW", "true").lower() in ("1", "true", "yes")
+    # diff 长度不超过代码长度的该比例时，审查 prompt 中以 diff 代替完整代码
+    INCREMENTAL_REVIEW_MAX_DIFF_RATIO: float = float(os.getenv("INCREMENTAL_REVIEW_MAX_DIFF_RATIO", "0.5"))
+    # 代码修正输出模式：patch 输出 SEARCH/REPLACE 编辑块并在本地应用（失败时退回完整代码），full 输出完整代码
+    CORRECTION_MODE: str = os.getenv("CORRECTION_MODE", "patch").lower()
+    # 修正迭代使用的转换摘要的最大 token 数（替代每轮重复发送的完整分析和 BDL 源码）
+    CONVERSION_BRIEF_TOKENS: int = int(os.getenv("CONVERSION_BRIEF_TOKENS", "1500"))
+    # 配置类文件（.content.xml、_cq_editConfig.xml、css.txt/js.txt、CSS、.properties）使用规则分析，不调用 LLM
+    STATIC_ANALYSIS: bool = os.getenv("STATIC_ANALYSIS", "true").lower() in ("1", "true", "yes")
+    # 分析 prompt 中内联的源码先压缩（去缩进和空行、省略 data URI 等），模型引用的行号按 line_map 还原
+    PROMPT_MINIFY: bool = os.getenv("PROMPT_MINIFY", "true").lower() in ("1", "true", "yes")
+    # 小文件批量分析：单个文件不超过 ANALYSIS_BATCH_FILE_TOKENS 时与同组件其他小文件合并为一次调用
+    ANALYSIS_BATCHING: bool = os.getenv("ANALYSIS_BATCHING", "true").lower() in ("1", "true", "yes")
+    ANALYSIS_BATCH_FILE_TOKENS: int = int(os.getenv("ANALYSIS_BATCH_FILE_TOKENS", "1500"))
+    ANALYSIS_BATCH_TOKENS: int = int(os.getenv("ANALYSIS_BATCH_TOKENS", "6000"))
+    ANALYSIS_BATCH_MAX_FILES: int = int(os.getenv("ANALYSIS_BATCH_MAX_FILES", "8"))
+    
+    # LLM 响应缓存配置
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    LLM_CACHE_DIR: str = os.getenv(
+        "LLM_CACHE_DIR",
+        str(PROJECT_ROOT / "output" / ".llm_cache")
+    )
+    LLM_CACHE_MAX_MB: int = int(os.getenv("LLM_CACHE_MAX_MB", "512"))
+    LLM_CACHE_TTL_HOURS: float = float(os.getenv("LLM_CACHE_TTL_HOURS", "168"))
+    # prompt 版本盐值：修改 prompt 或解析逻辑后递增，使旧缓存失效
+    LLM_CACHE_PROMPT_VERSION: str = os.getenv("LLM_CACHE_PROMPT_VERSION", "1")
+    
+    # 录制/回放（cassette）：record 记录所有 LLM 调用和 run_command 结果，replay 按请求哈希回放
+    CASSETTE_MODE: str = os.getenv("CASSETTE_MODE", "off").lower()
+    CASSETTE_PATH: str = os.getenv(
+        "CASSETTE_PATH",
+        str(PROJECT_ROOT / "output" / "cassettes" / "workflow.json.gz")
+    )
+    # 回放未命中、或出现未经 llm_cache.cached_run 的 LLM 调用时报错（false 表示退回真实调用）
+    CASSETTE_STRICT: bool = os.getenv("CASSETTE_STRICT", "true").lower() in ("1", "true", "yes")
     
     # 日志配置
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
@@ -117,7 +178,17 @@ class Config:
         print(f"组件注册表路径: {cls.get_component_registry_path()}")
         print(f"LLM API Base: {cls.LLM_API_BASE[:50] + '...' if len(cls.LLM_API_BASE) > 50 else cls.LLM_API_BASE}")
         print(f"LLM Model: {cls.LLM_MODEL}")
+        print(f"模型路由: {'启用' if cls.MODEL_ROUTING else '禁用'} "
+              f"(fast={cls.LLM_MODEL_FAST}, standard={cls.LLM_MODEL_STANDARD}, large={cls.LLM_MODEL_LARGE})")
         print(f"最大迭代次数: {cls.MAX_ITERATIONS}")
+        print(f"输入Token预算: {cls.MAX_INPUT_TOKENS}")
+        print(f"文件分析并发数: {cls.ANALYSIS_CONCURRENCY}, 源码压缩: {'启用' if cls.PROMPT_MINIFY else '禁用'}")
+        print(f"审查并发数: {cls.REVIEW_CONCURRENCY}, 分级审查: {'启用' if cls.REVIEW_GATING else '禁用'}, "
+              f"增量审查: {'启用' if cls.INCREMENTAL_REVIEW else '禁用'}")
+        print(f"代码修正模式: {cls.CORRECTION_MODE}, 转换摘要: {cls.CONVERSION_BRIEF_TOKENS} tokens")
+        print(f"LLM限流: {cls.LLM_RPM} RPM, {cls.LLM_TPM} TPM, 最大并发 {cls.LLM_MAX_CONCURRENCY}")
+        print(f"LLM缓存: {'启用' if cls.LLM_CACHE_ENABLED else '禁用'} "
+              f"({cls.LLM_CACHE_DIR}, {cls.LLM_CACHE_MAX_MB}MB, 版本 {cls.LLM_CACHE_PROMPT_VERSION})")
         print(f"日志级别: {cls.LOG_LEVEL}")
         print("=" * 60)
 
@@ -0,0 +1,102 @@
+"""
+测试 LLM 调用的录制/回放（离线）
+"""
+import pytest
+
+import utils.cassette as cassette_module
+import utils.llm_cache as llm_cache_module
+from utils.cassette import Cassette, CassetteMiss
+from utils.llm_cache import LLMResponseCache, cached_run
+from utils.retry import retry_with_backoff
+
+
+class _FakeAgent:
+    def __init__(self):
+        self.name = 'FakeReviewAgent'
+        self.model_name = 'fake-model'
+        self.system_prompt = 'You review code.'
+        self.tools = []
+        self.output_schema = None
+        self.temperature = 0.2
+        self.calls = 0
+
+    def run(self, input_text, chat_history=None, return_structured=False):
+        self.calls += 1
+        return f"verdict {self.calls} for {input_text}"
+
+
+@pytest.fixture
+def recorder(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache_module, 'llm_cache', LLMResponseCache(
+        cache_dir=str(tmp_path / 'cache'), prompt_version='test', enabled=False))
+    recorder = Cassette()
+    monkeypatch.setattr(cassette_module, 'cassette', recorder)
+    return recorder
+
+
+def test_record_then_replay_llm_calls(recorder, tmp_path):
+    path = str(tmp_path / 'run.json.gz')
+    recorder.start('record', path)
+    agent = _FakeAgent()
+    recorded = [cached_run(agent, 'review A'), cached_run(agent, 'review A'), cached_run(agent, 'review B')]
+    recorder.save()
+
+    recorder.start('replay', path)
+    replay_agent = _FakeAgent()
+    replayed = [cached_run(replay_agent, 'review A'), cached_run(replay_agent, 'review A'),
+                cached_run(replay_agent, 'review B')]
+    assert replayed == recorded
+    assert replay_agent.calls == 0
+    assert recorder.stats['replayed'] == 3
+
+
+def test_strict_replay_miss_raises(recorder, tmp_path):
+    path = str(tmp_path / 'run.json')
+    recorder.start('record', path)
+    cached_run(_FakeAgent(), 'review A')
+    recorder.save()
+
+    recorder.start('replay', path)
+    with pytest.raises(CassetteMiss):
+        cached_run(_FakeAgent(), 'a prompt that was never recorded')
+
+
+class _DirectAgent:
+    """不经过 cached_run、直接调用模型的 agent（如工作流中的代码生成）"""
+
+    def __init__(self):
+        self.name = 'DirectAgent'
+        self.calls = 0
+
+    @retry_with_backoff(max_retries=0, circuit_breaker=False)
+    def invoke(self, input_text):
+        self.calls += 1
+        return f"live {input_text}"
+
+
+def test_strict_replay_rejects_unrecorded_live_calls(recorder, tmp_path):
+    path = str(tmp_path / 'run.json')
+    recorder.start('record', path)
+    agent = _DirectAgent()
+    assert agent.invoke('generate') == 'live generate'
+    assert recorder.stats['live_calls'] == 1
+    recorder.save()
+
+    recorder.start('replay', path)
+    with pytest.raises(CassetteMiss, match='DirectAgent'):
+        agent.invoke('generate')
+    assert agent.calls == 1
+
+    recorder.strict = False
+    assert agent.invoke('generate') == 'live generate'
+
+
+def test_cached_run_calls_are_not_live_calls(recorder, tmp_path):
+    class _RetryingAgent(_FakeAgent):
+        @retry_with_backoff(max_retries=0, circuit_breaker=False)
+        def run(self, input_text, chat_history=None, return_structured=False):
+            return super().run(input_text, chat_history, return_structured)
+
+    recorder.start('record', str(tmp_path / 'run.json'))
+    cached_run(_RetryingAgent(), 'review A')
+    assert recorder.stats['live_calls'] == 0
@@ -0,0 +1,95 @@
+"""
+测试补丁输出模式（离线）
+"""
+import pytest
+
+from utils.code_patch import (
+    PatchError,
+    apply_correction_response,
+    apply_search_replace,
+    apply_unified_diff,
+    summarize_edits,
+)
+
+CODE = """import React from 'react';
+
+const Hero = ({ title }) => {
+  return <div className="hero">{title}</div>;
+};
+
+export default Hero;
+"""
+
+
+def test_search_replace_applies_edit():
+    response = (
+        "<<<<<<< SEARCH\n"
+        "import React from 'react';\n"
+        "=======\n"
+        "import React from 'react';\n"
+        "import './Hero.css';\n"
+        ">>>>>>> REPLACE\n"
+    )
+    patched, mode, count = apply_correction_response(CODE, response)
+    assert mode == 'search_replace' and count == 1
+    assert "import './Hero.css';" in patched
+
+
+def test_search_replace_tolerates_indentation():
+    patched = apply_search_replace(CODE, [('return <div className="hero">{title}</div>;',
+                                           'return <section>{title}</section>;')])
+    assert '<section>' in patched
+    patched = apply_search_replace(CODE, [('    return <div className="hero">{title}</div>;\n',
+                                           '  return <p>{title}</p>;\n')])
+    assert '<p>{title}</p>' in patched
+
+
+def test_search_not_found_raises():
+    with pytest.raises(PatchError):
+        apply_search_replace(CODE, [('const Missing = 1;', '')])
+
+
+def test_unified_diff_with_line_offset():
+    diff = (
+        "@@ -10,1 +10,2 @@\n"
+        " import React from 'react';\n"
+        "+import PropTypes from 'prop-types';\n"
+    )
+    patched = apply_unified_diff(CODE, diff)
+    assert patched.splitlines()[1] == "import PropTypes from 'prop-types';"
+
+
+def test_patch_breaking_brackets_is_rejected():
+    response = "<<<<<<< SEARCH\n};\n=======\n\n>>>>>>> REPLACE\n"
+    with pytest.raises(PatchError):
+        apply_correction_response(CODE, response)
+
+
+def test_full_code_from_fenced_block():
+    response = f"Here is the corrected code:\n```jsx\n{CODE}```\n"
+    patched, mode, _ = apply_correction_response(CODE, response)
+    assert mode == 'full' and patched == CODE.strip()
+
+
+def test_prose_is_not_accepted_as_full_code():
+    response = ("I've updated the file to import the CSS module and fixed the default export. "
+                "The component now builds without errors.")
+    with pytest.raises(PatchError):
+        apply_correction_response(CODE, response)
+
+
+def test_bare_code_without_fence_is_accepted():
+    patched, mode, _ = apply_correction_response(CODE, CODE)
+    assert mode == 'full' and patched == CODE.strip()
+
+
+def test_summarize_edits_uses_first_search_line():
+    response = (
+        "<<<<<<< SEARCH\n\nimport React from 'react';\n=======\nimport React from 'react';\n"
+        "import './Hero.css';\n>>>>>>> REPLACE\n"
+        "<<<<<<< SEARCH\nexport default Hero;\n=======\nexport default Hero;\n>>>>>>> REPLACE\n"
+    )
+    assert summarize_edits(response) == ["import React from 'react';", "export default Hero;"]
+    diff = "```diff\n@@ -3,1 +3,1 @@\n-const Hero = ({ title }) => {\n+const Hero = ({ title = '' }) => {\n```"
+    assert summarize_edits(diff) == ["const Hero = ({ title }) => {"]
+    assert summarize_edits(f"```jsx\n{CODE}```") == []
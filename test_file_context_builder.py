@@ -0,0 +1,45 @@
+"""
+测试代码生成 prompt 的预算打包（离线）
+"""
+from utils.file_context_builder import analysis_depths, build_code_generation_prompt_parts
+from utils.token_budget import estimate_tokens
+
+
+def _analysis(file_path, file_type, size=200):
+    return {
+        'file_path': file_path,
+        'file_type': file_type,
+        'purpose': f"Purpose of {file_path}",
+        'key_features': ['feature'],
+        'analysis': f"{file_path} details. " * size,
+    }
+
+
+TREE = {'root': {'resource_type': 'site/hero', 'path': '/repo/hero', 'dependencies': {
+    'site/button': {'path': '/repo/button', 'files': ['/repo/button/button.html'], 'dependencies': {
+        'site/icon': {'path': '/repo/icon', 'files': ['/repo/icon/icon.html'], 'dependencies': {}},
+    }},
+}}}
+ANALYSES = [
+    _analysis('/repo/hero/hero.html', 'htl'),
+    _analysis('/repo/button/button.html', 'htl'),
+    _analysis('/repo/icon/icon.html', 'htl'),
+]
+
+
+def test_depths_come_from_dependency_tree():
+    assert analysis_depths(ANALYSES, TREE) == [0, 1, 2]
+    assert analysis_depths([dict(ANALYSES[0], dependency_depth=3)], TREE) == [3]
+    assert analysis_depths(ANALYSES) == [0, 0, 0]
+
+
+def test_deepest_dependency_degrades_first():
+    prefix, unlimited = build_code_generation_prompt_parts(ANALYSES, 'Convert hero.', max_tokens=10 ** 6)
+    assert unlimited.startswith('Convert hero.') and 'icon.html details.' in unlimited
+
+    budget = estimate_tokens(prefix) + estimate_tokens(unlimited) - 300
+    _, packed = build_code_generation_prompt_parts(ANALYSES, 'Convert hero.', max_tokens=budget,
+                                                   dependency_tree=TREE)
+    assert 'hero.html details.' in packed and 'button.html details.' in packed
+    assert 'Purpose of /repo/icon/icon.html' in packed and 'icon.html details.' not in packed
+    assert estimate_tokens(prefix) + estimate_tokens(packed) <= budget + 5
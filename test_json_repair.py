@@ -0,0 +1,56 @@
+"""
+测试 LLM 输出的 JSON 容错解析（离线）
+"""
+import pytest
+
+from utils.json_repair import JSONRepairError, loads_tolerant, parse_structured_output, repair_json
+from utils.parsers import extract_json_from_text
+
+
+def test_plain_json():
+    assert loads_tolerant('{"passed": true}') == {'passed': True}
+
+
+def test_fenced_block_preferred():
+    text = 'Here you go:\n```json\n{"passed": false, "issues": ["x"]}\n```\nDone [1].'
+    assert loads_tolerant(text) == {'passed': False, 'issues': ['x']}
+
+
+def test_prose_brackets_skipped_when_expecting_object():
+    text = 'As noted in the guide (see [1]), the result is {"passed": true, "issues": []}'
+    assert loads_tolerant(text) == [1]
+    assert loads_tolerant(text, expect=dict) == {'passed': True, 'issues': []}
+    assert extract_json_from_text(text) == {'passed': True, 'issues': []}
+
+
+def test_only_array_is_not_an_object():
+    assert extract_json_from_text('Steps [1, 2, 3] are complete.') is None
+    with pytest.raises(JSONRepairError):
+        loads_tolerant('Steps [1, 2, 3] are complete.', expect=dict)
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('{"a": 1, "b": [1, 2,],}', {'a': 1, 'b': [1, 2]}),
+    ("{'a': 'single quoted'}", {'a': 'single quoted'}),
+    ('{"a": "line\nbreak"}', {'a': 'line\nbreak'}),
+    ('{"a": {"b": [1, 2', {'a': {'b': [1, 2]}}),
+    ('{"passed": True, "value": None}', {'passed': True, 'value': None}),
+])
+def test_repairs(raw, expected):
+    assert loads_tolerant(raw) == expected
+
+
+def test_repair_json_output_is_valid():
+    import json
+    assert json.loads(repair_json('{"issues": ["missing import",')) == {'issues': ['missing import']}
+
+
+@pytest.mark.parametrize('raw', ['{' * 20000, '[' * 20000 + ']' * 20000, '{"a": ' * 5000 + '1' + '}' * 5000])
+def test_deeply_nested_input_is_unparseable_not_a_crash(raw):
+    from pydantic import BaseModel
+
+    class _Result(BaseModel):
+        passed: bool
+
+    assert extract_json_from_text(raw) is None
+    assert parse_structured_output(raw, _Result) is None
@@ -0,0 +1,66 @@
+"""
+测试 LLM 响应磁盘缓存（离线）
+"""
+import pytest
+
+import utils.llm_cache as llm_cache_module
+from utils.llm_cache import LLMResponseCache, cached_run
+
+
+class _FakeAgent:
+    """与 BaseAgent 有相同缓存相关属性的假 Agent"""
+
+    def __init__(self, name='FakeAgent', system_prompt='You review code.'):
+        self.name = name
+        self.model_name = 'fake-model'
+        self.system_prompt = system_prompt
+        self.tools = []
+        self.output_schema = None
+        self.temperature = 0.2
+        self.calls = []
+
+    def run(self, input_text, chat_history=None, return_structured=False):
+        self.calls.append(input_text)
+        return f"response {len(self.calls)} to {input_text}"
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = LLMResponseCache(cache_dir=str(tmp_path), max_bytes=1 << 20, ttl_seconds=0,
+                             prompt_version='test', enabled=True)
+    monkeypatch.setattr(llm_cache_module, 'llm_cache', cache)
+    return cache
+
+
+def test_cached_run_reuses_response(cache):
+    agent = _FakeAgent()
+    first = cached_run(agent, 'review this')
+    second = cached_run(_FakeAgent(), 'review this')
+    assert first == second == 'response 1 to review this'
+    assert len(agent.calls) == 1
+    assert cache.stats['hits'] == 1 and cache.stats['stores'] == 1
+
+
+def test_key_includes_prompt_and_system_prompt(cache):
+    agent = _FakeAgent()
+    cached_run(agent, 'review this')
+    cached_run(agent, 'review that')
+    other = _FakeAgent(system_prompt='You write code.')
+    cached_run(other, 'review this')
+    assert len(agent.calls) == 2 and len(other.calls) == 1
+
+
+def test_bypass_refreshes_entry(cache):
+    agent = _FakeAgent()
+    cached_run(agent, 'review this')
+    with cache.bypassed():
+        assert cached_run(agent, 'review this') == 'response 2 to review this'
+    assert cached_run(agent, 'review this') == 'response 2 to review this'
+
+
+def test_disabled_cache_calls_agent(cache):
+    cache.enabled = False
+    agent = _FakeAgent()
+    cached_run(agent, 'review this')
+    cached_run(agent, 'review this')
+    assert len(agent.calls) == 2
@@ -0,0 +1,55 @@
+"""
+测试 LLM 用量统计（离线，不调用 LLM）
+"""
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from utils.llm_metrics import LLMUsageTracker
+from utils.retry import retry_with_backoff
+
+
+def _ai(input_tokens: int, output_tokens: int, cached: int = 0) -> AIMessage:
+    return AIMessage(content='ok', usage_metadata={
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'total_tokens': input_tokens + output_tokens,
+        'input_token_details': {'cache_read': cached},
+    })
+
+
+def test_record_result_counts_only_new_ai_messages():
+    """历史中的 AI 消息不重复计入，工具调用的每一轮都计入"""
+    tracker = LLMUsageTracker()
+    result = {'messages': [
+        SystemMessage(content='system'),
+        HumanMessage(content='earlier'),
+        _ai(100, 10),
+        HumanMessage(content='now'),
+        _ai(200, 20, cached=150),
+        ToolMessage(content='tool output', tool_call_id='1'),
+        _ai(300, 30, cached=250),
+    ]}
+
+    assert tracker.record_result('Agent', result) == 2
+    totals = tracker.summary()['Agent']
+    assert totals['calls'] == 2
+    assert totals['input_tokens'] == 500
+    assert totals['cached_tokens'] == 400
+    assert totals['output_tokens'] == 50
+
+
+def test_retry_wrapper_records_usage(monkeypatch):
+    """经过 retry_with_backoff 的 agent 调用自动记录用量"""
+    import utils.retry as retry_module
+
+    tracker = LLMUsageTracker()
+    monkeypatch.setattr(retry_module, 'usage_tracker', tracker)
+
+    class FakeAgent:
+        name = 'FakeAgent'
+
+        @retry_with_backoff(max_retries=0, rate_limited=False, circuit_breaker=False)
+        def invoke(self, prompt):
+            return {'messages': [HumanMessage(content=prompt), _ai(40, 5)]}
+
+    FakeAgent().invoke('hello')
+    assert tracker.summary()['FakeAgent']['input_tokens'] == 40
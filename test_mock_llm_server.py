@@ -0,0 +1,39 @@
+"""
+测试模拟 LLM 服务的流式输出（离线，只监听本机回环地址）
+"""
+import json
+import urllib.request
+
+from utils.mock_llm_server import FixtureStore, MockLLMServer
+
+CONTENT = "export default function Hero() { return null; }"
+
+
+def _post(url: str, body: dict) -> str:
+    request = urllib.request.Request(
+        f"{url}/chat/completions",
+        data=json.dumps(body).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.read().decode('utf-8')
+
+
+def test_stream_sends_content_usage_and_done():
+    with MockLLMServer() as server:
+        server.fixtures = FixtureStore([{'match': {'contains': 'Hero'}, 'response': {'content': CONTENT}}])
+        text = _post(server.url, {
+            'model': 'mock-llm',
+            'messages': [{'role': 'user', 'content': 'Write Hero'}],
+            'stream': True,
+            'stream_options': {'include_usage': True},
+        })
+
+    events = [line[len('data: '):] for line in text.split('\n') if line.startswith('data: ')]
+    assert events[-1] == '[DONE]'
+    chunks = [json.loads(event) for event in events[:-1]]
+    streamed = ''.join(chunk['choices'][0]['delta'].get('content') or '' for chunk in chunks if chunk['choices'])
+    assert streamed == CONTENT
+    assert chunks[-1]['choices'] == [] and chunks[-1]['usage']['completion_tokens'] > 0
+    finish = [chunk['choices'][0]['finish_reason'] for chunk in chunks if chunk['choices']]
+    assert finish[-1] == 'stop'
@@ -0,0 +1,48 @@
+"""
+测试文件内容清洗与压缩后行号还原（离线）
+"""
+from utils.prompt_cleaner import PromptCleaner
+from utils.source_minifier import map_line_number, remap_line_references
+
+HTL = """<div class="hero">
+
+    <!-- author note -->
+
+    <h1>${properties.title}</h1>
+
+
+    <p data-sly-test="${properties.text}">${properties.text}</p>
+</div>
+"""
+
+
+def test_minified_content_keeps_line_map():
+    cleaned = PromptCleaner.clean_file_content_with_line_map(HTL, 'htl', minify=True)
+    lines = cleaned['content'].split('\n')
+    original = HTL.split('\n')
+    assert len(lines) == len(cleaned['line_map'])
+    for number, line in enumerate(lines, start=1):
+        assert original[map_line_number(cleaned['line_map'], number) - 1].strip() == line
+
+
+def test_clean_file_content_returns_same_text():
+    cleaned = PromptCleaner.clean_file_content_with_line_map(HTL, 'htl', minify=True)
+    assert PromptCleaner.clean_file_content(HTL, 'htl', minify=True) == cleaned['content']
+
+
+def test_no_line_map_without_minify():
+    cleaned = PromptCleaner.clean_file_content_with_line_map(HTL, 'htl')
+    assert cleaned['line_map'] is None
+    assert 'author note' not in cleaned['content']
+
+
+def test_line_references_in_analysis_are_remapped():
+    cleaned = PromptCleaner.clean_file_content_with_line_map(HTL, 'htl', minify=True)
+    minified_lines = cleaned['content'].split('\n')
+    title_line = next(number for number, line in enumerate(minified_lines, 1) if '<h1>' in line)
+    analysis = {'key_features': [f"Title heading on line {title_line}", "Uses 2 properties"],
+                'analysis': f"See lines 1-{title_line}"}
+    remapped = remap_line_references(analysis, cleaned['line_map'])
+    assert remapped['key_features'] == ["Title heading on line 5", "Uses 2 properties"]
+    assert remapped['analysis'] == "See lines 1-5"
+    assert remap_line_references(analysis, None) is analysis
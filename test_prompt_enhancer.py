@@ -0,0 +1,49 @@
+"""
+测试修正历史（离线）
+"""
+from utils import prompt_enhancer
+from utils.prompt_enhancer import CorrectionHistory, build_correction_prompt, get_conversion_brief, issue_key
+
+
+def test_issue_key_ignores_positions_case_and_spacing():
+    assert issue_key('build', 'Unexpected token at line 12') == issue_key('build', 'unexpected  token at Line 14')
+    assert issue_key('build', 'Hero.jsx:12:4 unused var') == issue_key('build', 'Hero.jsx:30:1 unused var')
+    assert issue_key('build', 'Missing import') != issue_key('security', 'Missing import')
+
+
+def test_issue_key_keeps_other_numbers():
+    assert issue_key('bdl', 'Missing import for H1') != issue_key('bdl', 'Missing import for H2')
+    assert issue_key('css_import', 'card2.css not imported') != issue_key('css_import', 'card3.css not imported')
+
+
+def test_repeat_counts_match_reworded_line_numbers():
+    history = CorrectionHistory()
+    history.record_attempt(1, {'build': ["Unclosed '{' opened at line 10"]})
+    history.record_attempt(2, {'build': ["Unclosed '{' opened at line 12"]})
+    issues = {'build': ["Unclosed '{' opened at line 15"], 'security': ["Unclosed '{' opened at line 15"]}
+    counts = history.repeat_counts(issues)
+    assert counts == {issue_key('build', "Unclosed '{' opened at line 15"): 2}
+
+    prompt = build_correction_prompt('brief', {
+        'build': {'passed': False, 'issues': issues['build']},
+        'security': {'passed': False, 'issues': issues['security']},
+    }, 3, history)
+    assert prompt.count('already attempted 2x') == 1
+
+
+def test_summary_lists_edit_summaries():
+    history = CorrectionHistory()
+    history.record_attempt(1, {'css_import': ['CSS file Hero.css is not imported']}, {
+        'mode': 'search_replace', 'edits': 1, 'edit_summaries': ["import React from 'react';"],
+    })
+    history.record_review({'css_import': {'passed': False, 'issues': ['CSS file Hero.css is not imported']}})
+    summary = history.summary()
+    assert "applied 1 search_replace edit(s) at `import React from 'react';`" in summary
+    assert 'still failing afterwards: css_import' in summary
+
+
+def test_brief_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(prompt_enhancer, '_BRIEF_CACHE', {})
+    for index in range(prompt_enhancer._BRIEF_CACHE_MAX_ENTRIES + 10):
+        get_conversion_brief({'component_name': f"Component{index}"})
+    assert len(prompt_enhancer._BRIEF_CACHE) == prompt_enhancer._BRIEF_CACHE_MAX_ENTRIES
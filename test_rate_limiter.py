@@ -0,0 +1,67 @@
+"""
+测试 LLM 限流器（离线）
+"""
+import pytest
+
+from utils.rate_limiter import RateLimiter, get_retry_after, is_rate_limit_error
+
+
+class _HTTPError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@pytest.mark.parametrize('message', [
+    'Error code: 429 - {"error": {"message": "Rate limit reached"}}',
+    'HTTP 429 Too Many Requests',
+    'Received status 429 from upstream',
+    '429 Too Many Requests',
+    'You exceeded your current quota, rate limit exceeded',
+])
+def test_rate_limit_messages(message):
+    assert is_rate_limit_error(Exception(message))
+
+
+@pytest.mark.parametrize('message', [
+    'Request req_4290abc failed: connection reset',
+    'Prompt has 1429 tokens, maximum is 1024',
+    'Timeout after 429ms waiting for response',
+])
+def test_incidental_429_is_not_rate_limit(message):
+    assert not is_rate_limit_error(Exception(message))
+
+
+def test_status_code_takes_precedence():
+    assert is_rate_limit_error(_HTTPError('slow down', status_code=429))
+    assert not is_rate_limit_error(_HTTPError('Error code: 429 in body', status_code=500))
+
+
+def test_retry_after_from_message():
+    assert get_retry_after(Exception('Rate limit reached, please try again in 20s')) == 20.0
+
+
+def test_limit_releases_on_exception_and_base_exception():
+    limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=0, max_concurrency=1)
+    with pytest.raises(ValueError):
+        with limiter.limit():
+            raise ValueError('boom')
+    assert limiter.metrics()['in_flight'] == 0
+    assert limiter.metrics()['failures'] == 1
+
+    with pytest.raises(KeyboardInterrupt):
+        with limiter.limit():
+            raise KeyboardInterrupt
+    assert limiter.metrics()['in_flight'] == 0
+    assert limiter.metrics()['failures'] == 1
+
+
+def test_rate_limited_release_pauses_and_halves_concurrency():
+    limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=0, max_concurrency=8)
+    with pytest.raises(_HTTPError):
+        with limiter.limit():
+            raise _HTTPError('slow down', status_code=429)
+    metrics = limiter.metrics()
+    assert metrics['rate_limited'] == 1
+    assert metrics['concurrency_limit'] == 4
+    assert metrics['paused_for'] > 0
@@ -0,0 +1,88 @@
+"""
+测试重试装饰器与限流器的配合（离线）
+"""
+import asyncio
+import time
+
+import pytest
+
+import utils.retry as retry
+from utils.rate_limiter import RateLimiter
+
+
+class _ServerError(Exception):
+    status_code = 503
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=0, max_concurrency=1)
+    monkeypatch.setattr(retry, 'rate_limiter', limiter)
+    return limiter
+
+
+def test_sync_retry_releases_slot_each_attempt(limiter):
+    calls = []
+
+    @retry.retry_with_backoff(max_retries=2, initial_delay=0.01, jitter=False, circuit_breaker=False)
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise _ServerError("service unavailable")
+        return 'ok'
+
+    assert flaky() == 'ok'
+    assert len(calls) == 3
+    assert limiter.metrics()['in_flight'] == 0
+
+
+def test_sync_non_retryable_error_is_raised(limiter):
+    @retry.retry_with_backoff(max_retries=3, initial_delay=0.01, circuit_breaker=False)
+    def invalid():
+        raise ValueError("invalid request")
+
+    with pytest.raises(ValueError):
+        invalid()
+    assert limiter.metrics()['in_flight'] == 0
+
+
+def test_async_cancel_while_waiting_does_not_leak_slot(limiter):
+    @retry.async_retry_with_backoff(max_retries=0, circuit_breaker=False)
+    async def call():
+        return 'ok'
+
+    async def scenario():
+        limiter.acquire()  # 占用唯一的并发额度，使 call() 阻塞在 acquire
+        task = asyncio.ensure_future(call())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        limiter.release(0.0)
+        # 线程中的 acquire 拿到额度后应立即归还
+        for _ in range(50):
+            await asyncio.sleep(0.02)
+            if limiter.metrics()['in_flight'] == 0:
+                break
+        return await asyncio.wait_for(call(), 5)
+
+    assert asyncio.run(scenario()) == 'ok'
+    assert limiter.metrics()['in_flight'] == 0
+
+
+def test_async_cancel_during_call_releases_slot(limiter):
+    @retry.async_retry_with_backoff(max_retries=0, circuit_breaker=False)
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def scenario():
+        task = asyncio.ensure_future(slow())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    start = time.monotonic()
+    asyncio.run(scenario())
+    assert time.monotonic() - start < 5
+    assert limiter.metrics()['in_flight'] == 0
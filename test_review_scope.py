@@ -0,0 +1,56 @@
+"""
+测试增量审查范围（离线）
+"""
+from utils.review_scope import ReviewScope
+
+CODE = """import React from 'react';
+
+const Hero = ({ title }) => <div className="hero">{title}</div>;
+
+export default Hero;
+"""
+PROMPTS = {
+    'security': f'Review security:\n{CODE}',
+    'build': f'Review build:\n{CODE}',
+    'component_completeness': f'Review completeness:\n{CODE}',
+    'style_consistency': f'Review style:\n{CODE}',
+}
+
+
+def _passed():
+    return {'passed': True, 'issues': [], 'severity': 'none'}
+
+
+def test_style_only_change_carries_unaffected_passed_reviews():
+    scope = ReviewScope(enabled=True, max_diff_ratio=0.5)
+    scope.remember('Hero.jsx', CODE, {key: _passed() for key in PROMPTS})
+    changed = CODE.replace('className="hero"', 'className="hero hero--wide"')
+    to_run, carried = scope.plan('Hero.jsx', changed, PROMPTS, gate=True)
+    assert set(carried) == {'security'}
+    assert set(to_run) == {'build', 'component_completeness', 'style_consistency'}
+    assert 'CHANGES SINCE PREVIOUS REVIEW' in to_run['build']
+
+
+def test_carried_core_failure_skips_consistency_tier():
+    scope = ReviewScope(enabled=True, max_diff_ratio=0.5)
+    scope.remember('Hero.jsx', CODE, {
+        'security': _passed(),
+        'build': {'passed': False, 'issues': ['Missing dependency'], 'severity': 'high'},
+        'component_completeness': {'passed': None, 'skipped': True, 'issues': []},
+        'style_consistency': {'passed': None, 'skipped': True, 'issues': []},
+    })
+    to_run, carried = scope.plan('Hero.jsx', CODE, PROMPTS, gate=True)
+    assert to_run == {}
+    assert carried['build']['passed'] is False and carried['build']['carried_forward']
+    assert carried['component_completeness']['skipped'] and carried['style_consistency']['skipped']
+    assert 'build' in carried['style_consistency']['reason']
+
+
+def test_carried_failure_does_not_gate_without_gating():
+    scope = ReviewScope(enabled=True, max_diff_ratio=0.5)
+    scope.remember('Hero.jsx', CODE, {
+        'build': {'passed': False, 'issues': ['Missing dependency'], 'severity': 'high'},
+    })
+    to_run, carried = scope.plan('Hero.jsx', CODE, PROMPTS, gate=False)
+    assert set(to_run) == {'security', 'component_completeness', 'style_consistency'}
+    assert set(carried) == {'build'}
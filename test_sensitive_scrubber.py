@@ -0,0 +1,62 @@
+"""
+测试敏感信息清除（离线）
+"""
+import pytest
+
+from utils.sensitive_scrubber import SensitiveInfoScrubber
+
+
+@pytest.mark.parametrize('text, leaked', [
+    ('password=correct-horse battery staple', 'horse'),
+    ('password: abc,def', 'abc'),
+    ('PASSWORD = "' + 'x' * 300 + '"', 'xxx'),
+    ("password='" + 'y' * 900 + "'", 'yyy'),
+    ('password="hunter 2; drop"', 'drop'),
+])
+def test_password_value_fully_redacted(text, leaked):
+    assert leaked not in SensitiveInfoScrubber().scrub(text)
+
+
+def test_quoted_password_stops_at_closing_quote():
+    text = 'login(user, password="s3cr3t word", remember=true)\nnext line'
+    result = SensitiveInfoScrubber().scrub(text)
+    assert 's3cr3t' not in result
+    assert result.endswith('password="***", remember=true)\nnext line')
+
+
+def test_unquoted_password_keeps_next_line():
+    result = SensitiveInfoScrubber().scrub('password=hunter2\r\nuser=admin\n')
+    assert result == 'password="***"\r\nuser=admin\n'
+
+
+def test_unquoted_password_stops_at_code_delimiters():
+    text = 'var a={password:n.pw,user:"bob"};function f(){return 1}'
+    assert SensitiveInfoScrubber().scrub(text) == 'var a={password="***",user:"bob"};function f(){return 1}'
+
+
+def test_tokens_and_api_keys():
+    text = 'api_key="ABCDEFGHIJKLMNOPQRSTUVWX" token: abcdefghijklmnopqrstuvwxyz012345'
+    result = SensitiveInfoScrubber().scrub(text)
+    assert 'ABCDEFGH' not in result and 'abcdefgh' not in result
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 100, 1500])
+def test_streaming_matches_whole_text(chunk_size):
+    scrubber = SensitiveInfoScrubber()
+    text = ('filler line\n' * 200 + 'password=' + 'z' * 200 + ' end\n'
+            + 'token=' + 'q' * 40 + '\n') * 3
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+    streamed = ''.join(scrubber.iter_scrub(chunks))
+    assert streamed == scrubber.scrub(text)
+    assert 'zzz' not in streamed and 'qqq' not in streamed
+
+
+def test_streaming_long_line_is_linear():
+    import time
+    scrubber = SensitiveInfoScrubber()
+    text = 'password=' + 'a' * (2 * 1024 * 1024)
+    chunks = [text[i:i + 4096] for i in range(0, len(text), 4096)]
+    start = time.perf_counter()
+    streamed = ''.join(scrubber.iter_scrub(chunks))
+    assert time.perf_counter() - start < 5
+    assert streamed == scrubber.scrub(text)
@@ -0,0 +1,73 @@
+"""
+测试确定性静态检查与分级审查的跳过规则（离线）
+"""
+import pytest
+
+from utils.review_runner import ReviewRunner, ReviewTask
+from utils.static_review import check_brackets, check_syntax, run_static_review
+
+
+@pytest.mark.parametrize('code', [
+    "const Steps = () => (\n  <ol>\n    <li>1) First step</li>\n  </ol>\n);\n",
+    "export default function Thanks() {\n  return <p>Thanks :)</p>;\n}\n",
+    "const paren = /[(]/;\n",
+    "const clean = s.replace(/\\{/g, '');\n",
+    "const Cart = ({ name, items }) => (\n  <div>\n    <p>{name}'s cart {items.length}</p>\n"
+    "    {items.map(item => (\n      <li key={item.id} onClick={() => open(item)}>{item.name}</li>\n"
+    "    ))}\n  </div>\n);\n",
+    "return (<>\n  <Hero data={{ title: 'a' }} /> text ( </>);\n",
+    "const half = (a + b) / 2 / c;\nconst ok = a < b && c > d;\n",
+    "// comment with ( and {\nconst s = 'text ) ]';\nconst t = `${a} (`;\n",
+])
+def test_balanced_code_without_false_positives(code):
+    assert check_brackets(code) is None
+
+
+@pytest.mark.parametrize('code, expected', [
+    ("const a = [1, 2;\n", "Unclosed '['"),
+    ("if (a) { run(); }}\n", "Unexpected '}'"),
+    ("function f() {\n  return <div className=\"x\">hi</div>;\n", "Unclosed '{'"),
+    ("const f = () => (\n  <div>{value</div>\n);\n", "Unexpected ')'"),
+])
+def test_unbalanced_code(code, expected):
+    problem = check_brackets(code)
+    assert problem and problem.startswith(expected)
+
+
+def test_typescript_in_jsx_file():
+    result = check_syntax("interface Props { title: string }\nexport default () => null;\n", 'Hero.jsx')
+    assert not result['passed']
+    assert 'interface declaration' in result['issues'][0]
+
+
+def test_missing_import_is_blocking(tmp_path):
+    code_file = tmp_path / 'Hero.jsx'
+    code = "import Card from './Card';\nexport default () => <Card />;\n"
+    result = run_static_review(code, str(code_file))
+    assert not result['passed'] and result['blocking']
+
+
+def test_bracket_only_failure_does_not_skip_llm_tier():
+    code = "const a = [1, 2;\nexport default a;\n"
+    static = run_static_review(code)
+    assert not static['passed'] and static['blocking'] is False
+
+    runner = ReviewRunner(max_concurrency=1)
+    tiers = [
+        [ReviewTask('static', lambda: static)],
+        [ReviewTask('security', lambda: {'passed': True, 'issues': []})],
+    ]
+    results = runner.run_tiered(tiers, gate=True)
+    assert results['security']['passed'] is True
+    assert runner.last_stopped_tier is None
+
+
+def test_blocking_failure_skips_later_tiers():
+    runner = ReviewRunner(max_concurrency=1)
+    tiers = [
+        [ReviewTask('static', lambda: {'passed': False, 'issues': ['x'], 'blocking': True})],
+        [ReviewTask('security', lambda: {'passed': True, 'issues': []})],
+    ]
+    results = runner.run_tiered(tiers, gate=True)
+    assert results['security']['skipped']
+    assert runner.last_stopped_tier == 0
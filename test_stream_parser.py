@@ -0,0 +1,76 @@
+"""
+测试流式输出的增量解析（离线）
+"""
+import pytest
+from pydantic import BaseModel
+
+from utils.stream_parser import StreamAborted, StreamingOutputParser, consume_stream
+
+
+class _Review(BaseModel):
+    passed: bool
+    issues: list
+
+
+def _feed(text, chunk_size=7, **kwargs):
+    parser = StreamingOutputParser(**kwargs)
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+    return consume_stream(chunks, parser)
+
+
+@pytest.mark.parametrize('text', [
+    'I checked the code (see [1) below) and found:\n{"passed": true, "issues": []}',
+    'Step 1) read the file; step 2) review it. Thanks :)\n\n{"passed": false, "issues": ["x"]}',
+    'The {name} placeholder and [x] checkbox are fine.\n```json\n{"passed": true, "issues": []}\n```',
+    'Result [draft}: {"passed": true, "issues": []}',
+])
+def test_leading_prose_with_brackets_without_schema(text):
+    result = _feed(text, mode='json')
+    assert not result['aborted'], result['reason']
+    assert result['json_values'][-1]['passed'] in (True, False)
+
+
+def test_inline_json_after_prose():
+    result = _feed('Result: {"passed": true, "issues": [1, 2]} done', mode='json')
+    assert not result['aborted']
+    assert result['json_values'] == [{'passed': True, 'issues': [1, 2]}]
+
+
+def test_pretty_printed_json():
+    result = _feed('{\n  "passed": true,\n  "issues": [\n    "a"\n  ]\n}\n', chunk_size=3, mode='json')
+    assert result['json_values'] == [{'passed': True, 'issues': ['a']}]
+
+
+def test_malformed_json_at_line_start_aborts_without_schema():
+    result = _feed('{"passed": true, "issues": [}\n', mode='json')
+    assert result['aborted'] and 'mismatched' in result['reason']
+
+
+def test_schema_mismatch_aborts():
+    result = _feed('{"colour": "red", "size": 3, "shape": "round", "weight": 1}', mode='json', schema=_Review)
+    assert result['aborted']
+
+
+def test_preamble_limit_counts_only_real_json():
+    text = 'Notes [a] [b] {c} ' * 40 + '\n{"passed": true, "issues": []}'
+    result = _feed(text, mode='json', max_preamble_chars=200)
+    assert result['aborted'] and 'no JSON value' in result['reason']
+
+
+def test_code_block_callback_and_repetition_abort():
+    blocks = []
+    parser = StreamingOutputParser(mode='code', on_code_block=lambda language, code, index: blocks.append(code))
+    parser.feed('Here:\n```jsx\nconst a = {b};\n```\n')
+    assert blocks == ['const a = {b};']
+    with pytest.raises(StreamAborted):
+        parser.feed('same line\n' * 40)
+
+
+def test_single_line_json_is_linear():
+    import time
+    issues = [f"issue number {index} in the component" for index in range(5000)]
+    text = '{"passed": false, "issues": ' + str(issues).replace("'", '"') + '}'
+    start = time.perf_counter()
+    result = _feed(text, chunk_size=16, mode='json', max_output_chars=10 ** 7)
+    assert time.perf_counter() - start < 0.5
+    assert not result['aborted'] and len(result['json_values'][-1]['issues']) == 5000
@@ -0,0 +1,36 @@
+"""
+测试结构感知截断（离线）
+"""
+import time
+
+import pytest
+
+from utils.structure_truncator import _scan_markup, build_skeleton, find_cut_position
+
+
+@pytest.mark.parametrize('content', [
+    '<x ' * 20000,
+    '<x "' * 15000,
+    "<x 'a" * 12000,
+    '<div a="1" ' * 6000,
+    '<x\n' * 20000,
+])
+def test_unclosed_tags_scan_in_linear_time(content):
+    """大量未闭合的 '<x' 不会导致回溯（60KB 输入此前需要约 10 秒）"""
+    start = time.perf_counter()
+    find_cut_position(content, len(content) // 2, 'markup')
+    build_skeleton(content, 'markup', 0)
+    assert time.perf_counter() - start < 1.0
+
+
+def test_markup_tokens():
+    """引号中的 '>'、自闭合标签和属性中的 '/' 仍被正确识别"""
+    content = (
+        '<div class="a>b" data-x=\'1\'><br/><img src="/a/b.png" />'
+        '<a href=/x/y>t</a><sly data-sly-test="${a > b}"/></div>'
+    )
+    tokens = [(kind, name) for kind, _, _, name, _ in _scan_markup(content, 0, len(content))]
+    assert tokens == [
+        ('open', 'div'), ('void', 'br'), ('void', 'img'), ('open', 'a'),
+        ('close', 'a'), ('void', 'sly'), ('close', 'div'),
+    ]
@@ -0,0 +1,57 @@
+"""
+测试 prompt token 预算打包（离线）
+"""
+from utils.token_budget import TokenBudgeter, estimate_tokens
+
+SHARED = "\n".join(f".shared-rule-{i} {{ color: #{i:03d}; margin: {i}px; }}" for i in range(40))
+
+
+def _budgeter(max_tokens):
+    budgeter = TokenBudgeter(max_tokens=max_tokens)
+    budgeter.add_section('task', 'Convert the component. ' * 10, kind='instructions', required=True)
+    budgeter.add_section('main.html', 'Main markup.\n\n' + SHARED, kind='file_analysis',
+                         file_type='htl', summary='Main markup summary.')
+    # 去重后只剩引用，自动摘要不会更短，降级时保持完整
+    budgeter.add_section('dep.css', 'Dependency styles.\n\n' + SHARED, kind='css_summary')
+    return budgeter
+
+
+def test_estimate_tokens():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('abcd' * 100) == 101
+    assert estimate_tokens('中文') == 3
+
+
+def test_everything_fits():
+    packed = _budgeter(10000).pack()
+    assert packed['dropped'] == [] and packed['summarized'] == []
+    assert packed['tokens'] <= packed['budget']
+    assert packed['text'].count('.shared-rule-39') == 1
+
+
+def test_expanded_duplicate_counts_against_budget():
+    # 原文所在段落降级为摘要后，原文还原到引用段落，还原后的内容必须计入预算
+    shared_tokens = estimate_tokens(SHARED)
+    budget = shared_tokens + 60
+    packed = _budgeter(budget).pack()
+    assert 'main.html' in packed['summarized']
+    assert packed['tokens'] <= budget
+    assert packed['text'].count('.shared-rule-39') <= 1
+
+
+def test_packed_tokens_never_exceed_budget_when_optional_sections_can_go():
+    for budget in range(80, 1200, 40):
+        packed = _budgeter(budget).pack()
+        required = estimate_tokens('Convert the component. ' * 10)
+        if required <= budget:
+            assert packed['tokens'] <= budget, budget
+
+
+
+def test_pack_is_repeatable():
+    for budget in (10000, estimate_tokens(SHARED) + 60):
+        budgeter = _budgeter(budget)
+        contents = [section['content'] for section in budgeter.sections]
+        first = budgeter.pack()
+        assert budgeter.pack() == first
+        assert [section['content'] for section in budgeter.sections] == contents
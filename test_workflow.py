@@ -13,7 +13,17 @@ sys.path.insert(0, str(project_root))
 
 from workflow.graph import create_workflow_graph
 from langgraph.graph import StateGraph
+from utils.llm_cache import llm_cache
+from utils.file_analysis_cache import file_analysis_cache
+from utils.rate_limiter import rate_limiter
+from utils.model_router import model_router
+from utils.cassette import cassette
+from utils.review_runner import review_runner
+from utils.review_scope import review_scope
+from utils.code_patch import correction_stats
+from utils.llm_metrics import usage_tracker
 import logging
+import time
 
 # 配置日志
 logging.basicConfig(
@@ -141,6 +151,27 @@ def main():
     print("AEM to React Component Converter - Test Suite")
     print("="*60 + "\n")
     
+    # --no-cache: 本次运行不读取 LLM 响应缓存（仍写入新结果）
+    if "--no-cache" in sys.argv:
+        sys.argv.remove("--no-cache")
+        llm_cache.bypass = True
+        print("LLM cache bypassed for this run\n")
+    
+    # --record [PATH] / --replay [PATH]: 录制本次运行的 LLM 调用（经过 llm_cache.cached_run 的文件分析、
+    # 审查和补丁修正）和命令结果，或从 cassette 回放；其他 LLM 调用（代码生成、BDL 选择、文件收集）
+    # 录制时给出警告，严格回放（CASSETTE_STRICT）时报错
+    for flag in ("--record", "--replay"):
+        if flag in sys.argv:
+            position = sys.argv.index(flag)
+            sys.argv.pop(position)
+            path = None
+            if position < len(sys.argv) and not sys.argv[position].isdigit() and not sys.argv[position].startswith("--"):
+                path = sys.argv.pop(position)
+            cassette.start(flag.lstrip("-"), path)
+            # 录制和回放都不读取磁盘缓存，保证 cassette 完整且两次运行的调用序列一致
+            llm_cache.bypass = True
+            print(f"Cassette {cassette.mode}: {cassette.path}\n")
+    
     # 测试组件列表
     test_components = [
         {
@@ -150,6 +181,14 @@ def main():
         {
             "resource_type": "example/components/card",
             "name": "Card Component (Complex with Dependencies)"
+        },
+        {
+            "resource_type": "example/components/container",
+            "name": "Container Component (Nested Children)"
+        },
+        {
+            "resource_type": "example/components/page",
+            "name": "Page Component (Composition)"
         }
     ]
     
@@ -175,21 +214,42 @@ def main():
         print("Testing all components...\n")
         results = []
         for comp in test_components:
+            start = time.perf_counter()
             result = test_component(comp["resource_type"], comp["name"])
-            results.append((comp["name"], result))
+            results.append((comp["name"], result, time.perf_counter() - start))
         
         # 打印总结
         print("\n" + "="*60)
         print("Test Summary")
         print("="*60)
-        for name, result in results:
+        for name, result, elapsed in results:
             status = "✅ PASSED" if result else "❌ FAILED"
-            print(f"  {name}: {status}")
+            print(f"  {name}: {status} ({elapsed:.2f}s)")
+        print(f"  Total: {sum(elapsed for _, _, elapsed in results):.2f}s")
         print("="*60 + "\n")
+        print_reports()
         return
     
     # 测试选定的组件
+    start = time.perf_counter()
     test_component(selected["resource_type"], selected["name"])
+    print(f"\n{selected['name']}: {time.perf_counter() - start:.2f}s")
+    print_reports()
+
+
+def print_reports():
+    """打印缓存、限流、路由、审查耗时和录制/回放统计，录制模式下写入 cassette"""
+    print(usage_tracker.report())
+    print(llm_cache.report())
+    print(file_analysis_cache.report())
+    print(rate_limiter.report())
+    print(model_router.report())
+    print(review_runner.report())
+    print(review_scope.report())
+    print(correction_stats.report())
+    if cassette.recording:
+        cassette.save()
+    print(cassette.report())
 
 
 if __name__ == "__main__":
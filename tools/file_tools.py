@@ -4,6 +4,7 @@
 """
 import os
 import subprocess
+import time
 from typing import List, Optional
 from pathlib import Path
 
@@ -138,6 +139,23 @@ def run_command(command: str, working_directory: Optional[str] = None, timeout:
     Returns:
         包含stdout, stderr, returncode的字典
     """
+    from utils.cassette import cassette, command_key
+    if cassette.mode != 'off':
+        key = command_key(command, working_directory, timeout)
+        if cassette.replaying:
+            interaction = cassette.lookup('command', key)
+            if interaction is not None:
+                return interaction['response']
+        start = time.perf_counter()
+        result = _run_command(command, working_directory, timeout)
+        if cassette.recording:
+            cassette.record('command', key, result, label=command, elapsed=time.perf_counter() - start)
+        return result
+    return _run_command(command, working_directory, timeout)
+
+
+def _run_command(command: str, working_directory: Optional[str], timeout: int) -> dict:
+    """执行命令（run_command 的实际实现）"""
     try:
         result = subprocess.run(
             command,
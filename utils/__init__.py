@@ -8,7 +8,7 @@ from .path_utils import (
     format_path_for_display,
     join_paths
 )
-from .retry import retry_with_backoff, is_retryable_error
+from .retry import retry_with_backoff, is_retryable_error, CircuitOpenError
 from .prompt_cleaner import PromptCleaner, cleaner
 
 # 尝试导入schemas（如果存在）
@@ -36,6 +36,7 @@ __all__ = [
     # Retry utilities
     'retry_with_backoff',
     'is_retryable_error',
+    'CircuitOpenError',
     # Prompt cleaning
     'PromptCleaner',
     'cleaner',
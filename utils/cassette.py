@@ -0,0 +1,265 @@
+"""
+工作流运行的录制/回放（cassette）
+record 模式记录一次运行中所有 Agent 调用（LLM 请求与响应）和 run_command 的结果，
+replay 模式按请求哈希直接返回录制的结果，不调用模型也不执行命令，
+用于离线、秒级重跑 test_workflow.py，只测量我们自己的 Python 开销
+
+同一请求在一次运行中出现多次时按出现顺序依次回放（超出录制次数时重复最后一个）
+
+只有经过 llm_cache.cached_run 的 Agent 调用会被录制。其他真实 LLM 调用（如工作流直接调用的
+agent.run）在 retry_with_backoff 中经 check_live_call 检查：录制时给出警告，严格回放时抛出
+CassetteMiss，保证 --replay 不会悄悄访问真实服务
+"""
+import atexit
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+MODES = ('off', 'record', 'replay')
+
+
+class CassetteMiss(Exception):
+    """回放时找不到录制的请求（请求内容与录制时不同，需要重新录制）"""
+
+
+def command_key(command: str, working_directory: Optional[str], timeout: int) -> str:
+    """
+    run_command 的请求哈希
+
+    工作目录在项目根目录下时使用相对路径，cassette 可以在不同机器上回放
+    """
+    if working_directory:
+        from config import Config
+        try:
+            working_directory = os.path.relpath(
+                os.path.abspath(working_directory), str(Config.PROJECT_ROOT)
+            ).replace(os.sep, '/')
+        except ValueError:
+            # Windows 上不同盘符无法计算相对路径
+            pass
+    raw = json.dumps({'command': command, 'cwd': working_directory, 'timeout': timeout}, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    """
+    录制/回放器（线程安全）
+
+    用法：
+        cassette.start('record', 'output/cassettes/button.json.gz')
+        ...  # 运行工作流
+        cassette.save()
+
+        cassette.start('replay', 'output/cassettes/button.json.gz')
+        ...  # 再次运行，所有调用由 cassette 返回
+    """
+
+    def __init__(self, mode: str = 'off', path: Optional[str] = None, strict: bool = True):
+        """
+        Args:
+            mode: 'off'、'record' 或 'replay'
+            path: cassette 文件路径（以 .gz 结尾时压缩）
+            strict: 回放未命中时是否抛出 CassetteMiss（False 表示退回真实调用）
+        """
+        self.mode = 'off'
+        self.path: Optional[str] = None
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._interactions: List[Dict[str, Any]] = []
+        self._index: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self._cursor: Dict[Tuple[str, str], int] = {}
+        self.stats = {'recorded': 0, 'replayed': 0, 'misses': 0, 'live_calls': 0}
+        self._save_registered = False
+        # 当前线程是否在 cached_agent_call 内（该调用已由 cassette 录制/回放）
+        self._local = threading.local()
+        self._warned_labels: set = set()
+        if mode != 'off':
+            self.start(mode, path)
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == 'record'
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+
+    def start(self, mode: str, path: Optional[str] = None) -> None:
+        """
+        开始录制或回放
+
+        Raises:
+            ValueError: mode 无效
+            FileNotFoundError: 回放的 cassette 文件不存在
+        """
+        if mode not in MODES:
+            raise ValueError(f"Invalid cassette mode: {mode} (expected one of {MODES})")
+        if mode != 'off' and not path:
+            from config import Config
+            path = Config.CASSETTE_PATH
+
+        with self._lock:
+            self.mode = mode
+            self.path = path
+            self._interactions = []
+            self._index = {}
+            self._cursor = {}
+            self.stats = {'recorded': 0, 'replayed': 0, 'misses': 0, 'live_calls': 0}
+            self._warned_labels = set()
+
+        if mode == 'replay':
+            for interaction in self._read(path):
+                self._add(interaction)
+            logger.info(f"Replaying {len(self._interactions)} interactions from {path}")
+        elif mode == 'record':
+            logger.info(f"Recording interactions to {path}")
+            if not self._save_registered:
+                # 调用方未显式 save() 时在退出前写入
+                atexit.register(self.save)
+                self._save_registered = True
+
+    def _add(self, interaction: Dict[str, Any]) -> None:
+        self._interactions.append(interaction)
+        key = (interaction['kind'], interaction['request_hash'])
+        self._index.setdefault(key, []).append(interaction)
+
+    @staticmethod
+    def _read(path: str) -> List[Dict[str, Any]]:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != CASSETTE_VERSION:
+            logger.warning(f"Cassette {path} has version {data.get('version')}, expected {CASSETTE_VERSION}")
+        return data.get('interactions', [])
+
+    def lookup(self, kind: str, request_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        回放：返回下一个录制的交互
+
+        Raises:
+            CassetteMiss: 严格模式下未找到录制的请求
+        """
+        key = (kind, request_hash)
+        with self._lock:
+            recorded = self._index.get(key)
+            if not recorded:
+                self.stats['misses'] += 1
+                if self.strict:
+                    raise CassetteMiss(f"No recorded {kind} interaction for request {request_hash[:12]}")
+                return None
+            position = self._cursor.get(key, 0)
+            self._cursor[key] = position + 1
+            self.stats['replayed'] += 1
+            return recorded[min(position, len(recorded) - 1)]
+
+    @contextmanager
+    def covering(self) -> Iterator[None]:
+        """标记当前线程中的 LLM 调用已由 cassette 录制/回放（cached_agent_call 使用）"""
+        self._local.depth = getattr(self._local, 'depth', 0) + 1
+        try:
+            yield
+        finally:
+            self._local.depth -= 1
+
+    def check_live_call(self, label: str) -> None:
+        """
+        真实 LLM 调用前检查（retry_with_backoff 中经过限流的调用）
+
+        不在 covering() 内的调用没有录制：录制时警告（回放这次运行会失败），
+        严格回放时抛出 CassetteMiss
+
+        Raises:
+            CassetteMiss: 严格回放时出现未录制的 LLM 调用
+        """
+        if self.mode == 'off' or getattr(self._local, 'depth', 0):
+            return
+        with self._lock:
+            self.stats['live_calls'] += 1
+            first = label not in self._warned_labels
+            self._warned_labels.add(label)
+        if self.replaying and self.strict:
+            raise CassetteMiss(
+                f"Live LLM call from {label or 'unknown agent'} during strict replay "
+                f"(the call does not go through llm_cache.cached_run and is not in the cassette)"
+            )
+        if first:
+            logger.warning(
+                f"Cassette {self.mode}: LLM call from {label or 'unknown agent'} does not go through "
+                f"llm_cache.cached_run and is not recorded"
+            )
+
+    def record(self, kind: str, request_hash: str, response: Any, value_type: str = 'json',
+               label: str = '', elapsed: float = 0.0) -> None:
+        """
+        录制一次交互
+
+        Args:
+            kind: 'llm' 或 'command'
+            request_hash: 请求哈希
+            response: 可 JSON 序列化的结果
+            value_type: 结果类型（'model' 表示 Pydantic 模型的 model_dump）
+            label: 便于阅读的标签（agent 名称或命令）
+            elapsed: 原调用耗时（秒）
+        """
+        interaction = {
+            'kind': kind,
+            'request_hash': request_hash,
+            'label': label,
+            'value_type': value_type,
+            'response': response,
+            'elapsed': round(elapsed, 3),
+        }
+        with self._lock:
+            self._add(interaction)
+            self.stats['recorded'] += 1
+
+    def save(self) -> Optional[str]:
+        """录制模式下写入 cassette 文件，返回文件路径"""
+        if not self.recording or not self.path:
+            return None
+        with self._lock:
+            data = {
+                'version': CASSETTE_VERSION,
+                'created_at': time.time(),
+                'interactions': list(self._interactions),
+            }
+        path = Path(self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        opener = gzip.open if self.path.endswith('.gz') else open
+        with opener(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'), default=str)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved {len(data['interactions'])} interactions to {self.path}")
+        return self.path
+
+    def report(self) -> str:
+        """生成录制/回放统计"""
+        with self._lock:
+            stats = dict(self.stats)
+        if self.mode == 'off':
+            return "Cassette: off"
+        return (
+            f"Cassette ({self.mode}, {self.path}): {stats['recorded']} recorded, "
+            f"{stats['replayed']} replayed, {stats['misses']} misses, "
+            f"{stats['live_calls']} unrecorded live LLM calls"
+        )
+
+
+def _create_default_cassette() -> Cassette:
+    from config import Config
+    return Cassette(mode=Config.CASSETTE_MODE, path=Config.CASSETTE_PATH, strict=Config.CASSETTE_STRICT)
+
+
+# 创建全局 cassette 实例（默认关闭，由 test_workflow.py --record/--replay 或 CASSETTE_MODE 开启）
+cassette = _create_default_cassette()
@@ -0,0 +1,307 @@
+"""
+代码修正的补丁输出模式
+CorrectAgent 输出 SEARCH/REPLACE 块或 unified diff，而不是完整代码，
+在本地应用并校验；补丁无法应用时由调用方退回完整重新生成。
+修正一个缺失的 import 只需要几十个输出 token，而不是重新输出整个组件
+"""
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SEARCH_REPLACE_BLOCK = re.compile(
+    r'^<{5,9}[ \t]*SEARCH[^\n]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9}[ \t]*REPLACE[^\n]*$',
+    re.MULTILINE | re.DOTALL,
+)
+_FENCED_DIFF = re.compile(r'```[ \t]*(?:diff|patch|udiff)[ \t]*\n(.*?)(?:```|\Z)', re.DOTALL)
+_HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@')
+_FENCED_CODE = re.compile(r'```(?:jsx|tsx|javascript|typescript|js|ts)?\n.*?```', re.DOTALL)
+_MODULE_STATEMENT = re.compile(r'^\s*(?:import|export)\b', re.MULTILINE)
+
+PATCH_OUTPUT_INSTRUCTIONS = """OUTPUT (PATCH MODE):
+Do NOT output the complete file. Output only the edits needed, as SEARCH/REPLACE blocks:
+
+<<<<<<< SEARCH
+exact lines copied from the current code
+=======
+replacement lines
+>>>>>>> REPLACE
+
+Rules:
+- The SEARCH section must match the current code exactly (including indentation) and be unique;
+  include a few surrounding lines if needed to make it unique
+- Use one block per separate change, in file order; keep blocks small
+- To add an import, SEARCH for an existing import line and REPLACE it with that line plus the new import
+- To delete code, leave the REPLACE section empty
+- If the required changes touch most of the file, output the complete corrected code in a single
+  ```jsx code block instead"""
+
+FULL_OUTPUT_INSTRUCTIONS = """OUTPUT:
+Provide the COMPLETE corrected code, not just changes. The corrected code should:
+- Fix all critical and high-severity issues
+- Compile without errors
+- Follow BDL conventions
+- Be security-compliant
+- Maintain original functionality"""
+
+
+class PatchError(ValueError):
+    """补丁无法应用（SEARCH 未找到或不唯一、diff 上下文不匹配、应用后语法被破坏）"""
+
+
+def parse_search_replace(text: str) -> List[Tuple[str, str]]:
+    """提取 SEARCH/REPLACE 块，返回 [(search, replace)]"""
+    return [(search, replace) for search, replace in _SEARCH_REPLACE_BLOCK.findall(text)]
+
+
+def extract_diff(text: str) -> Optional[str]:
+    """提取 unified diff（```diff 代码块优先，否则为包含 @@ 行的整个文本）"""
+    blocks = [block for block in _FENCED_DIFF.findall(text) if _HUNK_HEADER.search(block) or '\n@@' in block]
+    if blocks:
+        return '\n'.join(blocks)
+    if re.search(r'^@@ -\d+', text, re.MULTILINE):
+        return text
+    return None
+
+
+def _first_line(lines: List[str], max_length: int) -> str:
+    for line in lines:
+        if line.strip():
+            return line.strip()[:max_length]
+    return ''
+
+
+def summarize_edits(response: str, max_length: int = 80) -> List[str]:
+    """
+    每个编辑块的简短说明，供修正历史记录尝试过的修改
+
+    SEARCH/REPLACE 块取 SEARCH 的第一行非空内容，diff 取每个 hunk 的第一行删除行
+    （纯新增时取第一行新增行）；完整代码响应返回空列表
+    """
+    edits = parse_search_replace(response)
+    if edits:
+        return [_first_line(_split_lines(search), max_length) for search, _ in edits]
+    diff = extract_diff(response)
+    if not diff:
+        return []
+    summaries = []
+    for hunk in re.split(r'^@@ [^\n]*\n', diff, flags=re.MULTILINE)[1:]:
+        lines = hunk.split('\n')
+        removed = [line[1:] for line in lines if line.startswith('-') and not line.startswith('---')]
+        added = [line[1:] for line in lines if line.startswith('+') and not line.startswith('+++')]
+        summaries.append(_first_line(removed, max_length) or _first_line(added, max_length))
+    return summaries
+
+
+def _find_block(lines: List[str], block: List[str], hint: int = 0) -> List[int]:
+    """
+    在代码行中查找连续的块，返回所有匹配的起始行号
+
+    先精确匹配（忽略行尾空白），没有结果时再忽略缩进匹配；结果按与 hint 的距离排序
+    """
+    if not block:
+        return []
+    size = len(block)
+    for normalize in (str.rstrip, str.strip):
+        target = [normalize(line) for line in block]
+        normalized = [normalize(line) for line in lines]
+        positions = [
+            index for index in range(len(lines) - size + 1)
+            if normalized[index] == target[0] and normalized[index:index + size] == target
+        ]
+        if positions:
+            return sorted(positions, key=lambda index: abs(index - hint))
+    return []
+
+
+def _split_lines(text: str) -> List[str]:
+    return text.split('\n') if text else []
+
+
+def apply_search_replace(code: str, edits: List[Tuple[str, str]]) -> str:
+    """
+    依次应用 SEARCH/REPLACE 块
+
+    Raises:
+        PatchError: SEARCH 为空、未找到或匹配多处
+    """
+    for number, (search, replace) in enumerate(edits, 1):
+        if not search.strip():
+            raise PatchError(f"Edit {number}: empty SEARCH section")
+        count = code.count(search)
+        if count == 1:
+            code = code.replace(search, replace, 1)
+            continue
+        if count > 1:
+            raise PatchError(f"Edit {number}: SEARCH matches {count} places")
+
+        # 模型经常改变缩进或行尾空白：按行匹配
+        lines = code.split('\n')
+        search_lines = _split_lines(search.rstrip('\n'))
+        positions = _find_block(lines, search_lines)
+        if not positions:
+            raise PatchError(f"Edit {number}: SEARCH not found: {search_lines[0].strip()[:80]!r}")
+        if len(positions) > 1:
+            raise PatchError(f"Edit {number}: SEARCH matches {len(positions)} places")
+        start = positions[0]
+        replace_lines = _split_lines(replace.rstrip('\n'))
+        lines[start:start + len(search_lines)] = replace_lines
+        code = '\n'.join(lines)
+    return code
+
+
+def apply_unified_diff(code: str, diff: str) -> str:
+    """
+    应用 unified diff（按上下文定位，行号只作为提示，容忍行号偏移和缩进差异）
+
+    Raises:
+        PatchError: 没有 hunk 或某个 hunk 的上下文在代码中找不到
+    """
+    hunks: List[Tuple[int, List[str], List[str]]] = []
+    current: Optional[Tuple[int, List[str], List[str]]] = None
+    for line in diff.split('\n'):
+        header = _HUNK_HEADER.match(line)
+        if header:
+            current = (int(header.group(1)) - 1, [], [])
+            hunks.append(current)
+            continue
+        if current is None or line.startswith(('---', '+++', '\\')):
+            continue
+        marker, content = (line[:1], line[1:]) if line else (' ', '')
+        if marker == '-':
+            current[1].append(content)
+        elif marker == '+':
+            current[2].append(content)
+        elif marker == ' ':
+            current[1].append(content)
+            current[2].append(content)
+        else:
+            # 模型输出的上下文行有时缺少前导空格
+            current[1].append(line)
+            current[2].append(line)
+    if not hunks:
+        raise PatchError("Diff contains no hunks")
+
+    lines = code.split('\n')
+    offset = 0
+    for number, (hint, old, new) in enumerate(hunks, 1):
+        # 去掉 hunk 末尾多余的空上下文行（代码块结束前的空行）
+        while old and new and old[-1] == '' and new[-1] == '':
+            old.pop()
+            new.pop()
+        if not old:
+            # 纯新增：插入到提示位置
+            position = min(max(hint + offset, 0), len(lines))
+        else:
+            positions = _find_block(lines, old, hint + offset)
+            if not positions:
+                raise PatchError(f"Hunk {number}: context not found near line {hint + 1}")
+            position = positions[0]
+        lines[position:position + len(old)] = new
+        offset += len(new) - len(old)
+    return '\n'.join(lines)
+
+
+def apply_correction_response(code: str, response: str) -> Tuple[str, str, int]:
+    """
+    将 CorrectAgent 的响应应用到当前代码
+
+    依次识别 SEARCH/REPLACE 块、unified diff、完整代码块（没有代码块时，
+    只有看起来是完整模块的响应才作为完整代码）
+
+    Args:
+        code: 当前代码
+        response: Agent 响应文本
+
+    Returns:
+        (修正后的代码, 模式 'search_replace'/'diff'/'full', 编辑块数)
+
+    Raises:
+        PatchError: 补丁无法应用，或应用后括号不再配对（原代码配对时）
+    """
+    from utils.parsers import extract_code_from_response
+    from utils.static_review import check_brackets
+
+    edits = parse_search_replace(response)
+    if edits:
+        patched, mode, count = apply_search_replace(code, edits), 'search_replace', len(edits)
+    else:
+        diff = extract_diff(response)
+        if diff:
+            patched, mode = apply_unified_diff(code, diff), 'diff'
+            count = len(re.findall(r'^@@ -\d+', diff, re.MULTILINE))
+        else:
+            patched, mode, count = extract_code_from_response(response), 'full', 1
+            if len(patched.strip()) < 50:
+                raise PatchError("Response contains neither edits nor complete code")
+            # 没有代码块时整个响应被当作代码：只有括号配对且包含 import/export 时才接受，
+            # 否则说明文字（如 "I've updated the file"）会覆盖组件
+            if not _FENCED_CODE.search(response) and (
+                    check_brackets(patched) or not _MODULE_STATEMENT.search(patched)):
+                raise PatchError("Response contains no code block and does not look like code")
+
+    if mode != 'full' and check_brackets(code) is None:
+        problem = check_brackets(patched)
+        if problem:
+            raise PatchError(f"Patched code no longer parses: {problem}")
+    return patched, mode, count
+
+
+class CorrectionStats:
+    """修正迭代的输出 token 和耗时统计（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.corrections: List[Dict[str, Any]] = []
+
+    def record(self, mode: str, output_tokens: int, code_tokens: int, latency: float,
+               fallback: bool = False, input_tokens: int = 0) -> None:
+        """
+        记录一次修正
+
+        Args:
+            mode: 最终使用的模式（search_replace/diff/full）
+            output_tokens: 本次修正所有 LLM 响应的输出 token 数（含失败的补丁尝试）
+            code_tokens: 修正后完整代码的 token 数（完整重新生成需要的输出量）
+            latency: 本次修正耗时（秒）
+            fallback: 是否因补丁无法应用退回了完整重新生成
+            input_tokens: 本次修正发送的 prompt token 数（含回退时的第二次请求）
+        """
+        with self._lock:
+            self.corrections.append({
+                'mode': mode,
+                'output_tokens': output_tokens,
+                'code_tokens': code_tokens,
+                'latency': latency,
+                'fallback': fallback,
+                'input_tokens': input_tokens,
+            })
+
+    def report(self) -> str:
+        """生成修正统计报告"""
+        with self._lock:
+            corrections = list(self.corrections)
+        if not corrections:
+            return "Corrections: none"
+        patched = sum(1 for entry in corrections if entry['mode'] != 'full')
+        fallbacks = sum(1 for entry in corrections if entry['fallback'])
+        output = sum(entry['output_tokens'] for entry in corrections)
+        full = sum(entry['code_tokens'] for entry in corrections)
+        latency = sum(entry['latency'] for entry in corrections)
+        per_iteration = ', '.join(str(entry['input_tokens']) for entry in corrections)
+        return (
+            f"Corrections: {len(corrections)} ({patched} patched, {len(corrections) - patched} full, "
+            f"{fallbacks} fallbacks), output {output} tokens vs ~{full} for full rewrites, "
+            f"avg latency {latency / len(corrections):.1f}s, input tokens per iteration [{per_iteration}]"
+        )
+
+    def reset(self) -> None:
+        """清空统计"""
+        with self._lock:
+            self.corrections.clear()
+
+
+# 创建全局修正统计实例
+correction_stats = CorrectionStats()
@@ -232,20 +232,21 @@ def flatten_dependencies(dependency_tree: Dict[str, Dict]) -> List[Dict]:
         dependency_tree: 依赖树
     
     Returns:
-        扁平化的依赖组件列表
+        扁平化的依赖组件列表（depth 为依赖深度，直接依赖为 1）
     """
     flattened = []
     
-    def _flatten(deps: Dict[str, Dict]):
+    def _flatten(deps: Dict[str, Dict], depth: int = 1):
         for dep_resource_type, dep_info in deps.items():
             flattened.append({
                 'resource_type': dep_resource_type,
                 'path': dep_info['path'],
-                'files': dep_info.get('files', [])
+                'files': dep_info.get('files', []),
+                'depth': depth
             })
             # 递归处理嵌套依赖
             if 'dependencies' in dep_info:
-                _flatten(dep_info['dependencies'])
+                _flatten(dep_info['dependencies'], depth + 1)
     
     root = dependency_tree.get('root', {})
     if 'dependencies' in root:
@@ -254,6 +255,24 @@ def flatten_dependencies(dependency_tree: Dict[str, Dict]) -> List[Dict]:
     return flattened
 
 
+def dependency_file_depths(dependency_tree: Optional[Dict[str, Dict]]) -> Dict[str, int]:
+    """
+    依赖组件中每个文件的依赖深度（同一文件出现多次时取最浅的深度）
+
+    Args:
+        dependency_tree: 依赖树（None 时返回空字典）
+
+    Returns:
+        文件绝对路径 → 依赖深度
+    """
+    depths: Dict[str, int] = {}
+    for dep in flatten_dependencies(dependency_tree or {}):
+        for file_path in dep['files']:
+            key = os.path.abspath(file_path)
+            depths[key] = min(depths.get(key, dep['depth']), dep['depth'])
+    return depths
+
+
 def get_all_dependency_files(dependency_tree: Dict[str, Dict]) -> List[str]:
     """
     获取所有依赖组件的文件列表
@@ -0,0 +1,171 @@
+"""
+文件分析结果的内容寻址缓存
+以 (文件内容哈希, 文件类型, 分析 prompt 版本) 为键缓存 FileAnalysisResult，
+跨组件、跨批次、跨运行复用：仓库中大量复制的 .content.xml、_cq_editConfig.xml、
+clientlib js.txt 等内容相同的文件只会发送给模型一次
+"""
+import hashlib
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from utils.llm_cache import LLMResponseCache, llm_cache
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(content: str) -> str:
+    """文件内容哈希（按原始字节，不做规范化）"""
+    return hashlib.sha256(content.encode('utf-8', errors='surrogateescape')).hexdigest()
+
+
+def is_cacheable_analysis(analysis: Dict[str, Any]) -> bool:
+    """分析失败（错误或无法解析）的结果不缓存"""
+    purpose = str(analysis.get('purpose', ''))
+    return bool(analysis) and not purpose.startswith('Error:') and purpose != 'Analysis failed'
+
+
+class FileAnalysisCache:
+    """
+    文件分析缓存（内存 + 磁盘，线程安全）
+
+    同一内容的分析正在进行时，其他线程等待该结果而不是重复调用模型。
+    绕过缓存（--no-cache）时只跳过磁盘读取，本次运行内相同内容仍只分析一次。
+
+    用法：
+        analysis = file_analysis_cache.get_or_compute(
+            content, file_type, prompt_version, file_path,
+            compute=lambda: analyze(file_path)
+        )
+    """
+
+    def __init__(self, store: Optional[LLMResponseCache] = None):
+        """
+        Args:
+            store: 磁盘存储（None 表示在 LLM 缓存目录下的 file_analysis 子目录中创建）
+        """
+        if store is None:
+            from config import Config
+            store = LLMResponseCache(
+                cache_dir=str(Path(Config.normalize_path(Config.LLM_CACHE_DIR)) / 'file_analysis'),
+                prompt_version=''
+            )
+        self.store = store
+        self._memory: Dict[str, Dict[str, Any]] = {}
+        self._in_flight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def make_key(content: str, file_type: str, prompt_version: str) -> str:
+        """缓存键：内容哈希 + 文件类型 + 分析 prompt 版本"""
+        raw = f"{content_hash(content)}:{file_type}:{prompt_version}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _bypassed(self) -> bool:
+        return self.store.bypass or llm_cache.bypass
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存的分析结果（内存优先，其次磁盘）"""
+        if not self.store.enabled:
+            return None
+
+        with self._lock:
+            analysis = self._memory.get(key)
+        if analysis is not None or self._bypassed():
+            return analysis
+
+        entry = self.store.get(key, agent_name='FileAnalysisCache')
+        if entry is None:
+            return None
+
+        analysis = entry.get('value')
+        if isinstance(analysis, dict):
+            with self._lock:
+                self._memory[key] = analysis
+            return analysis
+        return None
+
+    def put(self, key: str, analysis: Dict[str, Any], elapsed: float = 0.0) -> None:
+        """写入分析结果"""
+        if not self.store.enabled or not is_cacheable_analysis(analysis):
+            return
+        with self._lock:
+            self._memory[key] = analysis
+        self.store.put(key, analysis, 'json', agent_name='FileAnalysisCache', elapsed=elapsed)
+
+    def get_or_compute(
+        self,
+        content: str,
+        file_type: str,
+        prompt_version: str,
+        file_path: str,
+        compute: Callable[[], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        返回缓存的分析结果，未命中时调用 compute() 并缓存
+
+        命中时返回结果的副本，并将 file_path 替换为当前文件路径。
+
+        Args:
+            content: 文件内容
+            file_type: 文件类型
+            prompt_version: 分析 prompt 版本
+            file_path: 当前文件路径
+            compute: 实际执行分析的函数
+
+        Returns:
+            分析结果字典
+        """
+        if not self.store.enabled:
+            return compute()
+
+        key = self.make_key(content, file_type, prompt_version)
+
+        while True:
+            cached = self.get(key)
+            if cached is not None:
+                with self._lock:
+                    self.stats['hits'] += 1
+                logger.debug(f"File analysis cache hit: {file_path}")
+                return {**cached, 'file_path': file_path}
+
+            with self._lock:
+                event = self._in_flight.get(key)
+                if event is None:
+                    # 由当前线程负责计算
+                    event = self._in_flight[key] = threading.Event()
+                    owner = True
+                else:
+                    owner = False
+
+            if not owner:
+                # 等待相同内容的分析完成后重新读取（失败时由下一个线程重新计算）
+                event.wait()
+                continue
+
+            try:
+                with self._lock:
+                    self.stats['misses'] += 1
+                start = time.perf_counter()
+                analysis = compute()
+                self.put(key, analysis, elapsed=time.perf_counter() - start)
+                return analysis
+            finally:
+                with self._lock:
+                    self._in_flight.pop(key, None)
+                event.set()
+
+    def report(self) -> str:
+        """生成命中统计报告"""
+        with self._lock:
+            hits, misses = self.stats['hits'], self.stats['misses']
+        total = hits + misses
+        ratio = hits / total if total else 0.0
+        return f"File analysis cache: {hits} hits / {total} files ({ratio:.0%})"
+
+
+# 创建全局文件分析缓存实例
+file_analysis_cache = FileAnalysisCache()
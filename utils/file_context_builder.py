@@ -2,7 +2,8 @@
 文件上下文构建工具
 为每个 AEM 文件提供清晰的说明和上下文信息，帮助 LLM 更好地理解文件作用
 """
-from typing import Dict, List, Any
+import os
+from typing import Dict, List, Any, Optional, Tuple
 from utils.aem_utils import identify_aem_file_type
 
 
@@ -178,63 +179,83 @@ Key Information:
     return context
 
 
-def build_comprehensive_context(file_analyses: List[Dict[str, Any]]) -> str:
+def analysis_depths(
+    file_analyses: List[Dict[str, Any]],
+    dependency_tree: Optional[Dict[str, Dict]] = None
+) -> List[int]:
     """
-    为所有文件构建综合上下文
+    每个文件分析结果的依赖深度（当前组件的文件为 0）
+    
+    分析结果中的 dependency_depth 优先，否则按文件在依赖树中所属组件的深度
     
     Args:
         file_analyses: 文件分析结果列表
+        dependency_tree: 依赖树（dependency_resolver.build_dependency_tree 的返回值）
     
     Returns:
-        综合上下文信息
+        与 file_analyses 对应的深度列表
     """
-    contexts = []
+    from utils.dependency_resolver import dependency_file_depths
     
+    file_depths = dependency_file_depths(dependency_tree)
+    depths = []
     for analysis in file_analyses:
-        context = build_file_context(analysis)
-        contexts.append(context)
-    
-    return "\n\n".join(contexts)
+        depth = analysis.get('dependency_depth')
+        if depth is None:
+            file_path = analysis.get('file_path')
+            depth = file_depths.get(os.path.abspath(file_path), 0) if file_path else 0
+        depths.append(int(depth))
+    return depths
 
 
-def enhance_code_generation_prompt(
+def build_comprehensive_context(
     file_analyses: List[Dict[str, Any]],
-    base_prompt: str
+    max_tokens: Optional[int] = None,
+    dependency_tree: Optional[Dict[str, Dict]] = None
 ) -> str:
     """
-    增强代码生成 prompt，添加文件上下文说明
+    为所有文件构建综合上下文
     
     Args:
         file_analyses: 文件分析结果列表
-        base_prompt: 基础 prompt
+        max_tokens: token 预算（None 表示不限制），超出时低优先级文件降级为摘要
+        dependency_tree: 依赖树（用于按依赖深度降低依赖组件文件的优先级）
     
     Returns:
-        增强后的 prompt
+        综合上下文信息
     """
-    # 为每个文件添加上下文
-    file_contexts = []
-    
-    for analysis in file_analyses:
-        file_type = analysis.get('file_type', 'unknown')
-        file_path = analysis.get('file_path', 'unknown')
-        description = get_file_description(file_type, file_path)
+    if max_tokens is not None:
+        from utils.token_budget import TokenBudgeter
         
-        file_contexts.append(f"""
-File: {file_path} ({file_type})
-{description}
-Purpose: {analysis.get('purpose', 'N/A')}
-""")
+        budgeter = TokenBudgeter(max_tokens=max_tokens)
+        for analysis, depth in zip(file_analyses, analysis_depths(file_analyses, dependency_tree)):
+            budgeter.add_section(
+                name=analysis.get('file_path', 'unknown'),
+                content=build_file_context(analysis),
+                kind='dependency_analysis' if depth else 'file_analysis',
+                file_type=analysis.get('file_type'),
+                depth=depth,
+                summary=(
+                    f"File: {analysis.get('file_path', 'unknown')} "
+                    f"({analysis.get('file_type', 'unknown')})\n"
+                    f"Purpose: {analysis.get('purpose', 'N/A')}"
+                )
+            )
+        return budgeter.pack()['text']
     
-    contexts_section = "\n".join(file_contexts)
+    contexts = []
     
-    enhanced_prompt = f"""{base_prompt}
+    for analysis in file_analyses:
+        context = build_file_context(analysis)
+        contexts.append(context)
+    
+    return "\n\n".join(contexts)
 
-=== FILE CONTEXTS AND THEIR ROLES ===
-Each file in the AEM component serves a specific purpose. Understanding these roles is crucial for accurate conversion:
 
-{contexts_section}
+# 静态前缀中文件类型描述的固定顺序（保证前缀字节级一致，便于服务端 prefix caching）
+FILE_TYPE_ORDER = ['htl', 'html', 'dialog', 'js', 'java', 'css', 'config']
 
-=== KEY CONVERSION PRINCIPLES ===
+KEY_CONVERSION_PRINCIPLES = """=== KEY CONVERSION PRINCIPLES ===
 1. HTL Template → React JSX Structure (1:1 mapping of HTML elements)
 2. Dialog Fields → React Props Interface (direct mapping)
 3. JavaScript Logic → React Hooks & Event Handlers
@@ -242,7 +263,107 @@ Each file in the AEM component serves a specific purpose. Understanding these ro
 5. Data-sly-repeat → Array.map()
 6. Data-sly-test → Conditional rendering
 
-Remember: The HTL template shows you WHAT to render, the Dialog shows you WHAT data is available, and the JS shows you HOW users interact with it.
-"""
+Remember: The HTL template shows you WHAT to render, the Dialog shows you WHAT data is available, and the JS shows you HOW users interact with it."""
+
+
+def build_static_prompt_prefix() -> str:
+    """
+    构建代码生成 prompt 的静态前缀
+    
+    包含所有文件类型描述（每种类型仅出现一次）和转换原则，
+    与具体组件无关，每次调用字节级一致，可被服务端 prefix caching 命中。
+    
+    Returns:
+        静态前缀文本
+    """
+    descriptions = [
+        f"--- {file_type} ---\n{get_file_description(file_type, '')}"
+        for file_type in FILE_TYPE_ORDER
+    ]
+    
+    return f"""=== FILE TYPE REFERENCE ===
+Each file in the AEM component serves a specific purpose. Understanding these roles is crucial for accurate conversion:
+
+{chr(10).join(descriptions)}
+
+{KEY_CONVERSION_PRINCIPLES}"""
+
+
+def build_code_generation_prompt_parts(
+    file_analyses: List[Dict[str, Any]],
+    base_prompt: str,
+    max_tokens: Optional[int] = None,
+    dependency_tree: Optional[Dict[str, Dict]] = None,
+    reserved_tokens: int = 0
+) -> Tuple[str, str]:
+    """
+    将代码生成 prompt 拆分为静态前缀和可变后缀
+    
+    可变后缀由 TokenBudgeter 打包：基础 prompt 完整保留，各文件分析按文件类型优先级
+    和依赖深度排序，超出预算时低优先级的先降级为摘要（文件、类型、用途、关键特性）再丢弃，
+    重复内容块跨段落去重
+    
+    Args:
+        file_analyses: 文件分析结果列表
+        base_prompt: 基础 prompt（本次运行的任务内容）
+        max_tokens: 输入 token 预算（None 表示使用 Config.MAX_INPUT_TOKENS）
+        dependency_tree: 依赖树（用于按依赖深度降低依赖组件文件的优先级）
+        reserved_tokens: 预算中预留给其他内容（如系统提示词）的 token 数，静态前缀另外计入
+    
+    Returns:
+        (static_prefix, variable_suffix)
+    """
+    from utils.token_budget import TokenBudgeter, estimate_tokens
+    
+    static_prefix = build_static_prompt_prefix()
+    budgeter = TokenBudgeter(
+        max_tokens=max_tokens,
+        reserved_tokens=reserved_tokens + estimate_tokens(static_prefix)
+    )
+    budgeter.add_section(
+        'task',
+        f"""{base_prompt}
+
+=== FILES IN THIS COMPONENT ===
+(See FILE TYPE REFERENCE above for the role of each file type.)""",
+        kind='instructions',
+        required=True
+    )
+    for analysis, depth in zip(file_analyses, analysis_depths(file_analyses, dependency_tree)):
+        budgeter.add_analysis(
+            analysis,
+            depth=depth,
+            kind='dependency_analysis' if depth else 'file_analysis'
+        )
+    
+    variable_suffix = budgeter.pack()['text'] + "\n"
+    
+    return static_prefix, variable_suffix
+
+
+def enhance_code_generation_prompt(
+    file_analyses: List[Dict[str, Any]],
+    base_prompt: str,
+    max_tokens: Optional[int] = None,
+    dependency_tree: Optional[Dict[str, Dict]] = None
+) -> str:
+    """
+    增强代码生成 prompt，添加文件上下文说明
+    
+    静态内容（文件类型描述、转换原则）放在前面，本次运行的内容放在后面，
+    以便命中服务端 prefix caching。
+    
+    Args:
+        file_analyses: 文件分析结果列表
+        base_prompt: 基础 prompt
+        max_tokens: 输入 token 预算（None 表示使用 Config.MAX_INPUT_TOKENS）
+        dependency_tree: 依赖树
+    
+    Returns:
+        增强后的 prompt
+    """
+    static_prefix, variable_suffix = build_code_generation_prompt_parts(
+        file_analyses, base_prompt, max_tokens=max_tokens, dependency_tree=dependency_tree
+    )
     
-    return enhanced_prompt
+    return f"{static_prefix}\n\n{variable_suffix}"
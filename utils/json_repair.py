@@ -0,0 +1,379 @@
+"""
+LLM 输出中 JSON 的容错提取与修复
+单次扫描定位 JSON 片段（代码块优先、字符串感知的括号匹配，不使用贪婪正则），
+并修复模型输出中常见的问题：
+- 尾随逗号、重复逗号、注释
+- 单引号字符串、未加引号的键、Python 字面量（True/False/None）
+- 字符串中未转义的换行和控制字符
+- 截断的结尾（未闭合的字符串、括号，缺失的值）
+"""
+import json
+import logging
+import re
+from typing import Any, Iterator, List, Optional, Tuple, Type, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+_FENCED_BLOCK = re.compile(r'```[ \t]*(?:json|JSON|javascript|js)?[ \t]*\n(.*?)(?:```|\Z)', re.DOTALL)
+_NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?$')
+_BARE_LITERALS = {
+    'true': 'true', 'false': 'false', 'null': 'null',
+    'True': 'true', 'False': 'false', 'None': 'null',
+    'NaN': 'null', 'Infinity': 'null', '-Infinity': 'null', 'undefined': 'null',
+}
+_CONTROL_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t', '\b': '\\b', '\f': '\\f'}
+_BARE_TOKEN_END = set(' \t\r\n,:[]{}"\'')
+
+_OPENERS = {'{': '}', '[': ']'}
+
+
+class JSONRepairError(ValueError):
+    """文本中没有可以修复的 JSON"""
+
+
+def _scan_balanced(text: str, start: int) -> Tuple[int, bool]:
+    """
+    从 text[start]（'{' 或 '['）开始做字符串感知的括号匹配
+
+    Returns:
+        (结束位置（不含）, 是否完整闭合)；未闭合时结束位置为文本末尾
+    """
+    depth = 0
+    in_string = False
+    quote = ''
+    escape = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == quote:
+                in_string = False
+            continue
+        if char in '"\'':
+            # 单词中的撇号（如 don't）不是字符串起点
+            if char == "'" and index > 0 and text[index - 1].isalnum():
+                continue
+            in_string = True
+            quote = char
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            if depth == 0:
+                return index + 1, True
+    return len(text), False
+
+
+def iter_json_candidates(text: str) -> Iterator[str]:
+    """
+    按可能性顺序返回文本中的 JSON 片段
+
+    先返回 ```json 代码块的内容，再按出现顺序返回代码块外以 '{' 或 '[' 开头的平衡片段
+    （截断时返回到文本末尾的部分）。每个位置只扫描一次，总耗时与文本长度线性相关。
+    """
+    seen = set()
+    for match in _FENCED_BLOCK.finditer(text):
+        block = match.group(1).strip()
+        if block and block[0] in '{[' and block not in seen:
+            seen.add(block)
+            yield block
+
+    position = 0
+    while True:
+        starts = [index for index in (text.find('{', position), text.find('[', position)) if index >= 0]
+        if not starts:
+            return
+        start = min(starts)
+        end, _ = _scan_balanced(text, start)
+        candidate = text[start:end]
+        if candidate not in seen:
+            seen.add(candidate)
+            yield candidate
+        # '[' 开头但不是 JSON（如 markdown 链接）时从下一个字符继续
+        position = end if end > start + 1 else start + 1
+
+
+def repair_json(raw: str) -> str:
+    """
+    单次扫描修复 JSON 文本
+
+    只处理从第一个 '{' 或 '[' 开始的第一个顶层值，之后的内容被忽略。
+
+    Args:
+        raw: 可能有格式问题的 JSON 文本
+
+    Returns:
+        修复后的 JSON 文本（不保证一定可以解析）
+
+    Raises:
+        JSONRepairError: 文本中没有 '{' 或 '['
+    """
+    starts = [index for index in (raw.find('{'), raw.find('[')) if index >= 0]
+    if not starts:
+        raise JSONRepairError('no JSON object or array found')
+
+    out: List[str] = []
+    # 每层：[括号, 状态]；对象状态 key/colon/value/after，数组状态 value/after
+    stack: List[List[str]] = []
+    index = min(starts)
+    length = len(raw)
+
+    def value_done():
+        if stack:
+            stack[-1][1] = 'after'
+
+    def drop_trailing_comma():
+        while out and out[-1].isspace():
+            out.pop()
+        if out and out[-1] == ',':
+            out.pop()
+
+    def close_frame():
+        bracket, state = stack.pop()
+        if bracket == '{' and state == 'colon':
+            out.append(':null')
+        elif bracket == '{' and state == 'value':
+            out.append('null')
+        else:
+            drop_trailing_comma()
+        out.append(_OPENERS[bracket])
+        value_done()
+
+    def prepare_value():
+        """在当前层写入新的值（或键）之前补全缺失的逗号和冒号"""
+        frame = stack[-1]
+        if frame[1] == 'after':
+            out.append(',')
+            frame[1] = 'key' if frame[0] == '{' else 'value'
+        elif frame[0] == '{' and frame[1] == 'colon':
+            out.append(':')
+            frame[1] = 'value'
+
+    while index < length:
+        char = raw[index]
+
+        if char.isspace():
+            out.append(char)
+            index += 1
+            continue
+
+        # 注释
+        if char == '/' and raw.startswith('//', index):
+            newline = raw.find('\n', index)
+            index = length if newline < 0 else newline
+            continue
+        if char == '/' and raw.startswith('/*', index):
+            close = raw.find('*/', index + 2)
+            index = length if close < 0 else close + 2
+            continue
+
+        if char in '"\'':
+            if not stack:
+                break
+            prepare_value()
+            index = _read_string(raw, index, out)
+            if stack[-1][0] == '{' and stack[-1][1] == 'key':
+                stack[-1][1] = 'colon'
+            else:
+                value_done()
+            continue
+
+        if char in '{[':
+            if stack:
+                prepare_value()
+                if stack[-1][0] == '{' and stack[-1][1] == 'key':
+                    # 缺少键时插入占位，保证结构合法
+                    out.append('"_":')
+            stack.append([char, 'key' if char == '{' else 'value'])
+            out.append(char)
+            index += 1
+            continue
+
+        if char in '}]':
+            index += 1
+            if not any(frame[0] == ('{' if char == '}' else '[') for frame in stack):
+                continue  # 多余的闭合括号
+            # 括号不匹配时先闭合内层
+            while stack[-1][0] != ('{' if char == '}' else '['):
+                close_frame()
+            close_frame()
+            if not stack:
+                break
+            continue
+
+        if char == ',':
+            index += 1
+            if stack and stack[-1][1] == 'after':
+                out.append(',')
+                stack[-1][1] = 'key' if stack[-1][0] == '{' else 'value'
+            continue
+
+        if char == ':':
+            index += 1
+            if stack and stack[-1][0] == '{' and stack[-1][1] == 'colon':
+                out.append(':')
+                stack[-1][1] = 'value'
+            continue
+
+        # 裸词：数字、字面量或未加引号的键
+        end = index
+        while end < length and raw[end] not in _BARE_TOKEN_END:
+            end += 1
+        token = raw[index:end]
+        index = end
+        if not stack:
+            break
+
+        prepare_value()
+        frame = stack[-1]
+        if frame[0] == '{' and frame[1] == 'key':
+            # 未加引号的键
+            out.append(json.dumps(token))
+            frame[1] = 'colon'
+            continue
+        out.append(_bare_value(token, truncated=index >= length))
+        value_done()
+
+    # 截断：从内到外闭合
+    while stack:
+        close_frame()
+
+    return ''.join(out)
+
+
+def _read_string(raw: str, index: int, out: List[str]) -> int:
+    """读取一个字符串（单引号转为双引号，转义控制字符），返回字符串之后的位置；截断时补全结束引号"""
+    quote = raw[index]
+    index += 1
+    length = len(raw)
+    parts = ['"']
+    while index < length:
+        char = raw[index]
+        if char == '\\' and index + 1 < length:
+            following = raw[index + 1]
+            if quote == "'" and following == "'":
+                parts.append("'")
+            elif following in '"\\/bfnrt' or (following == 'u' and re.match(r'[0-9a-fA-F]{4}', raw[index + 2:index + 6])):
+                parts.append(char + following)
+            else:
+                # 无效转义：保留反斜杠本身
+                parts.append('\\\\' + following if following != '\n' else '\\n')
+            index += 2
+            continue
+        if char == '\\':
+            index += 1
+            continue
+        if char == quote:
+            index += 1
+            break
+        if char == '"':
+            parts.append('\\"')
+        elif char in _CONTROL_ESCAPES:
+            parts.append(_CONTROL_ESCAPES[char])
+        elif ord(char) < 0x20:
+            parts.append(f"\\u{ord(char):04x}")
+        else:
+            parts.append(char)
+        index += 1
+    parts.append('"')
+    out.append(''.join(parts))
+    return index
+
+
+def _bare_value(token: str, truncated: bool) -> str:
+    if token in _BARE_LITERALS:
+        return _BARE_LITERALS[token]
+    if _NUMBER.match(token):
+        return token
+    if truncated:
+        # 截断的数字或字面量（如 "12."、"tr"）
+        number = token.rstrip('.eE+-')
+        if _NUMBER.match(number):
+            return number
+        for literal in ('true', 'false', 'null'):
+            if literal.startswith(token):
+                return literal
+    return json.dumps(token)
+
+
+def loads_tolerant(text: str, expect: Optional[type] = None) -> Any:
+    """
+    从 LLM 输出中解析 JSON（直接解析 → 候选片段 → 修复后的候选片段）
+
+    Args:
+        text: LLM 输出文本
+        expect: 期望的顶层类型（如 dict）；指定时跳过其他类型的候选，
+            避免说明文字中的 "see [1]" 被当作结果
+
+    Raises:
+        JSONRepairError: 无法得到合法的（符合 expect 的）JSON
+    """
+    def accepted(value: Any) -> bool:
+        return expect is None or isinstance(value, expect)
+
+    # 嵌套过深的输入（如 '{' * 20000）使 json.loads 抛出 RecursionError，按无法解析处理
+    try:
+        value = json.loads(text)
+        if accepted(value):
+            return value
+    except (json.JSONDecodeError, RecursionError, TypeError):
+        pass
+
+    candidates = list(iter_json_candidates(text))
+    for candidate in candidates:
+        try:
+            value = json.loads(candidate)
+        except (json.JSONDecodeError, RecursionError):
+            continue
+        if accepted(value):
+            return value
+    for candidate in candidates:
+        try:
+            value = json.loads(repair_json(candidate))
+        except (json.JSONDecodeError, JSONRepairError, RecursionError):
+            continue
+        if accepted(value):
+            return value
+    raise JSONRepairError('no parseable JSON in text' if expect is None
+                          else f'no parseable JSON {expect.__name__} in text')
+
+
+def parse_structured_output(text: str, schema: Type[T]) -> Optional[T]:
+    """
+    将文本直接校验为 Pydantic 模型
+
+    依次尝试原文和每个候选片段（原样及修复后）的 schema.model_validate_json，
+    返回第一个通过校验的实例；全部失败时返回 None（此时才需要重新调用 LLM）。
+
+    Args:
+        text: LLM 输出文本
+        schema: Pydantic 模型类
+
+    Returns:
+        模型实例或 None
+    """
+    from pydantic import ValidationError
+
+    def attempts() -> Iterator[str]:
+        yield text
+        for candidate in iter_json_candidates(text):
+            yield candidate
+            try:
+                repaired = repair_json(candidate)
+            except JSONRepairError:
+                continue
+            if repaired != candidate:
+                yield repaired
+
+    for attempt in attempts():
+        try:
+            return schema.model_validate_json(attempt)
+        except (ValidationError, RecursionError):
+            continue
+    logger.debug(f"Could not repair output into {getattr(schema, '__name__', schema)}")
+    return None
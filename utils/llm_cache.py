@@ -0,0 +1,464 @@
+"""
+LLM 响应磁盘缓存
+以 (模型, 系统提示词哈希, 消息哈希, 工具签名, 输出 schema, temperature, prompt 版本) 为键，
+将 Agent 调用结果（含结构化输出）持久化到磁盘，重复运行时直接复用
+支持按总大小的 LRU 淘汰、TTL 过期、单次运行绕过缓存以及命中统计报告
+"""
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8', errors='replace')).hexdigest()
+
+
+def serialize_messages(messages: Optional[List[Any]]) -> List[Dict[str, Any]]:
+    """
+    将消息列表转换为可哈希的稳定结构
+
+    Args:
+        messages: LangChain 消息对象或 {'role', 'content'} 字典列表
+
+    Returns:
+        [{'type': ..., 'content': ...}, ...]
+    """
+    serialized = []
+    for message in messages or []:
+        if isinstance(message, dict):
+            serialized.append({
+                'type': message.get('type') or message.get('role'),
+                'content': message.get('content'),
+            })
+        else:
+            serialized.append({
+                'type': getattr(message, 'type', type(message).__name__),
+                'content': getattr(message, 'content', str(message)),
+            })
+    return serialized
+
+
+def tools_signature(tools: Optional[List[Any]]) -> List[Tuple[str, str]]:
+    """工具签名：按名称排序的 (name, description) 列表"""
+    signature = []
+    for tool in tools or []:
+        name = getattr(tool, 'name', None) or getattr(tool, '__name__', repr(tool))
+        description = getattr(tool, 'description', None) or getattr(tool, '__doc__', None) or ''
+        signature.append((name, description.strip()))
+    return sorted(signature)
+
+
+def schema_signature(output_schema: Any) -> Optional[Dict[str, Any]]:
+    """输出 schema 签名（Pydantic 模型使用 JSON Schema，字段变化时缓存自动失效）"""
+    if output_schema is None:
+        return None
+    if hasattr(output_schema, 'model_json_schema'):
+        return output_schema.model_json_schema()
+    return {'name': getattr(output_schema, '__name__', repr(output_schema))}
+
+
+class LLMResponseCache:
+    """
+    LLM 响应磁盘缓存（线程安全）
+
+    每个条目存储为 <cache_dir>/<key[:2]>/<key>.json，命中时更新文件修改时间，
+    总大小超出上限时按修改时间从旧到新淘汰（LRU）。
+
+    用法：
+        cache = LLMResponseCache()
+        key = cache.make_key(model=..., system_prompt=..., messages=[...])
+        value = cache.get(key)
+        if value is None:
+            value = call_llm()
+            cache.put(key, value)
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        prompt_version: Optional[str] = None,
+        enabled: Optional[bool] = None
+    ):
+        """
+        Args:
+            cache_dir: 缓存目录（None 表示使用 Config.LLM_CACHE_DIR）
+            max_bytes: 缓存总大小上限（None 表示使用 Config.LLM_CACHE_MAX_MB）
+            ttl_seconds: 条目有效期（None 表示使用 Config.LLM_CACHE_TTL_HOURS，0 表示永不过期）
+            prompt_version: prompt 版本盐值，修改 prompt 后递增即可使旧缓存失效
+            enabled: 是否启用（None 表示使用 Config.LLM_CACHE_ENABLED）
+        """
+        from config import Config
+
+        self.cache_dir = Path(cache_dir or Config.normalize_path(Config.LLM_CACHE_DIR))
+        self.max_bytes = max_bytes if max_bytes is not None else Config.LLM_CACHE_MAX_MB * 1024 * 1024
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.LLM_CACHE_TTL_HOURS * 3600
+        self.prompt_version = prompt_version if prompt_version is not None else Config.LLM_CACHE_PROMPT_VERSION
+        self.enabled = enabled if enabled is not None else Config.LLM_CACHE_ENABLED
+
+        # 为 True 时本次运行不读取缓存，但仍写入新结果（刷新缓存）
+        self.bypass = False
+
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'expired': 0,
+            'evictions': 0,
+            'bypassed': 0,
+            'seconds_saved': 0.0,
+        }
+        self._hits_by_agent: Dict[str, int] = {}
+
+    def make_key(
+        self,
+        model: Optional[str],
+        system_prompt: Optional[str],
+        messages: Optional[List[Any]],
+        tools: Optional[List[Any]] = None,
+        output_schema: Any = None,
+        temperature: Optional[float] = None,
+        **extra: Any
+    ) -> str:
+        """
+        计算缓存键
+
+        Args:
+            model: 模型名称
+            system_prompt: 系统提示词
+            messages: 输入消息列表
+            tools: 工具列表
+            output_schema: 输出 schema（Pydantic 模型类）
+            temperature: 采样温度
+            **extra: 其他影响结果的参数（如 return_structured）
+
+        Returns:
+            十六进制缓存键
+        """
+        payload = {
+            'version': self.prompt_version,
+            'model': model,
+            'system_prompt': _hash_text(system_prompt or ''),
+            'messages': _hash_text(json.dumps(serialize_messages(messages), ensure_ascii=False, default=str)),
+            'tools': tools_signature(tools),
+            'schema': schema_signature(output_schema),
+            'temperature': temperature,
+            'extra': extra,
+        }
+        return _hash_text(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str))
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str, agent_name: str = '') -> Optional[Dict[str, Any]]:
+        """
+        读取缓存条目
+
+        Args:
+            key: 缓存键
+            agent_name: Agent 名称（用于统计）
+
+        Returns:
+            条目字典（包含 value、value_type、elapsed 等），未命中、过期或绕过时返回 None
+        """
+        if not self.enabled:
+            return None
+        if self.bypass:
+            with self._lock:
+                self.stats['bypassed'] += 1
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+
+        if self.ttl_seconds and time.time() - entry.get('created_at', 0) > self.ttl_seconds:
+            self._remove(path)
+            with self._lock:
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+            return None
+
+        try:
+            # 更新修改时间，作为 LRU 的访问时间
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.stats['hits'] += 1
+            self.stats['seconds_saved'] += entry.get('elapsed', 0.0)
+            if agent_name:
+                self._hits_by_agent[agent_name] = self._hits_by_agent.get(agent_name, 0) + 1
+
+        return entry
+
+    def put(self, key: str, value: Any, value_type: str = 'json',
+            agent_name: str = '', elapsed: float = 0.0) -> None:
+        """
+        写入缓存条目（原子替换）
+
+        Args:
+            key: 缓存键
+            value: 可 JSON 序列化的值
+            value_type: 值类型（'str'、'json' 或 'model'）
+            agent_name: Agent 名称
+            elapsed: 原始调用耗时（秒），命中时计入节省时间
+        """
+        if not self.enabled:
+            return
+
+        entry = {
+            'key': key,
+            'agent': agent_name,
+            'created_at': time.time(),
+            'elapsed': elapsed,
+            'value_type': value_type,
+            'value': value,
+        }
+        try:
+            data = json.dumps(entry, ensure_ascii=False, default=str).encode('utf-8')
+        except (TypeError, ValueError) as e:
+            logger.debug(f"LLM cache: value not serializable, skipped: {e}")
+            return
+
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            old_size = path.stat().st_size if path.exists() else 0
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"LLM cache: failed to write {path}: {e}")
+            return
+
+        with self._lock:
+            self.stats['stores'] += 1
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += len(data) - old_size
+            over_limit = self.max_bytes and self._total_bytes > self.max_bytes
+
+        if over_limit:
+            self.evict()
+
+    def _iter_entries(self) -> Iterator[Path]:
+        if not self.cache_dir.exists():
+            return iter(())
+        return self.cache_dir.glob('*/*.json')
+
+    def _scan_size(self) -> int:
+        total = 0
+        for path in self._iter_entries():
+            try:
+                total += path.stat().st_size
+            except OSError:
+                pass
+        return total
+
+    def _remove(self, path: Path) -> int:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+            return size
+        except OSError:
+            return 0
+
+    def evict(self) -> int:
+        """
+        按 LRU 淘汰条目，直到总大小降到上限的 90% 以下
+
+        Returns:
+            淘汰的条目数
+        """
+        entries = []
+        for path in self._iter_entries():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            total -= self._remove(path)
+            evicted += 1
+
+        with self._lock:
+            self._total_bytes = total
+            self.stats['evictions'] += evicted
+
+        if evicted:
+            logger.info(f"LLM cache: evicted {evicted} entries, {total} bytes remaining")
+        return evicted
+
+    def clear(self) -> None:
+        """删除所有缓存条目"""
+        for path in list(self._iter_entries()):
+            self._remove(path)
+        with self._lock:
+            self._total_bytes = 0
+
+    @contextmanager
+    def bypassed(self):
+        """在上下文中绕过缓存读取（仍写入新结果）"""
+        previous = self.bypass
+        self.bypass = True
+        try:
+            yield self
+        finally:
+            self.bypass = previous
+
+    def report(self) -> str:
+        """生成命中统计报告"""
+        with self._lock:
+            stats = dict(self.stats)
+            hits_by_agent = dict(self._hits_by_agent)
+
+        lookups = stats['hits'] + stats['misses']
+        hit_ratio = stats['hits'] / lookups if lookups else 0.0
+        lines = [
+            f"LLM cache: {stats['hits']} hits / {lookups} lookups ({hit_ratio:.0%}), "
+            f"{stats['stores']} stored, {stats['expired']} expired, "
+            f"{stats['evictions']} evicted, {stats['bypassed']} bypassed, "
+            f"~{stats['seconds_saved']:.1f}s saved"
+        ]
+        for agent_name, hits in sorted(hits_by_agent.items()):
+            lines.append(f"  {agent_name}: {hits} hits")
+        return "\n".join(lines)
+
+
+# 创建全局缓存实例
+llm_cache = LLMResponseCache()
+
+
+def _restore_value(value: Any, value_type: Optional[str], output_schema: Any) -> Any:
+    """将缓存或录制的值还原为调用结果（'model' 类型还原为 output_schema 实例）"""
+    if value_type == 'model' and output_schema is not None:
+        return output_schema.model_validate(value)
+    return value
+
+
+def cached_agent_call(func: Callable) -> Callable:
+    """
+    Agent 调用缓存装饰器，用于签名为 (agent, input_text, chat_history=None, return_structured=...)
+    的函数（BaseAgent.run 或 cached_run）
+
+    缓存键取自 agent 的 model_name、system_prompt、tools、output_schema、temperature
+    以及本次的 input_text、chat_history 和 return_structured。
+    只缓存成功的结果：要求结构化输出时，只有得到 output_schema 实例才写入缓存，
+    避免把解析失败的原始文本固化下来。
+
+    开启 cassette（utils.cassette）时以同一个键录制每次调用的结果，回放时直接返回录制的结果。
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        from utils.cassette import cassette
+        if not llm_cache.enabled and cassette.mode == 'off':
+            return func(self, *args, **kwargs)
+
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = bound.arguments
+        return_structured = arguments.get('return_structured', False)
+        output_schema = getattr(self, 'output_schema', None)
+        agent_name = getattr(self, 'name', type(self).__name__)
+
+        messages = list(arguments.get('chat_history') or []) + [
+            {'type': 'human', 'content': arguments.get('input_text', '')}
+        ]
+        key = llm_cache.make_key(
+            model=getattr(self, 'model_name', None),
+            system_prompt=getattr(self, 'system_prompt', None),
+            messages=messages,
+            tools=getattr(self, 'tools', None),
+            output_schema=output_schema,
+            temperature=getattr(self, 'temperature', None),
+            return_structured=return_structured,
+        )
+
+        # 回放：直接返回录制的结果（不读缓存，也不调用模型）
+        if cassette.replaying:
+            interaction = cassette.lookup('llm', key)
+            if interaction is not None:
+                return _restore_value(interaction['response'], interaction.get('value_type'), output_schema)
+
+        result = None
+        elapsed = 0.0
+        entry = llm_cache.get(key, agent_name=agent_name) if llm_cache.enabled else None
+        if entry is not None:
+            value = entry.get('value')
+            try:
+                result = _restore_value(value, entry.get('value_type'), output_schema)
+                logger.debug(f"{agent_name}: LLM cache hit")
+            except Exception as e:
+                # schema 变化导致旧条目无法解析时，视为未命中
+                logger.debug(f"{agent_name}: cached value no longer validates: {e}")
+                entry = None
+
+        if entry is None:
+            start = time.perf_counter()
+            with cassette.covering():
+                result = func(self, *args, **kwargs)
+            elapsed = time.perf_counter() - start
+
+        if output_schema is not None and isinstance(result, output_schema):
+            value, value_type = result.model_dump(mode='json'), 'model'
+        else:
+            value, value_type = result, 'str' if isinstance(result, str) else 'json'
+
+        if entry is None and llm_cache.enabled and (
+                value_type == 'model' or not (return_structured and output_schema is not None)):
+            llm_cache.put(key, value, value_type, agent_name, elapsed)
+        if cassette.recording:
+            # 缓存命中的结果也录制，保证 cassette 可以独立回放
+            cassette.record('llm', key, value, value_type, label=agent_name, elapsed=elapsed)
+
+        return result
+
+    return wrapper
+
+
+@cached_agent_call
+def cached_run(agent: Any, input_text: str, chat_history: Optional[List[Any]] = None,
+               return_structured: bool = False) -> Any:
+    """
+    以缓存（及 cassette 录制/回放）方式调用 agent.run
+
+    BaseAgent 不在源码中，调用点通过该函数接入缓存。只用于结果仅由输入决定的 Agent：
+    通过工具写文件的 Agent（如完整输出模式的 CorrectAgent、CodeWritingAgent）命中缓存时会丢失写入
+    """
+    kwargs: Dict[str, Any] = {}
+    if chat_history:
+        kwargs['chat_history'] = chat_history
+    if return_structured:
+        kwargs['return_structured'] = True
+    return agent.run(input_text, **kwargs)
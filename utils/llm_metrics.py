@@ -0,0 +1,202 @@
+"""
+LLM 调用用量统计
+按调用记录输入/输出 token 以及服务端 prefix caching 命中的 token 数
+"""
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def extract_usage(message: Any) -> Optional[Dict[str, int]]:
+    """
+    从 LLM 响应中提取 token 用量
+
+    支持以下格式：
+    - LangChain AIMessage.usage_metadata（input_tokens, output_tokens, input_token_details.cache_read）
+    - OpenAI 兼容接口的 response_metadata['token_usage']
+      （prompt_tokens, completion_tokens, prompt_tokens_details.cached_tokens）
+    - 直接传入的 usage 字典（以上任一格式）
+
+    Args:
+        message: AIMessage、响应字典或 usage 字典
+
+    Returns:
+        用量字典：input_tokens, output_tokens, cached_tokens；无法提取时返回 None
+    """
+    usage = None
+
+    if isinstance(message, dict):
+        usage = message.get('usage') or message.get('token_usage') or message
+    else:
+        usage = getattr(message, 'usage_metadata', None)
+        if not usage:
+            response_metadata = getattr(message, 'response_metadata', None) or {}
+            usage = response_metadata.get('token_usage') or response_metadata.get('usage')
+
+    if not isinstance(usage, dict):
+        return None
+
+    if 'input_tokens' in usage or 'output_tokens' in usage:
+        details = usage.get('input_token_details') or {}
+        return {
+            'input_tokens': int(usage.get('input_tokens') or 0),
+            'output_tokens': int(usage.get('output_tokens') or 0),
+            'cached_tokens': int(details.get('cache_read') or 0),
+        }
+
+    if 'prompt_tokens' in usage or 'completion_tokens' in usage:
+        details = usage.get('prompt_tokens_details') or {}
+        return {
+            'input_tokens': int(usage.get('prompt_tokens') or 0),
+            'output_tokens': int(usage.get('completion_tokens') or 0),
+            'cached_tokens': int(details.get('cached_tokens') or 0),
+        }
+
+    return None
+
+
+class LLMUsageTracker:
+    """LLM 用量统计器（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls: List[Dict[str, Any]] = []
+
+    def record(self, agent_name: str, usage: Dict[str, int], **extra: Any) -> None:
+        """
+        记录一次 LLM 调用的用量
+
+        Args:
+            agent_name: Agent 名称
+            usage: extract_usage() 返回的用量字典
+            **extra: 额外记录的字段（如 latency、model）
+        """
+        entry = {'agent': agent_name, **usage, **extra}
+        with self._lock:
+            self.calls.append(entry)
+
+        logger.debug(
+            f"{agent_name}: input={usage.get('input_tokens', 0)}, "
+            f"cached={usage.get('cached_tokens', 0)}, output={usage.get('output_tokens', 0)}"
+        )
+
+    def record_response(self, agent_name: str, message: Any, **extra: Any) -> Optional[Dict[str, int]]:
+        """
+        从响应中提取用量并记录
+
+        Args:
+            agent_name: Agent 名称
+            message: AIMessage 或响应字典
+            **extra: 额外记录的字段
+
+        Returns:
+            提取到的用量字典（无法提取时返回 None，且不记录）
+        """
+        usage = extract_usage(message)
+        if usage is not None:
+            self.record(agent_name, usage, **extra)
+        return usage
+
+    def record_messages(self, agent_name: str, messages: List[Any], **extra: Any) -> None:
+        """
+        记录 agent 一次运行中所有 AI 消息的用量（工具调用会产生多轮 LLM 调用）
+
+        Args:
+            agent_name: Agent 名称
+            messages: agent 返回的消息列表
+            **extra: 额外记录的字段
+        """
+        for message in messages:
+            if getattr(message, 'type', None) == 'ai' or isinstance(message, dict):
+                self.record_response(agent_name, message, **extra)
+
+    def record_result(self, agent_name: str, result: Any, **extra: Any) -> int:
+        """
+        记录一次 agent 调用结果中本次新产生的 AI 消息的用量
+
+        agent_graph.invoke 返回的 messages 包含输入的历史消息，
+        只统计最后一条用户消息之后的 AI 消息（工具调用的每一轮各计一次）
+
+        Args:
+            agent_name: Agent 名称
+            result: agent_graph.invoke 的返回值、消息列表或单条响应
+            **extra: 额外记录的字段
+
+        Returns:
+            记录的调用次数
+        """
+        if isinstance(result, dict) and 'messages' in result:
+            messages = list(result['messages'] or [])
+        elif isinstance(result, (list, tuple)):
+            messages = list(result)
+        else:
+            messages = [result]
+
+        start = 0
+        for index, message in enumerate(messages):
+            role = message.get('role') if isinstance(message, dict) else getattr(message, 'type', None)
+            if role in ('human', 'user'):
+                start = index + 1
+
+        recorded = 0
+        for message in messages[start:]:
+            role = message.get('role') if isinstance(message, dict) else getattr(message, 'type', None)
+            if role not in (None, 'ai', 'assistant'):
+                continue
+            if self.record_response(agent_name, message, **extra) is not None:
+                recorded += 1
+        return recorded
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        按 Agent 汇总用量
+
+        Returns:
+            {agent_name: {calls, input_tokens, cached_tokens, output_tokens, cache_hit_ratio}}
+        """
+        with self._lock:
+            calls = list(self.calls)
+
+        totals: Dict[str, Dict[str, Any]] = {}
+        for entry in calls:
+            agent_totals = totals.setdefault(entry['agent'], {
+                'calls': 0,
+                'input_tokens': 0,
+                'cached_tokens': 0,
+                'output_tokens': 0,
+            })
+            agent_totals['calls'] += 1
+            agent_totals['input_tokens'] += entry.get('input_tokens', 0)
+            agent_totals['cached_tokens'] += entry.get('cached_tokens', 0)
+            agent_totals['output_tokens'] += entry.get('output_tokens', 0)
+
+        for agent_totals in totals.values():
+            input_tokens = agent_totals['input_tokens']
+            agent_totals['cache_hit_ratio'] = (
+                agent_totals['cached_tokens'] / input_tokens if input_tokens else 0.0
+            )
+
+        return totals
+
+    def report(self) -> str:
+        """生成可读的用量报告"""
+        lines = ["LLM usage by agent:"]
+        for agent_name, totals in sorted(self.summary().items()):
+            lines.append(
+                f"  {agent_name}: {totals['calls']} calls, "
+                f"input {totals['input_tokens']} "
+                f"(cached {totals['cached_tokens']}, {totals['cache_hit_ratio']:.0%}), "
+                f"output {totals['output_tokens']}"
+            )
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        """清空统计"""
+        with self._lock:
+            self.calls.clear()
+
+
+# 创建全局用量统计实例
+usage_tracker = LLMUsageTracker()
@@ -0,0 +1,566 @@
+"""
+本地 OpenAI 兼容的模拟 LLM 服务
+实现 chat completions（含 tool calling、SSE 流式输出）和 models 接口，用于离线、可复现地
+压测和基准测试工作流，而不必调用 LLM_API_BASE 配置的真实服务：
+- 按请求哈希或匹配规则回放录制的响应（fixtures）
+- 未匹配时根据 tools / response_format 中的 JSON Schema 生成合法的最小结构化输出
+- 可配置延迟分布、输出 token 速率、429 注入和 RPM 限制
+
+用法：
+    python -m utils.mock_llm_server --port 8765 --fixtures fixtures.json --latency lognormal:-0.5,0.4
+    export LLM_API_BASE=http://127.0.0.1:8765/v1
+
+    with MockLLMServer(latency='fixed:0') as server:
+        os.environ['LLM_API_BASE'] = server.url
+"""
+import argparse
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.token_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEXT_RESPONSE = "OK"
+DEFAULT_MODEL = "mock-llm"
+
+
+def request_hash(body: Dict[str, Any]) -> str:
+    """
+    请求哈希：模型、消息、工具和输出格式的规范化 JSON（忽略 stream、temperature 等采样参数）
+    """
+    canonical = {
+        'model': body.get('model'),
+        'messages': [
+            {key: message.get(key) for key in ('role', 'content', 'tool_calls', 'tool_call_id', 'name')
+             if message.get(key) is not None}
+            for message in body.get('messages', [])
+        ],
+        'tools': body.get('tools'),
+        'tool_choice': body.get('tool_choice'),
+        'response_format': body.get('response_format'),
+    }
+    raw = json.dumps(canonical, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def parse_latency(spec: str):
+    """
+    解析延迟分布描述，返回采样函数 rng → 秒
+
+    支持 fixed:S、uniform:A,B、normal:MEAN,STD、lognormal:MU,SIGMA（单位均为秒，结果不小于 0）
+    """
+    kind, _, args = (spec or 'fixed:0').partition(':')
+    values = [float(value) for value in args.split(',') if value.strip()] or [0.0]
+    kind = kind.strip().lower()
+    if kind == 'fixed':
+        return lambda rng: max(0.0, values[0])
+    if kind == 'uniform':
+        low, high = values[0], values[1] if len(values) > 1 else values[0]
+        return lambda rng: max(0.0, rng.uniform(low, high))
+    if kind == 'normal':
+        mean, std = values[0], values[1] if len(values) > 1 else 0.0
+        return lambda rng: max(0.0, rng.gauss(mean, std))
+    if kind == 'lognormal':
+        mu, sigma = values[0], values[1] if len(values) > 1 else 0.0
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def synthesize_from_schema(schema: Dict[str, Any], definitions: Optional[Dict[str, Any]] = None,
+                           depth: int = 0) -> Any:
+    """根据 JSON Schema 生成最小的合法值（默认值、枚举首项或类型零值）"""
+    definitions = definitions if definitions is not None else {
+        **schema.get('definitions', {}), **schema.get('$defs', {})
+    }
+    if depth > 12:
+        return None
+
+    if '$ref' in schema:
+        name = schema['$ref'].rsplit('/', 1)[-1]
+        return synthesize_from_schema(definitions.get(name, {}), definitions, depth + 1)
+    if 'default' in schema:
+        return schema['default']
+    if 'const' in schema:
+        return schema['const']
+    if schema.get('enum'):
+        return schema['enum'][0]
+    for combinator in ('anyOf', 'oneOf', 'allOf'):
+        if schema.get(combinator):
+            options = [option for option in schema[combinator] if option.get('type') != 'null']
+            return synthesize_from_schema((options or schema[combinator])[0], definitions, depth + 1)
+
+    schema_type = schema.get('type')
+    if isinstance(schema_type, list):
+        schema_type = next((item for item in schema_type if item != 'null'), 'null')
+    if schema_type == 'object' or 'properties' in schema:
+        properties = schema.get('properties', {})
+        return {
+            name: synthesize_from_schema(property_schema, definitions, depth + 1)
+            for name, property_schema in properties.items()
+        }
+    if schema_type == 'array':
+        min_items = schema.get('minItems', 0)
+        item = synthesize_from_schema(schema.get('items', {}), definitions, depth + 1)
+        return [item] * min_items
+    if schema_type == 'string':
+        return 'mock'
+    if schema_type in ('integer', 'number'):
+        return schema.get('minimum', 0)
+    if schema_type == 'boolean':
+        return False
+    return None
+
+
+class FixtureStore:
+    """
+    响应 fixtures
+
+    文件为 JSON 列表或 JSONL，每项：
+        {"request_hash": "...", "response": {...}}            按请求哈希精确匹配（录制的响应）
+        {"match": {"contains": "...", "system_contains": "...", "model": "...", "tool": "..."},
+         "response": {...}}                                    按规则匹配（按顺序取第一个）
+
+    response 可以是完整的 chat.completion 响应体（含 choices），
+    或简写 {"content": "...", "tool_calls": [{"name": "...", "arguments": {...}}]}；
+    可选 "latency"（秒）覆盖该条的服务端延迟。
+    """
+
+    def __init__(self, entries: Optional[List[Dict[str, Any]]] = None):
+        self.by_hash: Dict[str, Dict[str, Any]] = {}
+        self.rules: List[Dict[str, Any]] = []
+        for entry in entries or []:
+            self.add(entry)
+
+    @classmethod
+    def load(cls, path: str) -> "FixtureStore":
+        text = Path(path).read_text(encoding='utf-8')
+        stripped = text.lstrip()
+        if stripped.startswith('['):
+            entries = json.loads(text)
+        else:
+            entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+        store = cls(entries)
+        logger.info(f"Loaded {len(store.by_hash)} recorded and {len(store.rules)} rule fixtures from {path}")
+        return store
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        if entry.get('request_hash'):
+            self.by_hash[entry['request_hash']] = entry
+        elif 'match' in entry:
+            self.rules.append(entry)
+
+    def find(self, body: Dict[str, Any], body_hash: str) -> Optional[Dict[str, Any]]:
+        entry = self.by_hash.get(body_hash)
+        if entry is not None:
+            return entry
+
+        messages = body.get('messages', [])
+        system_text = '\n'.join(_content_text(m.get('content')) for m in messages if m.get('role') == 'system')
+        other_text = '\n'.join(_content_text(m.get('content')) for m in messages if m.get('role') != 'system')
+        tool_names = {tool.get('function', {}).get('name') for tool in body.get('tools') or []}
+
+        for rule in self.rules:
+            match = rule['match']
+            if 'model' in match and match['model'] != body.get('model'):
+                continue
+            if 'contains' in match and match['contains'] not in other_text:
+                continue
+            if 'system_contains' in match and match['system_contains'] not in system_text:
+                continue
+            if 'tool' in match and match['tool'] not in tool_names:
+                continue
+            return rule
+        return None
+
+
+def _content_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return ''.join(part.get('text', '') for part in content if isinstance(part, dict))
+    return ''
+
+
+def _forced_schema(body: Dict[str, Any]) -> Optional[Tuple[str, Optional[str], Dict[str, Any]]]:
+    """
+    请求要求的结构化输出
+
+    Returns:
+        ('tool', 工具名, 参数 schema) 或 ('json', None, schema)；没有要求时返回 None
+    """
+    tools = body.get('tools') or []
+    tool_choice = body.get('tool_choice')
+    forced_name = None
+    if isinstance(tool_choice, dict):
+        forced_name = tool_choice.get('function', {}).get('name')
+    elif tool_choice in ('required', 'any') and len(tools) == 1:
+        forced_name = tools[0].get('function', {}).get('name')
+    if forced_name:
+        for tool in tools:
+            function = tool.get('function', {})
+            if function.get('name') == forced_name:
+                return 'tool', forced_name, function.get('parameters', {})
+
+    response_format = body.get('response_format') or {}
+    if response_format.get('type') == 'json_schema':
+        return 'json', None, response_format.get('json_schema', {}).get('schema', {})
+    if response_format.get('type') == 'json_object':
+        return 'json', None, {'type': 'object'}
+    return None
+
+
+class MockLLMServer:
+    """
+    模拟 LLM 服务（后台线程运行）
+
+    用法：
+        with MockLLMServer(fixtures='fixtures.json', latency='lognormal:-1,0.5', error_rate=0.05) as server:
+            os.environ['LLM_API_BASE'] = server.url
+            ...
+        print(server.report())
+    """
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        fixtures: Optional[str] = None,
+        latency: str = 'fixed:0',
+        tokens_per_second: float = 0.0,
+        error_rate: float = 0.0,
+        rpm: int = 0,
+        retry_after: float = 1.0,
+        seed: Optional[int] = 0
+    ):
+        """
+        Args:
+            host: 监听地址
+            port: 监听端口（0 表示随机空闲端口）
+            fixtures: fixtures 文件路径
+            latency: 首 token 延迟分布（见 parse_latency）
+            tokens_per_second: 输出 token 速率（0 表示不限）
+            error_rate: 随机返回 429 的概率
+            rpm: 每分钟请求上限，超过时返回 429（0 表示不限）
+            retry_after: 429 响应的 Retry-After 秒数
+            seed: 随机种子（None 表示不固定）
+        """
+        self.host = host
+        self.port = port
+        self.fixtures = FixtureStore.load(fixtures) if fixtures else FixtureStore()
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+
+        self._lock = threading.Lock()
+        self._request_times: deque = deque()
+        self.stats = {
+            'requests': 0, 'recorded_hits': 0, 'rule_hits': 0, 'synthesized': 0,
+            'rate_limited': 0, 'streamed': 0, 'completion_tokens': 0,
+        }
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """OpenAI 兼容的 base URL（以 /v1 结尾）"""
+        host, port = self._httpd.server_address[:2] if self._httpd else (self.host, self.port)
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        server = self
+
+        class Handler(_MockHandler):
+            mock = server
+
+        self._httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='mock-llm', daemon=True)
+        self._thread.start()
+        logger.info(f"Mock LLM server listening on {self.url}")
+        return self
+
+    def stop(self) -> None:
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def serve_forever(self) -> None:
+        """前台运行（命令行模式）"""
+        self.start()
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += amount
+
+    def should_rate_limit(self) -> bool:
+        """是否对本次请求返回 429（随机注入或超出 RPM）"""
+        with self._lock:
+            if self.error_rate and self.rng.random() < self.error_rate:
+                return True
+            if self.rpm:
+                now = time.monotonic()
+                while self._request_times and now - self._request_times[0] > 60:
+                    self._request_times.popleft()
+                if len(self._request_times) >= self.rpm:
+                    return True
+                self._request_times.append(now)
+        return False
+
+    def latency(self, fixture: Optional[Dict[str, Any]]) -> float:
+        if fixture and 'latency' in fixture:
+            return float(fixture['latency'])
+        with self._lock:
+            return self.sample_latency(self.rng)
+
+    def build_completion(self, body: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        生成响应体
+
+        Returns:
+            (chat.completion 响应体, 命中的 fixture)
+        """
+        model = body.get('model') or DEFAULT_MODEL
+        fixture = self.fixtures.find(body, request_hash(body))
+        if fixture is not None:
+            self._count('recorded_hits' if fixture.get('request_hash') else 'rule_hits')
+            response = fixture.get('response', {})
+            if 'choices' in response:
+                return {**response, 'model': response.get('model', model)}, fixture
+            message = _shorthand_message(response)
+        else:
+            self._count('synthesized')
+            message = self._synthesize_message(body)
+
+        prompt_text = ''.join(_content_text(m.get('content')) for m in body.get('messages', []))
+        completion_text = (message.get('content') or '') + ''.join(
+            call['function']['arguments'] for call in message.get('tool_calls', [])
+        )
+        prompt_tokens = estimate_tokens(prompt_text)
+        completion_tokens = max(1, estimate_tokens(completion_text))
+        return {
+            'id': f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': message,
+                'finish_reason': 'tool_calls' if message.get('tool_calls') else 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        }, fixture
+
+    def _synthesize_message(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        forced = _forced_schema(body)
+        if forced is None:
+            return {'role': 'assistant', 'content': DEFAULT_TEXT_RESPONSE}
+        kind, name, schema = forced
+        value = synthesize_from_schema(schema)
+        if kind == 'tool':
+            return _shorthand_message({'tool_calls': [{'name': name, 'arguments': value}]})
+        return {'role': 'assistant', 'content': json.dumps(value, ensure_ascii=False)}
+
+    def report(self) -> str:
+        with self._lock:
+            stats = dict(self.stats)
+        return (
+            f"Mock LLM server: {stats['requests']} requests "
+            f"({stats['recorded_hits']} recorded, {stats['rule_hits']} rule, {stats['synthesized']} synthesized), "
+            f"{stats['rate_limited']} rate-limited, {stats['streamed']} streamed, "
+            f"{stats['completion_tokens']} completion tokens"
+        )
+
+
+def _shorthand_message(response: Dict[str, Any]) -> Dict[str, Any]:
+    message: Dict[str, Any] = {'role': 'assistant', 'content': response.get('content')}
+    tool_calls = []
+    for index, call in enumerate(response.get('tool_calls') or []):
+        arguments = call.get('arguments', {})
+        tool_calls.append({
+            'id': call.get('id') or f"call_{index}_{uuid.uuid4().hex[:8]}",
+            'type': 'function',
+            'function': {
+                'name': call['name'],
+                'arguments': arguments if isinstance(arguments, str) else json.dumps(arguments, ensure_ascii=False),
+            },
+        })
+    if tool_calls:
+        message['tool_calls'] = tool_calls
+    elif message['content'] is None:
+        message['content'] = ''
+    return message
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    """HTTP 请求处理（mock 属性由 MockLLMServer.start 绑定）"""
+
+    mock: MockLLMServer
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("mock-llm: " + format % args)
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [
+                {'id': DEFAULT_MODEL, 'object': 'model', 'owned_by': 'mock'}
+            ]})
+        else:
+            self._send_json(404, {'error': {'message': f"Unknown path {self.path}", 'type': 'not_found'}})
+
+    def do_POST(self) -> None:
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f"Unknown path {self.path}", 'type': 'not_found'}})
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError as e:
+            self._send_json(400, {'error': {'message': f"Invalid JSON: {e}", 'type': 'invalid_request_error'}})
+            return
+
+        mock = self.mock
+        mock._count('requests')
+        if mock.should_rate_limit():
+            mock._count('rate_limited')
+            self._send_json(
+                429,
+                {'error': {'message': 'Rate limit exceeded (mock)', 'type': 'rate_limit_error',
+                           'code': 'rate_limit_exceeded'}},
+                headers={'Retry-After': f"{mock.retry_after:g}",
+                         'retry-after-ms': str(int(mock.retry_after * 1000))}
+            )
+            return
+
+        completion, fixture = mock.build_completion(body)
+        completion_tokens = completion.get('usage', {}).get('completion_tokens', 0)
+        mock._count('completion_tokens', completion_tokens)
+        time.sleep(mock.latency(fixture))
+
+        if body.get('stream'):
+            mock._count('streamed')
+            include_usage = bool((body.get('stream_options') or {}).get('include_usage'))
+            self._stream(completion, include_usage)
+            return
+
+        if mock.tokens_per_second > 0:
+            time.sleep(completion_tokens / mock.tokens_per_second)
+        self._send_json(200, completion)
+
+    def _stream(self, completion: Dict[str, Any], include_usage: bool) -> None:
+        """以 SSE 分块发送响应（按 token 速率逐块输出）"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        choice = completion['choices'][0]
+        message = choice['message']
+        base = {key: completion[key] for key in ('id', 'created', 'model')}
+        base['object'] = 'chat.completion.chunk'
+
+        def send(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra) -> None:
+            chunk = {**base, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}], **extra}
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        try:
+            send({'role': 'assistant', 'content': ''})
+            content = message.get('content') or ''
+            # 每块 16 个字符（约 4 个 token，按 4 字符/token 估算），块间隔按 token 速率计算
+            pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+            delay = 4 / self.mock.tokens_per_second if self.mock.tokens_per_second > 0 else 0.0
+            for piece in pieces:
+                send({'content': piece})
+                if delay:
+                    time.sleep(delay)
+            for index, call in enumerate(message.get('tool_calls', [])):
+                send({'tool_calls': [{'index': index, 'id': call['id'], 'type': 'function',
+                                      'function': {'name': call['function']['name'], 'arguments': ''}}]})
+                arguments = call['function']['arguments']
+                for i in range(0, len(arguments), 16):
+                    send({'tool_calls': [{'index': index, 'function': {'arguments': arguments[i:i + 16]}}]})
+                    if delay:
+                        time.sleep(delay)
+            send({}, choice.get('finish_reason', 'stop'))
+            if include_usage:
+                chunk = {**base, 'choices': [], 'usage': completion.get('usage')}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前中止（如流式解析判定输出无效）
+            logger.debug("mock-llm: client closed stream early")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock LLM server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fixtures', help='JSON or JSONL fixtures file')
+    parser.add_argument('--latency', default='fixed:0',
+                        help='fixed:S | uniform:A,B | normal:MEAN,STD | lognormal:MU,SIGMA (seconds)')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help='output token rate (0 = unlimited)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='probability of injected 429 responses')
+    parser.add_argument('--rpm', type=int, default=0, help='requests per minute before 429 (0 = unlimited)')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds on 429')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    server = MockLLMServer(
+        host=args.host, port=args.port, fixtures=args.fixtures, latency=args.latency,
+        tokens_per_second=args.tokens_per_second, error_rate=args.error_rate, rpm=args.rpm,
+        retry_after=args.retry_after, seed=args.seed
+    )
+    print(f"export LLM_API_BASE={server.url}")
+    server.serve_forever()
+    print(server.report())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+模型分级路由
+按节点类型、文件类型/优先级和输入规模为每次调用选择模型档位：
+- fast：配置类文件、CSS、简单审查
+- standard：中等复杂度的分析和选择
+- large：HTL 分析、代码编写和修正
+
+结构化输出校验失败时自动升级到更高档位重试
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils.aem_utils import identify_aem_file_type
+from utils.token_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 档位从低到高
+TIERS = ('fast', 'standard', 'large')
+
+# 节点默认档位（未列出的节点使用 standard）
+NODE_TIERS = {
+    'collect_files': 'fast',
+    'select_bdl_components': 'standard',
+    'write_code': 'large',
+    'correct_code': 'large',
+    'security_review': 'fast',
+    'build_review': 'fast',
+    'css_import_review': 'fast',
+    'component_reference_review': 'fast',
+    'bdl_component_usage_review': 'standard',
+    'consistency_review': 'standard',
+}
+
+# 文件类型默认档位（analyze_aem_files 节点）
+FILE_TYPE_TIERS = {
+    'htl': 'large',
+    'html': 'large',
+    'java': 'standard',
+    'dialog': 'standard',
+    'js': 'standard',
+    'javascript': 'standard',
+    'config': 'fast',
+    'xml': 'fast',
+    'css': 'fast',
+    'less': 'fast',
+    'scss': 'fast',
+    'json': 'fast',
+    'properties': 'fast',
+    'txt': 'fast',
+    'md': 'fast',
+}
+
+
+def tier_index(tier: str) -> int:
+    """档位序号（未知档位视为 standard）"""
+    return TIERS.index(tier) if tier in TIERS else TIERS.index('standard')
+
+
+def raise_tier(tier: str, steps: int = 1) -> str:
+    """提升档位（不超过 large）"""
+    return TIERS[min(tier_index(tier) + steps, len(TIERS) - 1)]
+
+
+class ModelRouter:
+    """
+    模型路由器
+
+    用法：
+        tier = model_router.select_tier(node='analyze_aem_files', file_path=path, content=content)
+        result, tier = model_router.run_with_escalation(
+            lambda model_name: agent_for(model_name).run(prompt, return_structured=True),
+            tier,
+            is_valid=lambda result: isinstance(result, FileAnalysisResult)
+        )
+    """
+
+    def __init__(
+        self,
+        models: Optional[Dict[str, str]] = None,
+        enabled: Optional[bool] = None,
+        large_input_tokens: Optional[int] = None,
+        small_input_tokens: Optional[int] = None
+    ):
+        """
+        Args:
+            models: {档位: 模型名}（None 表示从 Config 读取）
+            enabled: 是否启用路由（关闭时所有调用使用 Config.LLM_MODEL）
+            large_input_tokens: 输入超过该 token 数时提升一个档位
+            small_input_tokens: 非关键文件输入小于该 token 数时降低到 fast
+        """
+        from config import Config
+        self.default_model = Config.LLM_MODEL
+        self.models = models or {
+            'fast': Config.LLM_MODEL_FAST,
+            'standard': Config.LLM_MODEL_STANDARD,
+            'large': Config.LLM_MODEL_LARGE,
+        }
+        self.enabled = Config.MODEL_ROUTING if enabled is None else enabled
+        self.large_input_tokens = (
+            Config.MODEL_ROUTING_LARGE_INPUT_TOKENS if large_input_tokens is None else large_input_tokens
+        )
+        self.small_input_tokens = (
+            Config.MODEL_ROUTING_SMALL_INPUT_TOKENS if small_input_tokens is None else small_input_tokens
+        )
+        self._lock = threading.Lock()
+        self.stats = {tier: {'calls': 0, 'escalations': 0} for tier in TIERS}
+
+    def model_for(self, tier: str) -> str:
+        """档位对应的模型名"""
+        if not self.enabled:
+            return self.default_model
+        return self.models.get(tier) or self.default_model
+
+    def select_tier(
+        self,
+        node: Optional[str] = None,
+        file_path: Optional[str] = None,
+        content: Optional[str] = None,
+        input_tokens: Optional[int] = None
+    ) -> str:
+        """
+        选择档位
+
+        Args:
+            node: 工作流节点名（或审查类型），决定默认档位
+            file_path: 被分析的文件（按文件类型和优先级选择档位）
+            content: 输入内容（用于估算规模）
+            input_tokens: 输入 token 数（已知时无需传入 content）
+
+        Returns:
+            档位名称
+        """
+        if input_tokens is None:
+            input_tokens = estimate_tokens(content) if content else 0
+
+        if file_path:
+            file_type, priority = identify_aem_file_type(file_path)
+            tier = FILE_TYPE_TIERS.get(file_type, 'standard')
+            # 非 HTL 的小文件（短 JS、简单 dialog）不需要 standard 档位
+            if tier == 'standard' and priority > 1 and 0 < input_tokens < self.small_input_tokens:
+                tier = 'fast'
+        else:
+            tier = NODE_TIERS.get(node, 'standard')
+
+        if input_tokens > self.large_input_tokens:
+            tier = raise_tier(tier)
+        return tier
+
+    def next_tier(self, tier: str) -> Optional[str]:
+        """
+        升级的目标档位
+
+        跳过与当前档位模型相同的档位；已经是最高档位（或更高档位模型相同）时返回 None
+        """
+        current_model = self.model_for(tier)
+        for candidate in TIERS[tier_index(tier) + 1:]:
+            if self.model_for(candidate) != current_model:
+                return candidate
+        return None
+
+    def run_with_escalation(
+        self,
+        call: Callable[[str], Any],
+        tier: str,
+        is_valid: Callable[[Any], bool]
+    ) -> Tuple[Any, str]:
+        """
+        按档位调用，结果校验失败时升级档位重试
+
+        Args:
+            call: 接收模型名、执行调用的函数
+            tier: 起始档位
+            is_valid: 校验结果（例如结构化输出是否为期望的 schema 实例）
+
+        Returns:
+            (最后一次调用的结果, 最终使用的档位)
+        """
+        while True:
+            with self._lock:
+                self.stats[tier]['calls'] += 1
+            result = call(self.model_for(tier))
+            if is_valid(result):
+                return result, tier
+
+            next_tier = self.next_tier(tier)
+            if next_tier is None:
+                return result, tier
+
+            logger.info(f"Structured output invalid on {tier} tier, escalating to {next_tier}")
+            with self._lock:
+                self.stats[tier]['escalations'] += 1
+            tier = next_tier
+
+    def report(self) -> str:
+        """生成各档位调用统计"""
+        with self._lock:
+            parts = [
+                f"{tier}={stats['calls']} ({stats['escalations']} escalated)"
+                for tier, stats in self.stats.items()
+            ]
+        status = '' if self.enabled else ' [disabled]'
+        return f"Model routing{status}: " + ', '.join(parts)
+
+
+# 创建全局路由器实例
+model_router = ModelRouter()
@@ -2,11 +2,14 @@
 输出解析工具
 用于从 Agent 输出中提取结构化信息
 """
-import json
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Type, TypeVar
 from pathlib import Path
 
+from utils.json_repair import JSONRepairError, loads_tolerant, parse_structured_output
+
+T = TypeVar('T')
+
 
 def extract_code_from_response(response: str) -> str:
     """
@@ -72,27 +75,40 @@ def extract_json_from_text(text: str) -> Optional[Dict[str, Any]]:
     """
     从文本中提取 JSON 对象
     
+    依次尝试直接解析、```json 代码块和平衡括号片段，最后修复尾随逗号、
+    未转义换行、截断结尾等常见问题（见 utils.json_repair）；只接受对象，
+    说明文字中的 [1] 之类的数组不作为结果
+    
     Args:
         text: 包含 JSON 的文本
     
     Returns:
         解析后的 JSON 字典，如果失败返回 None
     """
-    # 尝试直接解析
     try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        pass
-    
-    # 尝试提取 JSON 块
-    json_match = re.search(r'\{.*\}', text, re.DOTALL)
-    if json_match:
-        try:
-            return json.loads(json_match.group())
-        except json.JSONDecodeError:
-            pass
-    
-    return None
+        return loads_tolerant(text, expect=dict)
+    except JSONRepairError:
+        return None
+
+
+def coerce_structured_output(result: Any, schema: Type[T]) -> Any:
+    """
+    将 Agent 的结构化输出结果规范为 schema 实例
+    
+    结构化输出解析失败、退回为文本时，先在本地修复并校验（model_validate_json），
+    只有无法修复时才保留原始文本，由调用方决定是否重新调用 LLM
+    
+    Args:
+        result: Agent.run(..., return_structured=True) 的返回值
+        schema: 期望的 Pydantic 模型类
+    
+    Returns:
+        schema 实例；无法修复时返回原始结果
+    """
+    if isinstance(result, schema) or not isinstance(result, str):
+        return result
+    parsed = parse_structured_output(result, schema)
+    return parsed if parsed is not None else result
 
 
 def parse_component_paths(text: str, library_path: str) -> List[str]:
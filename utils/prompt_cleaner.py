@@ -3,7 +3,7 @@
 清洗发送给大语言模型的数据，移除不必要的字符、格式化代码等
 """
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
 
 
 class PromptCleaner:
@@ -20,11 +20,48 @@ class PromptCleaner:
     # 需要标准化的空白字符
     WHITESPACE_CHARS = ['\u200b', '\u200c', '\u200d', '\ufeff', '\u202a', '\u202b', '\u202c', '\u202d', '\u202e']
     
+    # 删除控制字符和零宽字符：ASCII 文本用 str.translate（CPython 有 ASCII 快速路径），
+    # 非 ASCII 文本的 translate 会逐字符查表，改用一次字符集正则
+    _DELETE_TABLE = str.maketrans('', '', ''.join(CONTROL_CHARS + WHITESPACE_CHARS))
+    _DELETE_PATTERN = re.compile('[' + re.escape(''.join(CONTROL_CHARS + WHITESPACE_CHARS)) + ']')
+    
+    # 连续 3 个及以上换行
+    _BLANK_LINES_PATTERN = re.compile(r'\n{3,}')
+    
+    # 流式清洗的默认分块大小
+    STREAM_CHUNK_SIZE = 1 << 20
+    
+    @classmethod
+    def _delete_chars(cls, text: str) -> str:
+        """一次遍历删除控制字符和零宽字符"""
+        if text.isascii():
+            return text.translate(cls._DELETE_TABLE)
+        return cls._DELETE_PATTERN.sub('', text)
+    
+    @classmethod
+    def _normalize_lines(cls, text: str) -> str:
+        """标准化换行、移除行尾空白、折叠空行（不做首尾 strip）"""
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        
+        text = '\n'.join(map(str.rstrip, text.split('\n')))
+        
+        if '\n\n\n' in text:
+            text = cls._BLANK_LINES_PATTERN.sub('\n\n', text)
+        
+        return text
+    
     @classmethod
     def clean_text(cls, text: str, max_length: Optional[int] = None) -> str:
         """
         清洗文本内容
         
+        - 移除控制字符和零宽字符
+        - 标准化换行符（统一为 \\n）
+        - 移除行尾空白
+        - 折叠多余的连续空白行（最多保留2个连续换行）
+        - 移除开头和结尾的空白
+        
         Args:
             text: 原始文本
             max_length: 最大长度限制（None表示不限制）
@@ -35,33 +72,63 @@ class PromptCleaner:
         if not text:
             return ""
         
-        # 移除控制字符
-        for char in cls.CONTROL_CHARS:
-            text = text.replace(char, '')
+        text = cls._normalize_lines(cls._delete_chars(text)).strip()
         
-        # 移除零宽字符
-        for char in cls.WHITESPACE_CHARS:
-            text = text.replace(char, '')
+        # 长度限制
+        if max_length and len(text) > max_length:
+            text = text[:max_length] + "\n\n... (内容已截断)"
         
-        # 标准化换行符（统一为 \n）
-        text = re.sub(r'\r\n|\r', '\n', text)
+        return text
+    
+    @classmethod
+    def iter_clean_text(cls, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        流式清洗文本，适用于超大输入（如多 MB 的 clientlib 合并文件）
         
-        # 移除多余的连续空白行（最多保留2个连续换行）
-        text = re.sub(r'\n{3,}', '\n\n', text)
+        输出拼接后与 clean_text(''.join(chunks)) 一致（不支持 max_length）。
+        每个分块末尾的空白会暂存到下一块一起处理，保证跨块的 \\r\\n 和空行折叠正确。
         
-        # 移除行尾空白
-        lines = text.split('\n')
-        lines = [line.rstrip() for line in lines]
-        text = '\n'.join(lines)
+        Args:
+            chunks: 文本分块的可迭代对象
         
-        # 移除开头和结尾的空白
-        text = text.strip()
+        Yields:
+            清洗后的文本分块
+        """
+        pending = ""
+        started = False
         
-        # 长度限制
-        if max_length and len(text) > max_length:
-            text = text[:max_length] + "\n\n... (内容已截断)"
+        for chunk in chunks:
+            if not chunk:
+                continue
+            
+            buffer = pending + cls._delete_chars(chunk)
+            # 最后一个非空白字符之后的内容暂存，等待后续分块
+            cut = len(buffer.rstrip())
+            head, pending = buffer[:cut], buffer[cut:]
+            
+            if not head:
+                continue
+            
+            if not started:
+                head = head.lstrip()
+                started = True
+            
+            yield cls._normalize_lines(head)
+    
+    @classmethod
+    def clean_stream(cls, stream: TextIO, chunk_size: Optional[int] = None) -> Iterator[str]:
+        """
+        从文本流（如打开的文件）中分块读取并清洗
         
-        return text
+        Args:
+            stream: 文本流
+            chunk_size: 每次读取的字符数（None 表示使用 STREAM_CHUNK_SIZE）
+        
+        Yields:
+            清洗后的文本分块
+        """
+        chunk_size = chunk_size or cls.STREAM_CHUNK_SIZE
+        yield from cls.iter_clean_text(iter(lambda: stream.read(chunk_size), ''))
     
     @classmethod
     def clean_code_block(cls, code: str, language: Optional[str] = None) -> str:
@@ -91,39 +158,79 @@ class PromptCleaner:
         return code
     
     @classmethod
-    def clean_file_content(cls, content: str, file_type: Optional[str] = None) -> str:
+    def clean_file_content(cls, content: str, file_type: Optional[str] = None,
+                           max_length: Optional[int] = None, minify: bool = False,
+                           file_path: Optional[str] = None) -> str:
         """
         清洗文件内容
         
         Args:
             content: 文件内容
             file_type: 文件类型（html, js, java, css, xml等）
+            max_length: 最大长度限制（None表示不限制），超出时按结构截断
+            minify: 是否压缩源码（去缩进、折叠空白、省略 data URI 等，见 utils.source_minifier）
+            file_path: 文件路径（仅用于压缩日志）
+        
+        Returns:
+            清洗后的内容（压缩时需要还原行号请使用 clean_file_content_with_line_map）
+        """
+        return cls.clean_file_content_with_line_map(
+            content, file_type, max_length=max_length, minify=minify, file_path=file_path
+        )['content']
+    
+    @classmethod
+    def clean_file_content_with_line_map(cls, content: str, file_type: Optional[str] = None,
+                                         max_length: Optional[int] = None, minify: bool = False,
+                                         file_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        清洗文件内容，并返回压缩后行号到原文件行号的映射
+        
+        审查 Agent 引用的是压缩后内容的行号，用 source_minifier.map_line_number(line_map, line)
+        还原为原文件行号
+        
+        Args:
+            同 clean_file_content
         
         Returns:
-            清洗后的内容
+            {'content': 清洗后的内容, 'line_map': 压缩时为 line_map，未压缩时为 None}
         """
+        line_map: Optional[List[int]] = None
         if not content:
-            return ""
+            return {'content': "", 'line_map': line_map}
+        
+        # 注释替换为等量换行，保持行号不变
+        def keep_newlines(match: re.Match) -> str:
+            return '\n' * match.group().count('\n')
         
         # 根据文件类型进行特殊处理
         if file_type == 'html' or file_type == 'htl':
             # HTML/HTL文件：移除注释中的敏感信息
-            content = re.sub(r'<!--.*?-->', '', content, flags=re.DOTALL)
+            content = re.sub(r'<!--.*?-->', keep_newlines, content, flags=re.DOTALL)
         
         elif file_type == 'java':
             # Java文件：移除注释中的敏感信息
-            content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)
+            content = re.sub(r'/\*.*?\*/', keep_newlines, content, flags=re.DOTALL)
             content = re.sub(r'//.*$', '', content, flags=re.MULTILINE)
         
         elif file_type == 'js' or file_type == 'jsx':
             # JavaScript文件：移除注释
-            content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)
+            content = re.sub(r'/\*.*?\*/', keep_newlines, content, flags=re.DOTALL)
             content = re.sub(r'//.*$', '', content, flags=re.MULTILINE)
         
-        # 通用清洗
+        if minify:
+            from utils.source_minifier import MINIFY_KINDS, minify_source
+            minified = minify_source(content, file_type, file_path=file_path)
+            content = minified['content']
+            if (file_type or '').lower() in MINIFY_KINDS:
+                line_map = minified['line_map']
+        
+        # 通用清洗（压缩后没有空行，行数不变）
         content = cls.clean_text(content)
         
-        return content
+        if max_length and len(content) > max_length:
+            content = cls.truncate_long_content(content, max_length=max_length, file_type=file_type)
+        
+        return {'content': content, 'line_map': line_map}
     
     @classmethod
     def clean_prompt_data(cls, data: Dict[str, Any], max_file_length: int = 50000) -> Dict[str, Any]:
@@ -173,14 +280,20 @@ class PromptCleaner:
     
     @classmethod
     def truncate_long_content(cls, content: str, max_length: int = 50000, 
-                             preserve_structure: bool = True) -> str:
+                             preserve_structure: bool = True,
+                             file_type: Optional[str] = None) -> str:
         """
         截断过长内容，尽量保持结构
         
+        preserve_structure 时使用线性时间的结构扫描（HTL 元素边界、JS/Java 花括号深度、
+        CSS 规则边界）选择截断位置，并在末尾附加被截掉部分的结构概要
+        （函数/方法签名、元素大纲、选择器）。
+        
         Args:
             content: 原始内容
             max_length: 最大长度
             preserve_structure: 是否保持结构（如代码块、XML标签等）
+            file_type: 文件类型（htl, js, java, css 等，None 表示根据内容猜测）
         
         Returns:
             截断后的内容
@@ -189,30 +302,10 @@ class PromptCleaner:
             return content
         
         if preserve_structure:
-            # 尝试在合理的位置截断（如函数结束、标签闭合等）
-            # 查找最后一个完整的结构单元
-            truncate_pos = max_length
-            
-            # 查找最后一个完整的函数/类/标签
-            if 'function' in content[:truncate_pos] or 'class' in content[:truncate_pos]:
-                # 查找最后一个完整的函数或类
-                pattern = r'(function\s+\w+[^}]*\{[^}]*\})|(class\s+\w+[^}]*\{[^}]*\})'
-                matches = list(re.finditer(pattern, content[:truncate_pos], re.DOTALL))
-                if matches:
-                    truncate_pos = matches[-1].end()
-            
-            elif '<' in content[:truncate_pos] and '>' in content[:truncate_pos]:
-                # XML/HTML：查找最后一个完整的标签
-                pattern = r'<[^>]+>.*?</[^>]+>'
-                matches = list(re.finditer(pattern, content[:truncate_pos], re.DOTALL))
-                if matches:
-                    truncate_pos = matches[-1].end()
-            
-            content = content[:truncate_pos]
-        else:
-            content = content[:max_length]
+            from utils.structure_truncator import truncate_with_skeleton
+            return truncate_with_skeleton(content, max_length, file_type=file_type)
         
-        return content + "\n\n... (内容已截断，超过最大长度限制)"
+        return content[:max_length] + "\n\n... (内容已截断，超过最大长度限制)"
     
     @classmethod
     def remove_sensitive_info(cls, text: str) -> str:
@@ -225,19 +318,9 @@ class PromptCleaner:
         Returns:
             移除敏感信息后的文本
         """
-        # 移除API密钥模式
-        text = re.sub(r'api[_-]?key["\']?\s*[:=]\s*["\']?[a-zA-Z0-9_-]{20,}["\']?', 
-                     'api_key="***"', text, flags=re.IGNORECASE)
-        
-        # 移除密码模式
-        text = re.sub(r'password["\']?\s*[:=]\s*["\']?[^"\']+["\']?', 
-                     'password="***"', text, flags=re.IGNORECASE)
-        
-        # 移除token模式
-        text = re.sub(r'token["\']?\s*[:=]\s*["\']?[a-zA-Z0-9_-]{20,}["\']?', 
-                     'token="***"', text, flags=re.IGNORECASE)
-        
-        return text
+        # 所有规则合并为一个预编译正则，单次扫描（见 utils.sensitive_scrubber）
+        from utils.sensitive_scrubber import scrubber
+        return scrubber.scrub(text)
 
 
 # 创建全局清洗器实例
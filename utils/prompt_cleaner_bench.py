@@ -0,0 +1,117 @@
+"""
+PromptCleaner 微基准测试
+用合成的多 MB clientlib 内容测量清洗和敏感信息清除的吞吐量
+
+运行方式：
+    python -m utils.prompt_cleaner_bench
+    python -m utils.prompt_cleaner_bench --size-mb 10 --repeat 5
+"""
+import argparse
+import re
+import time
+from typing import Callable, List
+
+from utils.prompt_cleaner import PromptCleaner
+from utils.sensitive_scrubber import scrubber
+
+# 模拟 clientlib 合并后的 JS/CSS 内容（含行尾空白、CRLF、多余空行和零宽字符）
+SAMPLE_BLOCK = (
+    "/* clientlib: example.components.button */   \r\n"
+    ".cmp-button { display: inline-flex; padding: 8px 16px; }\r\n"
+    "\r\n\r\n\r\n"
+    "(function ($, window) {\n"
+    "    'use strict';\t\n"
+    "    var selectors = { self: '[data-cmp-is=\"button\"]' };​\n"
+    "    function init(config) {\n"
+    "        config.element.addEventListener('click', onClick);   \n"
+    "    }\n"
+    "\n\n\n\n"
+    "})(jQuery, window);\n"
+)
+
+# 含敏感信息的配置片段（其中一行是未闭合引号的 password，旧实现会一直扫描到下一个引号）
+SENSITIVE_BLOCK = (
+    "apiKey: 'abcdefghijklmnopqrstuvwxyz012345'\n"
+    "    \"password\": \"s3cret\",\n"
+    "    accessToken=ABCDEFGHIJKLMNOPQRSTUVWXYZ\n"
+    "    password = hunter2\n"
+    "    var tokenizer = new Tokenizer(options);\n"
+)
+
+
+def _legacy_remove_sensitive_info(text: str) -> str:
+    """重构前的 remove_sensitive_info 实现（三个独立正则，password 值不限长度），作为对照基线"""
+    text = re.sub(r'api[_-]?key["\']?\s*[:=]\s*["\']?[a-zA-Z0-9_-]{20,}["\']?',
+                  'api_key="***"', text, flags=re.IGNORECASE)
+    text = re.sub(r'password["\']?\s*[:=]\s*["\']?[^"\']+["\']?',
+                  'password="***"', text, flags=re.IGNORECASE)
+    text = re.sub(r'token["\']?\s*[:=]\s*["\']?[a-zA-Z0-9_-]{20,}["\']?',
+                  'token="***"', text, flags=re.IGNORECASE)
+    return text
+
+
+def _legacy_clean_text(text: str) -> str:
+    """重构前的 clean_text 实现（逐字符 str.replace + 多次正则 + split/join），作为对照基线"""
+    for char in PromptCleaner.CONTROL_CHARS + PromptCleaner.WHITESPACE_CHARS:
+        text = text.replace(char, '')
+    text = re.sub(r'\r\n|\r', '\n', text)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    text = '\n'.join(line.rstrip() for line in text.split('\n'))
+    return text.strip()
+
+
+def build_sample(size_mb: float, block: str = SAMPLE_BLOCK) -> str:
+    """生成指定大小（MB）的测试文本"""
+    repeat = max(int(size_mb * 1024 * 1024 / len(block)), 1)
+    return block * repeat
+
+
+def measure(func: Callable[[], object], repeat: int) -> float:
+    """多次运行取最小耗时（秒）"""
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run_benchmarks(size_mb: float, repeat: int) -> None:
+    """运行所有基准并打印结果"""
+    text = build_sample(size_mb)
+    # 每 100 个代码块插入一段敏感配置
+    sensitive_text = build_sample(size_mb, SAMPLE_BLOCK * 100 + SENSITIVE_BLOCK)
+    chunk_size = PromptCleaner.STREAM_CHUNK_SIZE
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+    sensitive_chunks = [
+        sensitive_text[i:i + chunk_size] for i in range(0, len(sensitive_text), chunk_size)
+    ]
+    actual_mb = len(text) / (1024 * 1024)
+
+    cases = [
+        ("legacy clean_text", lambda: _legacy_clean_text(text)),
+        ("clean_text", lambda: PromptCleaner.clean_text(text)),
+        ("iter_clean_text", lambda: ''.join(PromptCleaner.iter_clean_text(chunks))),
+        ("clean_text (non-ascii)", lambda: PromptCleaner.clean_text(text + "中")),
+        ("legacy remove_sensitive", lambda: _legacy_remove_sensitive_info(sensitive_text)),
+        ("remove_sensitive_info", lambda: PromptCleaner.remove_sensitive_info(sensitive_text)),
+        ("iter_scrub", lambda: ''.join(scrubber.iter_scrub(sensitive_chunks))),
+    ]
+
+    print(f"Input: {actual_mb:.1f} MB, best of {repeat}")
+    for name, func in cases:
+        elapsed = measure(func, repeat)
+        print(f"  {name:<24} {elapsed * 1000:8.1f} ms  {actual_mb / elapsed:8.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PromptCleaner micro-benchmark")
+    parser.add_argument("--size-mb", type=float, default=5.0, help="测试文本大小（MB）")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数")
+    args = parser.parse_args()
+
+    run_benchmarks(args.size_mb, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
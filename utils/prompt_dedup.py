@@ -0,0 +1,169 @@
+"""
+Prompt 跨文件内容去重
+同一份 clientlib CSS、公共 JS 或 templates.html 常常通过主组件和各依赖组件的分析
+多次进入 prompt。按规范化内容哈希为内容块生成指纹，重复出现的块替换为简短引用
+"""
+import hashlib
+import logging
+import re
+from typing import Dict, List, Optional, Sequence
+
+from utils.token_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 参与去重的最小块长度（字符），更短的块引用本身不比原文省多少
+MIN_BLOCK_CHARS = 200
+
+# 按代码块（```...```）和空行切分内容块，分隔符保留在结果中
+_BLOCK_SPLIT = re.compile(r'(```[\s\S]*?```|\n{2,})')
+_SEPARATOR = re.compile(r'\n{2,}')
+
+
+def fingerprint(content: str) -> str:
+    """
+    计算内容块的规范化指纹（忽略空白差异）
+
+    Args:
+        content: 内容块
+
+    Returns:
+        十六进制指纹
+    """
+    normalized = ' '.join(content.split())
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class PromptDeduplicator:
+    """
+    Prompt 内容去重器
+
+    用法：
+        deduplicator = PromptDeduplicator()
+        texts = deduplicator.deduplicate(texts, priorities)
+        logger.info(deduplicator.report())
+    """
+
+    def __init__(self, min_block_chars: int = MIN_BLOCK_CHARS):
+        self.min_block_chars = min_block_chars
+        # block_id -> 原始内容块
+        self.blocks: Dict[int, str] = {}
+        # block_id -> 保留原文的文本序号
+        self.holders: Dict[int, int] = {}
+        # 文本序号 -> {block_id: 引用文本}
+        self.references: Dict[int, Dict[int, str]] = {}
+        self.stats = {
+            'blocks': 0,
+            'duplicates': 0,
+            'bytes_saved': 0,
+            'tokens_saved': 0,
+        }
+
+    @staticmethod
+    def block_header(block_id: int) -> str:
+        """原文块的标记"""
+        return f"[block #{block_id}]"
+
+    @staticmethod
+    def block_reference(block_id: int, block: str) -> str:
+        """重复块的引用文本"""
+        lines = [line for line in block.strip().split('\n') if not line.startswith('```')]
+        first_line = lines[0][:60] if lines else ''
+        return f"[duplicate content omitted, see block #{block_id}: {first_line} ...]"
+
+    def _split(self, text: str) -> List[str]:
+        """切分为内容块和分隔符（拼接后等于原文）"""
+        return [part for part in _BLOCK_SPLIT.split(text) if part]
+
+    def deduplicate(self, texts: Sequence[str],
+                    priorities: Optional[Sequence[int]] = None) -> List[str]:
+        """
+        对多段文本做跨段去重
+
+        原文保留在优先级最高（数值最小）的文本中，同优先级时保留在靠前的文本中；
+        其余出现位置替换为引用。
+
+        Args:
+            texts: 文本列表（如 prompt 的各个段落）
+            priorities: 各文本的优先级（None 表示按顺序）
+
+        Returns:
+            去重后的文本列表（与输入一一对应）
+        """
+        if priorities is None:
+            priorities = list(range(len(texts)))
+
+        split_texts = [self._split(text) for text in texts]
+
+        # 第一遍：统计每个指纹出现的位置
+        occurrences: Dict[str, List[tuple]] = {}
+        for text_index, parts in enumerate(split_texts):
+            for part_index, part in enumerate(parts):
+                if len(part) < self.min_block_chars or _SEPARATOR.fullmatch(part):
+                    continue
+                occurrences.setdefault(fingerprint(part), []).append((text_index, part_index))
+
+        # 第二遍：为重复块选择保留位置，其余位置替换为引用
+        block_ids_by_holder = []
+        for positions in occurrences.values():
+            if len(positions) < 2:
+                continue
+            holder = min(positions, key=lambda pos: (priorities[pos[0]], pos[0], pos[1]))
+            block_ids_by_holder.append((holder, positions))
+
+        # 按原文出现顺序编号，保证输出稳定
+        block_ids_by_holder.sort(key=lambda item: (item[0][0], item[0][1]))
+
+        for block_id, (holder, positions) in enumerate(block_ids_by_holder, start=len(self.blocks) + 1):
+            holder_text, holder_part = holder
+            block = split_texts[holder_text][holder_part]
+            self.blocks[block_id] = block
+            self.holders[block_id] = holder_text
+            self.stats['blocks'] += 1
+
+            split_texts[holder_text][holder_part] = f"{self.block_header(block_id)}\n{block}"
+
+            for text_index, part_index in positions:
+                if (text_index, part_index) == holder:
+                    continue
+                original = split_texts[text_index][part_index]
+                reference = self.block_reference(block_id, block)
+                split_texts[text_index][part_index] = reference
+                self.references.setdefault(text_index, {})[block_id] = reference
+
+                self.stats['duplicates'] += 1
+                self.stats['bytes_saved'] += len(original.encode('utf-8')) - len(reference.encode('utf-8'))
+                self.stats['tokens_saved'] += estimate_tokens(original) - estimate_tokens(reference)
+
+        return [''.join(parts) for parts in split_texts]
+
+    def expand_references(self, text: str, text_index: int, block_ids: Sequence[int]) -> str:
+        """
+        将文本中的引用还原为原文（原文所在段落被丢弃或降级时使用）
+
+        Args:
+            text: 去重后的文本
+            text_index: 文本序号
+            block_ids: 需要还原的块编号
+
+        Returns:
+            还原后的文本
+        """
+        for block_id in block_ids:
+            reference = self.references.get(text_index, {}).get(block_id)
+            if reference and reference in text:
+                block = self.blocks[block_id]
+                text = text.replace(reference, f"{self.block_header(block_id)}\n{block}", 1)
+                self.holders[block_id] = text_index
+                self.stats['duplicates'] -= 1
+                self.stats['bytes_saved'] -= len(block.encode('utf-8')) - len(reference.encode('utf-8'))
+                self.stats['tokens_saved'] -= estimate_tokens(block) - estimate_tokens(reference)
+        return text
+
+    def report(self) -> str:
+        """生成去重报告"""
+        return (
+            f"Prompt dedup: {self.stats['duplicates']} duplicate block(s) of "
+            f"{self.stats['blocks']} shared block(s) replaced, saved "
+            f"{self.stats['bytes_saved']} bytes (~{self.stats['tokens_saved']} tokens)"
+        )
@@ -1,8 +1,21 @@
 """
 Prompt 增强工具
 用于增强和优化 Agent prompts，提高生成质量
+
+修正迭代使用增量上下文：write_code 之后生成一次精简的转换摘要（conversion brief）并缓存，
+之后每轮修正 prompt 只包含摘要、当前代码、未解决的问题和已尝试过的修正历史，
+不再重复发送完整的组件分析和 BDL 源码
 """
-from typing import Dict, List, Any
+import hashlib
+import json
+import logging
+import re
+import threading
+from typing import Dict, List, Any, Optional
+
+from utils.token_budget import estimate_tokens, summarize_text
+
+logger = logging.getLogger(__name__)
 
 
 def enhance_code_generation_prompt(base_prompt: str, context: Dict[str, Any]) -> str:
@@ -117,3 +130,268 @@ Focus on:
 Ensure the corrected code addresses ALL previous review findings."""
         
         return context
+
+
+def _brief_list(items: Any, limit: int) -> str:
+    values = [str(item) for item in (items or []) if item]
+    shown = ', '.join(values[:limit])
+    return shown + (f" (+{len(values) - limit} more)" if len(values) > limit else '')
+
+
+def build_conversion_brief(context: Dict[str, Any], max_tokens: Optional[int] = None) -> str:
+    """
+    生成精简的转换摘要：修正迭代所需的组件要点，替代完整的文件分析和 BDL 源码
+
+    Args:
+        context: 工作流状态（使用 component_name、file_analyses、selected_bdl_components、
+                 css_summary、aem_component_summary、dependency_tree、output_path）
+        max_tokens: 摘要的最大 token 数（None 时使用 Config.CONVERSION_BRIEF_TOKENS）
+
+    Returns:
+        摘要文本
+    """
+    if max_tokens is None:
+        from config import Config
+        max_tokens = Config.CONVERSION_BRIEF_TOKENS
+
+    lines = ["=== CONVERSION BRIEF ==="]
+    if context.get('component_name'):
+        lines.append(f"Component: {context['component_name']}")
+    if context.get('aem_component_summary'):
+        summary = context['aem_component_summary']
+        if not isinstance(summary, str):
+            summary = json.dumps(summary, ensure_ascii=False, default=str)
+        lines.append(f"AEM summary: {summarize_text(summary, max_tokens // 4)}")
+
+    analyses = context.get('file_analyses') or []
+    if analyses:
+        lines.append("Source files:")
+        for analysis in analyses:
+            if not isinstance(analysis, dict):
+                analysis = getattr(analysis, 'model_dump', lambda: {})()
+            name = str(analysis.get('file_path', 'unknown')).replace('\\', '/').rsplit('/', 1)[-1]
+            entry = f"- {name} ({analysis.get('file_type', 'unknown')}): {analysis.get('purpose', '')}"
+            features = _brief_list(analysis.get('key_features'), 6)
+            if features:
+                entry += f" | features: {features}"
+            configuration = analysis.get('configuration') or {}
+            if isinstance(configuration, dict) and configuration:
+                entry += f" | config: {_brief_list(configuration.keys(), 10)}"
+            lines.append(entry)
+
+    components = context.get('selected_bdl_components') or []
+    if components:
+        lines.append("BDL components (sources already used for the initial code, not repeated here):")
+        for component in components:
+            if isinstance(component, dict):
+                name = component.get('name') or component.get('component_name') or ''
+                lines.append(f"- {name}: {component.get('path', '')}".rstrip(': '))
+            else:
+                lines.append(f"- {component}")
+
+    if context.get('css_summary'):
+        lines.append(f"CSS: {summarize_text(str(context['css_summary']), max_tokens // 5)}")
+    dependency_tree = context.get('dependency_tree')
+    if dependency_tree:
+        if not isinstance(dependency_tree, str):
+            dependency_tree = json.dumps(dependency_tree, ensure_ascii=False, default=str)
+        lines.append(f"Dependencies: {summarize_text(dependency_tree, max_tokens // 6)}")
+
+    return summarize_text("\n".join(lines), max_tokens)
+
+
+# 只保留最近使用的摘要（批量转换时组件很多，每个组件只在自己的修正迭代中用到）
+_BRIEF_CACHE_MAX_ENTRIES = 32
+_BRIEF_CACHE: Dict[str, str] = {}
+_BRIEF_LOCK = threading.Lock()
+
+
+def get_conversion_brief(context: Dict[str, Any], max_tokens: Optional[int] = None) -> str:
+    """
+    获取转换摘要（按组件和分析内容缓存，同一组件的各轮修正只生成一次）
+
+    Args:
+        context: 工作流状态
+        max_tokens: 摘要的最大 token 数
+
+    Returns:
+        摘要文本
+    """
+    key_source = json.dumps(
+        [context.get('code_file_path') or context.get('component_name'),
+         context.get('file_analyses'), context.get('selected_bdl_components'), max_tokens],
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    key = hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+    with _BRIEF_LOCK:
+        cached = _BRIEF_CACHE.pop(key, None)
+        if cached is not None:
+            # 重新插入到末尾，字典顺序即最近使用顺序
+            _BRIEF_CACHE[key] = cached
+            return cached
+    brief = build_conversion_brief(context, max_tokens)
+    with _BRIEF_LOCK:
+        _BRIEF_CACHE[key] = brief
+        while len(_BRIEF_CACHE) > _BRIEF_CACHE_MAX_ENTRIES:
+            del _BRIEF_CACHE[next(iter(_BRIEF_CACHE))]
+    logger.info(f"Built conversion brief (~{estimate_tokens(brief)} tokens)")
+    return brief
+
+
+def unresolved_issues(review_results: Dict[str, Any]) -> Dict[str, List[str]]:
+    """
+    提取未通过审查的问题
+
+    Args:
+        review_results: 审查结果（审查键 → 结果字典）
+
+    Returns:
+        审查键 → 问题列表（跳过已通过和本轮被跳过的审查）
+    """
+    issues: Dict[str, List[str]] = {}
+    for key, result in (review_results or {}).items():
+        if not isinstance(result, dict) or result.get('passed') is not False:
+            continue
+        entries = [str(issue) for issue in (result.get('issues') or [])]
+        entries += [str(error) for error in (result.get('errors') or [])]
+        issues[key] = list(dict.fromkeys(entries)) or [f"{key} review failed"]
+    return issues
+
+
+# 问题文本中的位置：line 12、lines 3-5、column 4、col 4、file.jsx:12、file.jsx:12:4、(12:4)
+_ISSUE_POSITION = re.compile(
+    r'\b(?:lines?|col(?:umn)?)\s*\d+(?:\s*(?:-|to)\s*\d+)?'
+    r'|(?<=[a-z]):\d+(?::\d+)?\b|\(\d+:\d+\)'
+)
+
+
+def issue_key(review_key: str, issue: str) -> str:
+    """
+    问题的规范化键：审查键 + 小写文本（去掉行号/列号、合并空白）
+
+    同一问题在修正后行号常会变化（如 "line 12" → "line 14"），按原文比较会被当作新问题；
+    其他数字是问题的一部分（H1/H2、card2.css/card3.css 是不同的问题），保留
+    """
+    text = _ISSUE_POSITION.sub('', issue.lower())
+    return f"{review_key}:{' '.join(text.split())}"
+
+
+class CorrectionHistory:
+    """
+    记录每轮修正针对的问题、修正方式和之后的审查结论，
+    供下一轮修正 prompt 说明哪些修正已经尝试过、哪些问题仍然存在
+    """
+
+    def __init__(self):
+        self.attempts: List[Dict[str, Any]] = []
+
+    def record_attempt(self, iteration: int, issues: Dict[str, List[str]],
+                       result: Optional[Dict[str, Any]] = None) -> None:
+        """
+        记录一次修正
+
+        Args:
+            iteration: 迭代次数
+            issues: 本轮修正针对的问题（unresolved_issues() 的返回值）
+            result: CorrectAgent.correct() 的返回值（mode、edits、edit_summaries 等）
+        """
+        result = result or {}
+        self.attempts.append({
+            'iteration': iteration,
+            'issues': {key: list(values) for key, values in issues.items()},
+            'mode': result.get('mode', ''),
+            'edits': result.get('edits', 0),
+            'edit_summaries': [summary for summary in (result.get('edit_summaries') or []) if summary],
+            'still_failing': None,
+        })
+
+    def record_review(self, review_results: Dict[str, Any]) -> None:
+        """记录最近一次修正之后的审查结论"""
+        if self.attempts:
+            self.attempts[-1]['still_failing'] = sorted(unresolved_issues(review_results))
+
+    def repeat_counts(self, issues: Dict[str, List[str]]) -> Dict[str, int]:
+        """
+        每个问题已经被尝试修正的次数（按 issue_key() 比较，每轮最多计一次）
+
+        Returns:
+            issue_key() → 次数
+        """
+        attempted: Dict[str, int] = {}
+        for attempt in self.attempts:
+            keys = {issue_key(key, issue) for key, values in attempt['issues'].items() for issue in values}
+            for key in keys:
+                attempted[key] = attempted.get(key, 0) + 1
+        counts: Dict[str, int] = {}
+        for key, values in issues.items():
+            for issue in values:
+                normalized = issue_key(key, issue)
+                if normalized in attempted:
+                    counts[normalized] = attempted[normalized]
+        return counts
+
+    def summary(self, max_attempts: int = 3) -> str:
+        """生成修正历史摘要（只包含最近几轮）"""
+        if not self.attempts:
+            return ''
+        lines = ["=== CORRECTION HISTORY ==="]
+        for attempt in self.attempts[-max_attempts:]:
+            targeted = ', '.join(f"{key} ({len(values)})" for key, values in attempt['issues'].items()) or 'none'
+            line = f"- Iteration {attempt['iteration']}: targeted {targeted}"
+            if attempt['mode']:
+                line += f"; applied {attempt['edits']} {attempt['mode']} edit(s)"
+            if attempt.get('edit_summaries'):
+                line += " at " + ', '.join(f"`{summary}`" for summary in attempt['edit_summaries'][:5])
+            if attempt['still_failing'] is not None:
+                failing = ', '.join(attempt['still_failing'])
+                line += f"; still failing afterwards: {failing}" if failing else "; all targeted reviews passed"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def build_correction_prompt(brief: str, review_results: Dict[str, Any], iteration: int,
+                            history: Optional[CorrectionHistory] = None,
+                            code: Optional[str] = None, max_issues_per_review: int = 8) -> str:
+    """
+    构建增量修正 prompt：转换摘要 + 未解决的问题 + 修正历史（+ 当前代码）
+
+    Args:
+        brief: get_conversion_brief() 生成的摘要
+        review_results: 最近一次审查结果
+        iteration: 当前迭代次数
+        history: 修正历史
+        code: 当前代码（使用 CorrectAgent.correct() 时由其附加，这里不需要传入）
+        max_issues_per_review: 每个审查最多列出的问题数
+
+    Returns:
+        修正 prompt
+    """
+    issues = unresolved_issues(review_results)
+    repeats = history.repeat_counts(issues) if history else {}
+
+    sections = [
+        f"=== CORRECTION ITERATION {iteration} ===",
+        "Fix the unresolved review issues below in the current code. "
+        "Keep everything that already passed review unchanged.",
+        brief,
+    ]
+    if issues:
+        lines = ["=== UNRESOLVED ISSUES ==="]
+        for key, values in issues.items():
+            severity = (review_results.get(key) or {}).get('severity', '')
+            lines.append(f"[{key}]" + (f" severity: {severity}" if severity else ''))
+            for issue in values[:max_issues_per_review]:
+                tried = repeats.get(issue_key(key, issue), 0)
+                note = f" (already attempted {tried}x - try a different fix)" if tried else ''
+                lines.append(f"- {issue}{note}")
+            if len(values) > max_issues_per_review:
+                lines.append(f"- ... and {len(values) - max_issues_per_review} more")
+        sections.append("\n".join(lines))
+    if history and history.attempts:
+        sections.append(history.summary())
+    if code is not None:
+        sections.append(f"Current code:\n```jsx\n{code}\n```")
+
+    prompt = "\n\n".join(section for section in sections if section)
+    logger.info(f"Correction prompt for iteration {iteration}: ~{estimate_tokens(prompt)} tokens")
+    return prompt
@@ -0,0 +1,418 @@
+"""
+LLM 调用限流器
+进程内共享的令牌桶（每分钟请求数 RPM、每分钟 token 数 TPM）加自适应并发上限：
+- 调用前按预计 token 数申请额度，额度不足时排队等待，而不是等服务端返回 429 再盲目重试
+- 收到 429 时遵守 Retry-After，在暂停期间阻止所有新请求
+- 并发上限按 AIMD 调整：成功时加性增长，429 或延迟明显升高时乘性减小
+- 暴露排队深度、等待时间等指标
+"""
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# AIMD 参数
+ADDITIVE_INCREASE = 1.0          # 每完成 limit 个成功请求，并发上限 +1
+RATE_LIMIT_DECREASE = 0.5        # 429 时并发上限乘以该系数
+LATENCY_DECREASE = 0.9           # 延迟明显升高时并发上限乘以该系数
+LATENCY_TOLERANCE = 2.0          # 短期平滑延迟超过长期平滑延迟的倍数时视为拥塞
+DECREASE_COOLDOWN = 5.0          # 两次乘性减小之间的最小间隔（秒），避免同一波 429 连续减半
+SHORT_EWMA_ALPHA = 0.2           # 短期延迟指数平滑系数
+LONG_EWMA_ALPHA = 0.02           # 长期延迟指数平滑系数（作为基线）
+MIN_LATENCY_SAMPLES = 10         # 样本数不足时不做基于延迟的调整
+
+# 未提供 Retry-After 时，429 之后的默认暂停时间（秒）
+DEFAULT_RETRY_AFTER = 5.0
+
+# 错误信息中的 429 状态码：紧跟在 status/error/code/HTTP 之后，或后接 Too Many Requests
+# （不匹配请求 ID、token 数等中恰好出现的 429）
+_RATE_LIMIT_STATUS_MESSAGE = re.compile(
+    r'\b(?:status|error|code|http)\b[^\n]{0,16}?\b429\b|\b429\b[ \t:,-]{0,3}too many requests',
+    re.IGNORECASE
+)
+
+_RETRY_AFTER_MESSAGE = re.compile(
+    r'(?:retry|try again)[^\d]{0,20}(\d+(?:\.\d+)?)\s*(ms|milliseconds?|s|sec|seconds?)?',
+    re.IGNORECASE
+)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """判断异常是否为限流错误（HTTP 429）"""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None)
+    if isinstance(status, int):
+        return status == 429
+    # 没有状态码时才检查错误信息
+    message = str(error)
+    if _RATE_LIMIT_STATUS_MESSAGE.search(message):
+        return True
+    message = message.lower()
+    return 'rate limit' in message or 'too many requests' in message
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    从限流错误中提取 Retry-After（秒）
+
+    依次检查：异常的 retry_after 属性、响应头 retry-after-ms / retry-after（秒数或 HTTP 日期）、
+    错误信息中的 "retry after N seconds"。
+
+    Returns:
+        等待秒数；无法提取时返回 None
+    """
+    retry_after = getattr(error, 'retry_after', None)
+    if isinstance(retry_after, (int, float)):
+        return float(retry_after)
+
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        value = headers.get('retry-after-ms')
+        if value is not None:
+            return float(value) / 1000
+        value = headers.get('retry-after')
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (AttributeError, TypeError, ValueError):
+        pass
+
+    match = _RETRY_AFTER_MESSAGE.search(str(error))
+    if match:
+        seconds = float(match.group(1))
+        unit = (match.group(2) or 's').lower()
+        return seconds / 1000 if unit.startswith('m') else seconds
+
+    return None
+
+
+def estimate_call_tokens(args: tuple, kwargs: Dict[str, Any]) -> int:
+    """
+    估算一次调用的输入 token 数（从参数中的消息列表或字符串估算）
+
+    Args:
+        args: 被调用函数的位置参数
+        kwargs: 被调用函数的关键字参数
+
+    Returns:
+        估算的 token 数
+    """
+    from utils.token_budget import estimate_tokens
+
+    total = 0
+    for value in list(args) + list(kwargs.values()):
+        if isinstance(value, str):
+            total += estimate_tokens(value)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                content = item.get('content') if isinstance(item, dict) else getattr(item, 'content', None)
+                if isinstance(content, str):
+                    total += estimate_tokens(content)
+    return total
+
+
+def extract_result_tokens(result: Any) -> Optional[int]:
+    """从 agent 返回结果中提取实际消耗的 token 数（输入 + 输出），无法提取时返回 None"""
+    from utils.llm_metrics import extract_usage
+
+    messages = result.get('messages') if isinstance(result, dict) else [result]
+    total = None
+    for message in messages or []:
+        if isinstance(message, dict) or getattr(message, 'type', None) == 'ai':
+            usage = extract_usage(message)
+            if usage:
+                total = (total or 0) + usage['input_tokens'] + usage['output_tokens']
+    return total
+
+
+class TokenBucket:
+    """令牌桶（调用方负责加锁）"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """获得 amount 个令牌需要等待的时间（秒）"""
+        # 单次请求超过桶容量时按满桶计算，避免永远等待
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+
+class RateLimiter:
+    """
+    进程内共享的 LLM 限流器（线程安全）
+
+    用法：
+        with rate_limiter.limit(estimated_tokens) as permit:
+            result = call_llm()
+            permit.actual_tokens = extract_result_tokens(result)
+    调用抛出异常时自动按失败/限流记录。
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        min_concurrency: int = 1
+    ):
+        """
+        Args:
+            requests_per_minute: 每分钟请求数上限（None 表示使用 Config.LLM_RPM，0 表示不限）
+            tokens_per_minute: 每分钟 token 数上限（None 表示使用 Config.LLM_TPM，0 表示不限）
+            max_concurrency: 并发上限的最大值（None 表示使用 Config.LLM_MAX_CONCURRENCY）
+            min_concurrency: 并发上限的最小值
+        """
+        from config import Config
+
+        rpm = Config.LLM_RPM if requests_per_minute is None else requests_per_minute
+        tpm = Config.LLM_TPM if tokens_per_minute is None else tokens_per_minute
+        self.request_bucket = TokenBucket(rpm) if rpm else None
+        self.token_bucket = TokenBucket(tpm) if tpm else None
+
+        self.max_concurrency = max_concurrency or Config.LLM_MAX_CONCURRENCY
+        self.min_concurrency = min_concurrency
+        self.concurrency_limit = float(self.max_concurrency)
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._latency_samples = 0
+        self._latency_short: Optional[float] = None
+        self._latency_long: Optional[float] = None
+
+        self._metrics = {
+            'requests': 0,
+            'rate_limited': 0,
+            'failures': 0,
+            'tokens': 0,
+            'total_wait': 0.0,
+            'max_wait': 0.0,
+            'max_queue_depth': 0,
+        }
+
+    def _ready_in(self, now: float, tokens: int) -> float:
+        """距离可以发出请求还需等待的时间（0 表示立即可发），调用方持有锁"""
+        if self._in_flight >= int(self.concurrency_limit):
+            # 等待其他请求完成时被唤醒
+            return float('inf')
+
+        wait = max(self._paused_until - now, 0.0)
+        if self.request_bucket:
+            self.request_bucket.refill(now)
+            wait = max(wait, self.request_bucket.wait_time(1))
+        if self.token_bucket:
+            self.token_bucket.refill(now)
+            wait = max(wait, self.token_bucket.wait_time(tokens))
+        return wait
+
+    def acquire(self, tokens: int = 0, timeout: Optional[float] = None) -> float:
+        """
+        申请一次调用的额度（阻塞直到可用）
+
+        Args:
+            tokens: 预计消耗的 token 数
+            timeout: 最长等待时间（秒），超时抛出 TimeoutError
+
+        Returns:
+            实际等待时间（秒）
+        """
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+
+        with self._condition:
+            self._waiting += 1
+            self._metrics['max_queue_depth'] = max(self._metrics['max_queue_depth'], self._waiting)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._ready_in(now, tokens)
+                    if wait <= 0:
+                        break
+                    if deadline is not None:
+                        if now >= deadline:
+                            raise TimeoutError(f"Rate limiter wait exceeded {timeout:.1f}s")
+                        wait = min(wait, deadline - now)
+                    # 无限等待时依赖 release() 唤醒，但仍定期检查以应对时钟推进
+                    self._condition.wait(timeout=min(wait, 1.0))
+
+                self._in_flight += 1
+                if self.request_bucket:
+                    self.request_bucket.tokens -= 1
+                if self.token_bucket:
+                    self.token_bucket.tokens -= min(tokens, self.token_bucket.capacity)
+            finally:
+                self._waiting -= 1
+
+            waited = time.monotonic() - start
+            self._metrics['requests'] += 1
+            self._metrics['total_wait'] += waited
+            self._metrics['max_wait'] = max(self._metrics['max_wait'], waited)
+
+        if waited > 1.0:
+            logger.debug(f"Rate limiter: waited {waited:.2f}s (queue depth {self._waiting})")
+        return waited
+
+    def release(
+        self,
+        latency: float,
+        estimated_tokens: int = 0,
+        actual_tokens: Optional[int] = None,
+        error: Optional[Exception] = None,
+        cancelled: bool = False
+    ) -> None:
+        """
+        归还额度并根据结果调整并发上限
+
+        Args:
+            latency: 调用耗时（秒）
+            estimated_tokens: acquire() 时申请的 token 数
+            actual_tokens: 实际消耗的 token 数（None 表示未知，按预计值计）
+            error: 调用抛出的异常（None 表示成功）
+            cancelled: 调用被取消（如对冲请求的落选方），只归还额度，不计入延迟和失败
+        """
+        now = time.monotonic()
+        with self._condition:
+            self._in_flight = max(self._in_flight - 1, 0)
+
+            if actual_tokens is not None and self.token_bucket:
+                # 用实际消耗校正预扣的 token 数
+                self.token_bucket.tokens -= actual_tokens - min(estimated_tokens, self.token_bucket.capacity)
+            self._metrics['tokens'] += actual_tokens if actual_tokens is not None else estimated_tokens
+
+            if error is not None and is_rate_limit_error(error):
+                self._metrics['rate_limited'] += 1
+                retry_after = get_retry_after(error)
+                self._paused_until = max(self._paused_until, now + (retry_after or DEFAULT_RETRY_AFTER))
+                self._decrease(now, RATE_LIMIT_DECREASE, f"429 (retry after {retry_after or DEFAULT_RETRY_AFTER:.1f}s)")
+            elif error is not None:
+                self._metrics['failures'] += 1
+            elif not cancelled:
+                tokens = actual_tokens if actual_tokens is not None else estimated_tokens
+                # LLM 延迟随 token 数变化很大，能拿到 token 数时按每千 token 的延迟比较
+                self._observe_latency(now, latency * 1000 / tokens if tokens else latency)
+
+            self._condition.notify_all()
+
+    def _observe_latency(self, now: float, latency: float) -> None:
+        """记录成功请求的延迟，并做加性增长或基于延迟的乘性减小（调用方持有锁）"""
+        self._latency_samples += 1
+        if self._latency_short is None:
+            self._latency_short = self._latency_long = latency
+        else:
+            self._latency_short += SHORT_EWMA_ALPHA * (latency - self._latency_short)
+            self._latency_long += LONG_EWMA_ALPHA * (latency - self._latency_long)
+
+        congested = (
+            self._latency_samples >= MIN_LATENCY_SAMPLES
+            and self._latency_short > self._latency_long * LATENCY_TOLERANCE
+        )
+        if congested and self.concurrency_limit > self.min_concurrency:
+            self._decrease(now, LATENCY_DECREASE, "latency rising")
+        elif self.concurrency_limit < self.max_concurrency:
+            self.concurrency_limit = min(
+                self.max_concurrency,
+                self.concurrency_limit + ADDITIVE_INCREASE / self.concurrency_limit
+            )
+
+    def _decrease(self, now: float, factor: float, reason: str) -> None:
+        """乘性减小并发上限（调用方持有锁）"""
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        previous = self.concurrency_limit
+        self.concurrency_limit = max(float(self.min_concurrency), self.concurrency_limit * factor)
+        if int(previous) != int(self.concurrency_limit):
+            logger.warning(
+                f"Rate limiter: concurrency {int(previous)} -> {int(self.concurrency_limit)} ({reason})"
+            )
+
+    @contextmanager
+    def limit(self, tokens: int = 0, timeout: Optional[float] = None) -> Iterator["_Permit"]:
+        """
+        在上下文中持有一次调用的额度
+
+        Args:
+            tokens: 预计消耗的 token 数
+            timeout: 最长排队时间（秒）
+
+        Yields:
+            permit：可设置 permit.actual_tokens 为实际消耗
+        """
+        self.acquire(tokens, timeout=timeout)
+        permit = _Permit()
+        start = time.monotonic()
+        error: Optional[BaseException] = None
+        try:
+            yield permit
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            # KeyboardInterrupt、GeneratorExit 等也要归还额度，按取消处理
+            self.release(
+                time.monotonic() - start, tokens, permit.actual_tokens,
+                error=error if isinstance(error, Exception) else None,
+                cancelled=error is not None and not isinstance(error, Exception)
+            )
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        当前指标
+
+        Returns:
+            requests, rate_limited, failures, tokens, queue_depth, max_queue_depth, in_flight,
+            concurrency_limit, avg_wait, max_wait, total_wait, paused_for
+        """
+        with self._condition:
+            metrics = dict(self._metrics)
+            metrics.update({
+                'queue_depth': self._waiting,
+                'in_flight': self._in_flight,
+                'concurrency_limit': int(self.concurrency_limit),
+                'paused_for': max(self._paused_until - time.monotonic(), 0.0),
+            })
+        metrics['avg_wait'] = metrics['total_wait'] / metrics['requests'] if metrics['requests'] else 0.0
+        return metrics
+
+    def report(self) -> str:
+        """生成可读的指标报告"""
+        metrics = self.metrics()
+        return (
+            f"Rate limiter: {metrics['requests']} requests, {metrics['tokens']} tokens, "
+            f"{metrics['rate_limited']} rate-limited, concurrency limit {metrics['concurrency_limit']}, "
+            f"max queue depth {metrics['max_queue_depth']}, "
+            f"wait avg {metrics['avg_wait']:.2f}s / max {metrics['max_wait']:.2f}s"
+        )
+
+
+class _Permit:
+    """limit() 上下文中的额度句柄"""
+
+    def __init__(self):
+        self.actual_tokens: Optional[int] = None
+
+
+# 创建全局限流器实例
+rate_limiter = RateLimiter()
@@ -1,23 +1,43 @@
 """
 重试机制工具
-支持指数退避和错误分类
+支持指数退避和错误分类，以及按端点/模型的熔断器和全局重试预算：
+服务端故障期间熔断器打开后直接失败，不再让每个节点各自耗尽重试次数
 """
 import time
 import logging
+import threading
+from collections import deque
 from functools import wraps
-from typing import Callable, TypeVar, Tuple, Optional, List
+from typing import Any, Callable, Dict, TypeVar, Tuple, Optional, List
 from langchain_core.exceptions import LangChainException
+from utils.rate_limiter import (
+    rate_limiter,
+    is_rate_limit_error,
+    get_retry_after,
+    estimate_call_tokens,
+    extract_result_tokens
+)
+from utils.llm_metrics import usage_tracker
 
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T')
 
+
+class CircuitOpenError(Exception):
+    """熔断器打开时直接拒绝调用"""
+
+    def __init__(self, key: str, retry_in: float):
+        super().__init__(f"Circuit open for {key}, retry in {retry_in:.1f}s")
+        self.key = key
+        self.retry_in = retry_in
+
+
 # 可重试的异常类型
 RETRYABLE_EXCEPTIONS = (
     LangChainException,
     ConnectionError,
     TimeoutError,
-    Exception  # 通用异常，但需要检查具体错误信息
 )
 
 # 不可重试的异常（立即失败）
@@ -25,8 +45,26 @@ NON_RETRYABLE_EXCEPTIONS = (
     ValueError,  # 配置错误等
     KeyError,    # 状态错误等
     TypeError,   # 类型错误等
+    CircuitOpenError,
 )
 
+# 可重试的 HTTP 状态码（限流、服务端错误）
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# SDK 异常类名中表示临时故障的关键字（openai/httpx 的异常不继承内置 ConnectionError）
+RETRYABLE_ERROR_NAMES = (
+    'RateLimit', 'Timeout', 'Connection', 'InternalServer', 'ServiceUnavailable',
+    'Overloaded', 'RemoteProtocol',
+)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """提取异常中的 HTTP 状态码"""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
 
 def is_retryable_error(error: Exception) -> bool:
     """判断错误是否可重试"""
@@ -34,9 +72,16 @@ def is_retryable_error(error: Exception) -> bool:
     if isinstance(error, NON_RETRYABLE_EXCEPTIONS):
         return False
     
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    
     # 检查是否是可重试的异常
-    if isinstance(error, RETRYABLE_EXCEPTIONS):
-        # 对于通用 Exception，检查错误信息
+    error_name = type(error).__name__
+    if (isinstance(error, RETRYABLE_EXCEPTIONS)
+            or any(name in error_name for name in RETRYABLE_ERROR_NAMES)
+            or is_rate_limit_error(error)):
+        # 检查错误信息
         error_msg = str(error).lower()
         non_retryable_keywords = [
             "invalid", "not found", "permission denied", 
@@ -49,12 +94,176 @@ def is_retryable_error(error: Exception) -> bool:
     return False
 
 
+class CircuitBreaker:
+    """
+    熔断器（closed → open → half-open → closed，线程安全）
+
+    - closed：正常调用，连续失败达到 failure_threshold 次后打开
+    - open：直接抛出 CircuitOpenError，recovery_timeout 秒后进入 half-open
+    - half-open：只放行 half_open_max_calls 个探测调用，成功则关闭，失败则重新打开
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, key: str, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 half_open_max_calls: int = 1):
+        self.key = key
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+
+    def before_call(self) -> None:
+        """调用前检查，熔断器打开时抛出 CircuitOpenError"""
+        with self._lock:
+            if self.state == self.OPEN:
+                elapsed = time.monotonic() - self._opened_at
+                if elapsed < self.recovery_timeout:
+                    raise CircuitOpenError(self.key, self.recovery_timeout - elapsed)
+                self.state = self.HALF_OPEN
+                self._probes = 0
+                logger.info(f"Circuit {self.key}: half-open, probing")
+
+            if self.state == self.HALF_OPEN:
+                if self._probes >= self.half_open_max_calls:
+                    raise CircuitOpenError(self.key, 0.0)
+                self._probes += 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit {self.key}: closed")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(
+                        f"Circuit {self.key}: open after {self._failures} failure(s), "
+                        f"failing fast for {self.recovery_timeout:.0f}s"
+                    )
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """half-open 探测调用因不计入熔断的原因结束（如参数错误）时归还探测名额"""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+
+class RetryBudget:
+    """
+    全局重试预算（线程安全）
+
+    在滑动时间窗口内，重试次数不超过 min_retries + ratio × 首次调用次数，
+    服务端故障时把重试带来的额外负载限制在约 ratio 以内
+    """
+
+    def __init__(self, ratio: float = 0.1, min_retries: int = 3, window: float = 60.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._lock = threading.Lock()
+        self._requests: deque = deque()
+        self._retries: deque = deque()
+        self.exhausted = 0
+
+    def _trim(self, now: float) -> None:
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_request(self) -> None:
+        """记录一次首次调用"""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        """申请一次重试，预算耗尽时返回 False"""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                self.exhausted += 1
+                return False
+            self._retries.append(now)
+            return True
+
+
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+_retry_budget: Optional[RetryBudget] = None
+
+
+def get_circuit_breaker(key: str) -> CircuitBreaker:
+    """获取（或创建）指定端点/模型的熔断器"""
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(key)
+        if breaker is None:
+            from config import Config
+            breaker = _circuit_breakers[key] = CircuitBreaker(
+                key,
+                failure_threshold=Config.CIRCUIT_FAILURE_THRESHOLD,
+                recovery_timeout=Config.CIRCUIT_RECOVERY_SECONDS
+            )
+        return breaker
+
+
+def get_retry_budget() -> RetryBudget:
+    """获取全局重试预算"""
+    global _retry_budget
+    with _circuit_breakers_lock:
+        if _retry_budget is None:
+            from config import Config
+            _retry_budget = RetryBudget(ratio=Config.RETRY_BUDGET_RATIO)
+        return _retry_budget
+
+
+def default_circuit_key(args: tuple, kwargs: Dict[str, Any]) -> str:
+    """
+    熔断器键：端点 + 模型
+
+    被装饰的方法是 agent 方法时（第一个参数有 model_name），使用 agent 的模型，
+    否则使用 Config 中的默认模型
+    """
+    from config import Config
+
+    owner = args[0] if args else None
+    model = getattr(owner, 'model_name', None) or Config.LLM_MODEL
+    endpoint = getattr(owner, 'api_base', None) or Config.LLM_API_BASE or 'default'
+    return f"{endpoint}|{model}"
+
+
+def _owner_name(args: tuple, func: Callable[..., Any]) -> str:
+    """用量统计中的调用方名称：agent 方法使用 agent 名称，否则使用函数名"""
+    if not args:
+        return func.__name__
+    return getattr(args[0], 'name', None) or func.__name__
+
+
 def retry_with_backoff(
     max_retries: int = 3,
     initial_delay: float = 1.0,
     max_delay: float = 60.0,
     exponential_base: float = 2.0,
-    jitter: bool = True
+    jitter: bool = True,
+    rate_limited: bool = True,
+    circuit_breaker: bool = True,
+    circuit_key: Optional[Callable[[tuple, Dict[str, Any]], str]] = None
 ):
     """
     重试装饰器，支持指数退避
@@ -65,24 +274,59 @@ def retry_with_backoff(
         max_delay: 最大延迟（秒）
         exponential_base: 指数基数
         jitter: 是否添加随机抖动
+        rate_limited: 每次尝试是否经过全局 LLM 限流器（utils.rate_limiter）
+        circuit_breaker: 是否启用熔断器和全局重试预算
+        circuit_key: 根据调用参数计算熔断器键的函数（None 表示 default_circuit_key）
     """
     def decorator(func: Callable[..., T]) -> Callable[..., T]:
         @wraps(func)
         def wrapper(*args, **kwargs) -> T:
+            if rate_limited:
+                # 录制/回放时，未经 cached_run 的真实 LLM 调用在严格回放下直接失败
+                from utils.cassette import cassette
+                cassette.check_live_call(_owner_name(args, func))
             last_exception = None
             delay = initial_delay
+            estimated_tokens = estimate_call_tokens(args, kwargs) if rate_limited else 0
+            breaker = None
+            budget = None
+            if circuit_breaker:
+                breaker = get_circuit_breaker((circuit_key or default_circuit_key)(args, kwargs))
+                budget = get_retry_budget()
+                budget.record_request()
             
             for attempt in range(max_retries + 1):
                 try:
-                    return func(*args, **kwargs)
+                    if breaker:
+                        breaker.before_call()
+                    if not rate_limited:
+                        result = func(*args, **kwargs)
+                    else:
+                        with rate_limiter.limit(estimated_tokens) as permit:
+                            result = func(*args, **kwargs)
+                            permit.actual_tokens = extract_result_tokens(result)
+                    if breaker:
+                        breaker.record_success()
+                    # 按 agent 记录 token 用量（含服务端 prefix caching 命中数）
+                    usage_tracker.record_result(_owner_name(args, func), result)
+                    return result
+                except CircuitOpenError as e:
+                    logger.error(f"{func.__name__} failed fast: {str(e)}")
+                    raise
                 except Exception as e:
                     last_exception = e
                     
                     # 检查是否可重试
                     if not is_retryable_error(e):
+                        if breaker:
+                            breaker.release_probe()
                         logger.error(f"Non-retryable error in {func.__name__}: {str(e)}")
                         raise
                     
+                    # 服务端临时故障计入熔断
+                    if breaker:
+                        breaker.record_failure()
+                    
                     # 如果已经达到最大重试次数，抛出异常
                     if attempt >= max_retries:
                         logger.error(
@@ -91,6 +335,14 @@ def retry_with_backoff(
                         )
                         raise
                     
+                    # 全局重试预算耗尽时不再重试
+                    if budget and not budget.try_spend():
+                        logger.error(
+                            f"Retry budget exhausted, not retrying {func.__name__}. "
+                            f"Last error: {str(e)}"
+                        )
+                        raise
+                    
                     # 计算延迟时间
                     if jitter:
                         import random
@@ -104,6 +356,12 @@ def retry_with_backoff(
                             max_delay
                         )
                     
+                    # 429：至少等待服务端要求的 Retry-After（限流器同时暂停其他请求）
+                    if is_rate_limit_error(e):
+                        retry_after = get_retry_after(e)
+                        if retry_after is not None:
+                            delay = max(delay, retry_after)
+                    
                     logger.warning(
                         f"Attempt {attempt + 1}/{max_retries + 1} failed for {func.__name__}: {str(e)}. "
                         f"Retrying in {delay:.2f}s..."
@@ -117,3 +375,242 @@ def retry_with_backoff(
         
         return wrapper
     return decorator
+
+
+class LatencyTracker:
+    """最近若干次成功调用的延迟，用于计算对冲请求的触发时间（线程安全）"""
+
+    def __init__(self, size: int = 200):
+        self._lock = threading.Lock()
+        self._samples: deque = deque(maxlen=size)
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, quantile: float, min_samples: int = 20) -> Optional[float]:
+        """返回延迟分位数，样本不足时返回 None"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < min_samples:
+            return None
+        index = min(int(len(samples) * quantile), len(samples) - 1)
+        return samples[index]
+
+
+# 对冲请求统计：hedged 为发出的对冲请求数，hedge_wins 为对冲请求先返回的次数
+hedge_stats = {'hedged': 0, 'hedge_wins': 0}
+
+
+def async_retry_with_backoff(
+    max_retries: int = 3,
+    initial_delay: float = 1.0,
+    max_delay: float = 60.0,
+    exponential_base: float = 2.0,
+    jitter: bool = True,
+    deadline: Optional[float] = None,
+    hedge: bool = False,
+    hedge_quantile: float = 0.95,
+    hedge_min_samples: int = 20,
+    rate_limited: bool = True,
+    circuit_breaker: bool = True,
+    circuit_key: Optional[Callable[[tuple, Dict[str, Any]], str]] = None
+):
+    """
+    异步重试装饰器（retry_with_backoff 的 async 版本），用于 async 图节点和 agent 的 ainvoke
+    
+    - 使用 asyncio.sleep 退避，不阻塞线程
+    - deadline：整个调用（含所有重试和退避）的截止时间，剩余时间不足以等待下一次重试时直接失败
+    - hedge：调用超过历史延迟的 p95 仍未返回时，再发出一个相同请求，取先成功返回的结果，
+      另一个被取消；对冲请求占用全局重试预算，预算耗尽时不再对冲
+    - 与同步版本共享限流器、熔断器和重试预算
+    
+    Args:
+        max_retries: 最大重试次数
+        initial_delay: 初始延迟（秒）
+        max_delay: 最大延迟（秒）
+        exponential_base: 指数基数
+        jitter: 是否添加随机抖动
+        deadline: 每次调用的总时限（秒，None 表示不限）
+        hedge: 是否启用对冲请求
+        hedge_quantile: 触发对冲的延迟分位数
+        hedge_min_samples: 开始对冲前需要的最少延迟样本数
+        rate_limited: 每个请求是否经过全局 LLM 限流器
+        circuit_breaker: 是否启用熔断器和全局重试预算
+        circuit_key: 根据调用参数计算熔断器键的函数（None 表示 default_circuit_key）
+    """
+    import asyncio
+    import random
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        # 按 agent 名称分别统计延迟（不同 agent 的 prompt 规模差异很大）
+        trackers: Dict[str, LatencyTracker] = {}
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            if rate_limited:
+                from utils.cassette import cassette
+                cassette.check_live_call(_owner_name(args, func))
+            loop = asyncio.get_running_loop()
+            deadline_at = loop.time() + deadline if deadline else None
+            estimated_tokens = estimate_call_tokens(args, kwargs) if rate_limited else 0
+            owner_name = getattr(args[0], 'name', '') if args else ''
+            tracker = trackers.setdefault(owner_name, LatencyTracker())
+
+            breaker = None
+            budget = None
+            if circuit_breaker:
+                breaker = get_circuit_breaker((circuit_key or default_circuit_key)(args, kwargs))
+                budget = get_retry_budget()
+                budget.record_request()
+
+            def remaining() -> Optional[float]:
+                return deadline_at - loop.time() if deadline_at is not None else None
+
+            def release_abandoned(acquire: "asyncio.Future") -> None:
+                # 等待期间被取消时线程中的 acquire() 仍会完成：拿到额度后立即归还
+                if not acquire.cancelled() and acquire.exception() is None:
+                    rate_limiter.release(0.0, estimated_tokens, 0, cancelled=True)
+
+            async def call_once():
+                acquired = False
+                start = time.monotonic()
+                error = None
+                result = None
+                try:
+                    if rate_limited:
+                        acquire = asyncio.ensure_future(
+                            asyncio.to_thread(rate_limiter.acquire, estimated_tokens, remaining())
+                        )
+                        try:
+                            await asyncio.shield(acquire)
+                        except asyncio.CancelledError:
+                            acquire.add_done_callback(release_abandoned)
+                            raise
+                        acquired = True
+                        start = time.monotonic()
+                    result = await func(*args, **kwargs)
+                    return result
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    latency = time.monotonic() - start
+                    if acquired:
+                        rate_limiter.release(
+                            latency, estimated_tokens,
+                            extract_result_tokens(result) if error is None else None,
+                            error=error if isinstance(error, Exception) else None,
+                            cancelled=isinstance(error, asyncio.CancelledError)
+                        )
+                    if error is None:
+                        tracker.record(latency)
+
+            async def attempt_call():
+                time_left = remaining()
+                hedge_after = tracker.percentile(hedge_quantile, hedge_min_samples) if hedge else None
+                if hedge_after is None or (time_left is not None and hedge_after >= time_left):
+                    return await asyncio.wait_for(call_once(), time_left)
+
+                primary = asyncio.ensure_future(call_once())
+                tasks = {primary}
+                try:
+                    done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                    if not done and (budget is None or budget.try_spend()):
+                        hedge_stats['hedged'] += 1
+                        logger.debug(f"Hedging {func.__name__} after {hedge_after:.1f}s")
+                        tasks.add(asyncio.ensure_future(call_once()))
+
+                    last_error = None
+                    pending = tasks
+                    while pending:
+                        done, pending = await asyncio.wait(
+                            pending, timeout=remaining(), return_when=asyncio.FIRST_COMPLETED
+                        )
+                        if not done:
+                            raise TimeoutError(f"Deadline exceeded for {func.__name__}")
+                        for task in done:
+                            if task.exception() is None:
+                                if task is not primary:
+                                    hedge_stats['hedge_wins'] += 1
+                                return task.result()
+                            last_error = task.exception()
+                    raise last_error
+                finally:
+                    for task in tasks:
+                        if not task.done():
+                            task.cancel()
+
+            last_exception = None
+            for attempt in range(max_retries + 1):
+                time_left = remaining()
+                if time_left is not None and time_left <= 0:
+                    raise TimeoutError(
+                        f"Deadline of {deadline:.1f}s exceeded for {func.__name__}"
+                    ) from last_exception
+                try:
+                    if breaker:
+                        breaker.before_call()
+                    result = await attempt_call()
+                    if breaker:
+                        breaker.record_success()
+                    usage_tracker.record_result(_owner_name(args, func), result)
+                    return result
+                except CircuitOpenError as e:
+                    logger.error(f"{func.__name__} failed fast: {str(e)}")
+                    raise
+                except Exception as e:
+                    last_exception = e
+
+                    if not is_retryable_error(e):
+                        if breaker:
+                            breaker.release_probe()
+                        logger.error(f"Non-retryable error in {func.__name__}: {str(e)}")
+                        raise
+
+                    if breaker:
+                        breaker.record_failure()
+
+                    if attempt >= max_retries:
+                        logger.error(
+                            f"Max retries ({max_retries}) exceeded for {func.__name__}. "
+                            f"Last error: {str(e)}"
+                        )
+                        raise
+
+                    if budget and not budget.try_spend():
+                        logger.error(
+                            f"Retry budget exhausted, not retrying {func.__name__}. "
+                            f"Last error: {str(e)}"
+                        )
+                        raise
+
+                    delay = min(initial_delay * (exponential_base ** attempt), max_delay)
+                    if jitter:
+                        delay = min(delay + random.uniform(0, 1), max_delay)
+                    if is_rate_limit_error(e):
+                        retry_after = get_retry_after(e)
+                        if retry_after is not None:
+                            delay = max(delay, retry_after)
+
+                    # 剩余时间不足以等待下一次重试时直接失败
+                    time_left = remaining()
+                    if time_left is not None and delay >= time_left:
+                        logger.error(
+                            f"Not retrying {func.__name__}: backoff {delay:.2f}s exceeds "
+                            f"remaining deadline {time_left:.2f}s"
+                        )
+                        raise
+
+                    logger.warning(
+                        f"Attempt {attempt + 1}/{max_retries + 1} failed for {func.__name__}: {str(e)}. "
+                        f"Retrying in {delay:.2f}s..."
+                    )
+                    await asyncio.sleep(delay)
+
+            if last_exception:
+                raise last_exception
+            raise RuntimeError(f"Unexpected error in {func.__name__}")
+
+        return wrapper
+    return decorator
@@ -0,0 +1,339 @@
+"""
+审查 Agent 并发执行
+review_code 节点中的各个审查 Agent 相互独立（都只读取同一份生成代码），
+依次执行时每轮审查耗时是 5~11 次 LLM 调用之和。这里在线程池中并发执行，
+汇总为与原来结构相同的 review_results，并记录每个审查的耗时
+
+审查分级执行：第 0 级为确定性静态检查（毫秒级），第 1 级为核心 LLM 审查，
+第 2 级为一致性审查；较低一级未通过时跳过之后的级别，直接进入 correct_code
+
+用法（review_code 节点中）：
+    prompts = {'security': security_prompt, 'build_execution': build_prompt, ...}
+    tiers = tiered_review_tasks(prompts, code, code_file_path, css_file_path)
+    review_results.update(review_runner.run_tiered(tiers))
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# review_results 的键 → (agents.review_agents 中的类名, 日志中的名称)，按原有执行顺序
+REVIEW_AGENTS: Dict[str, tuple] = {
+    'security': ('SecurityReviewAgent', 'security'),
+    'build': ('BuildReviewAgent', 'build'),
+    'bdl': ('BDLReviewAgent', 'BDL'),
+    'build_execution': ('BuildExecutionReviewAgent', 'build execution'),
+    'bdl_component_usage': ('BDLComponentUsageReviewAgent', 'BDL component usage'),
+    'css_import': ('CSSImportReviewAgent', 'CSS import'),
+    'component_reference': ('ComponentReferenceReviewAgent', 'component reference'),
+    'component_completeness': ('ComponentCompletenessReviewAgent', 'component completeness'),
+    'props_consistency': ('PropsConsistencyReviewAgent', 'props consistency'),
+    'style_consistency': ('StyleConsistencyReviewAgent', 'style consistency'),
+    'functionality_consistency': ('FunctionalityConsistencyReviewAgent', 'functionality consistency'),
+}
+
+# 审查分级（test_report.json 中的 core_reviews / consistency_reviews）
+CORE_REVIEWS = ('security', 'build', 'bdl', 'build_execution', 'bdl_component_usage',
+                'css_import', 'component_reference')
+CONSISTENCY_REVIEWS = ('component_completeness', 'props_consistency', 'style_consistency',
+                       'functionality_consistency')
+STATIC_REVIEW_KEY = 'static'
+
+# 会执行构建命令的审查：在同一输出目录下并发执行 npm run build 会互相干扰，需要串行
+BUILD_REVIEWS = ('build', 'build_execution')
+
+
+class ReviewTask:
+    """单个审查任务"""
+
+    def __init__(self, key: str, run: Callable[[], Any], label: Optional[str] = None,
+                 serial_group: Optional[str] = None):
+        """
+        Args:
+            key: review_results 中的键
+            run: 执行审查并返回结果（dict 或 Pydantic 模型）的函数
+            label: 日志中的名称（默认使用 key）
+            serial_group: 同一分组的任务串行执行（如共用构建目录的审查）
+        """
+        self.key = key
+        self.run = run
+        self.label = label or key.replace('_', ' ')
+        self.serial_group = serial_group
+
+
+def failed_review(label: str, error: Exception) -> Dict[str, Any]:
+    """审查 Agent 本身出错时的结果（视为未通过，交给 correct_code 之后重新审查）"""
+    return {
+        'passed': False,
+        'issues': [f"Error in {label} review: {error}"],
+        'severity': 'critical',
+        'error': str(error),
+    }
+
+
+def skipped_review(reason: str) -> Dict[str, Any]:
+    """因较低一级审查未通过而跳过的审查（passed 为 None，表示本轮未判定）"""
+    return {
+        'passed': None,
+        'skipped': True,
+        'issues': [],
+        'severity': 'none',
+        'reason': reason,
+    }
+
+
+def blocks_later_tiers(result: Any) -> bool:
+    """
+    审查结果是否应跳过之后的级别：未通过（或出错）的审查，
+    但 blocking 为 False 的失败（如只有括号问题的静态检查，可能是误判）除外
+    """
+    if not isinstance(result, dict):
+        return True
+    return not result.get('passed') and result.get('blocking') is not False
+
+
+def _to_dict(result: Any) -> Any:
+    if hasattr(result, 'model_dump'):
+        return result.model_dump()
+    return result
+
+
+def review_tasks(prompts: Dict[str, str], agent_kwargs: Optional[Dict[str, Any]] = None) -> List[ReviewTask]:
+    """
+    按 REVIEW_AGENTS 为每个 prompt 创建审查任务
+
+    Agent 在工作线程中创建（各自独立的 agent_graph，避免线程间共享状态）
+
+    Args:
+        prompts: review_results 键 → 审查 prompt（未提供的审查不执行）
+        agent_kwargs: 传给 Agent 构造函数的参数（如 model_name）
+
+    Returns:
+        按 REVIEW_AGENTS 顺序排列的任务列表
+    """
+    agent_kwargs = agent_kwargs or {}
+    tasks = []
+    for key, (class_name, label) in REVIEW_AGENTS.items():
+        if key not in prompts:
+            continue
+
+        def run(class_name=class_name, prompt=prompts[key]):
+            from agents import review_agents
+            from utils.llm_cache import cached_run
+            agent = getattr(review_agents, class_name)(**agent_kwargs)
+            return cached_run(agent, prompt)
+
+        tasks.append(ReviewTask(
+            key, run, label=label,
+            serial_group='build' if key in BUILD_REVIEWS else None,
+        ))
+    unknown = set(prompts) - set(REVIEW_AGENTS)
+    if unknown:
+        logger.warning(f"No review agent registered for: {', '.join(sorted(unknown))}")
+    return tasks
+
+
+def tiered_review_tasks(prompts: Dict[str, str], code: str, code_file_path: str = '',
+                        css_file_path: str = '',
+                        agent_kwargs: Optional[Dict[str, Any]] = None) -> List[List[ReviewTask]]:
+    """
+    创建分级审查任务：[静态检查], [核心审查], [一致性审查]
+
+    Args:
+        prompts: review_results 键 → 审查 prompt
+        code: 生成的代码（静态检查使用）
+        code_file_path: 代码文件路径
+        css_file_path: 组件 CSS 文件路径
+        agent_kwargs: 传给 Agent 构造函数的参数
+
+    Returns:
+        按级别排列的任务列表（空的级别被省略）
+    """
+    from utils.static_review import run_static_review
+
+    tiers = [[ReviewTask(
+        STATIC_REVIEW_KEY,
+        lambda: run_static_review(code, code_file_path, css_file_path),
+        label='static',
+    )]]
+    for keys in (CORE_REVIEWS, CONSISTENCY_REVIEWS):
+        tier = review_tasks({key: prompts[key] for key in keys if key in prompts}, agent_kwargs)
+        if tier:
+            tiers.append(tier)
+    return tiers
+
+
+class ReviewRunner:
+    """
+    并发执行审查任务（线程安全）
+
+    每个任务独立捕获异常，一个审查失败不影响其他审查；
+    LLM 调用仍受全局 rate_limiter 的并发和 RPM/TPM 限制
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None):
+        """
+        Args:
+            max_concurrency: 最大并发审查数（None 时使用 Config.REVIEW_CONCURRENCY，1 表示串行）
+        """
+        if max_concurrency is None:
+            from config import Config
+            max_concurrency = Config.REVIEW_CONCURRENCY
+        self.max_concurrency = max(1, max_concurrency)
+        self._lock = threading.Lock()
+        self._group_locks: Dict[str, threading.Lock] = {}
+        # 最近一轮每个审查的耗时（秒）和整轮墙钟时间
+        self.last_timings: Dict[str, float] = {}
+        self.last_wall_time = 0.0
+        # 最近一轮分级审查在哪一级停止（None 表示全部执行）
+        self.last_stopped_tier: Optional[int] = None
+        # 累计统计：key → {'runs', 'errors', 'skipped', 'total_seconds', 'max_seconds'}
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self.rounds = 0
+        self.total_wall_time = 0.0
+        self.total_review_time = 0.0
+
+    def _group_lock(self, group: str) -> threading.Lock:
+        with self._lock:
+            return self._group_locks.setdefault(group, threading.Lock())
+
+    def _execute(self, task: ReviewTask) -> tuple:
+        """执行单个任务，返回 (结果, 耗时, 是否出错)；耗时不含等待串行锁的时间"""
+        group_lock = self._group_lock(task.serial_group) if task.serial_group else None
+        if group_lock:
+            group_lock.acquire()
+        try:
+            logger.info(f"Running {task.label} review...")
+            start = time.perf_counter()
+            try:
+                result = _to_dict(task.run())
+                errored = False
+            except Exception as e:
+                logger.error(f"Error in {task.label} review: {e}")
+                result = failed_review(task.label, e)
+                errored = True
+            return result, time.perf_counter() - start, errored
+        finally:
+            if group_lock:
+                group_lock.release()
+
+    def run(self, tasks: List[ReviewTask]) -> Dict[str, Any]:
+        """
+        并发执行审查任务并汇总结果
+
+        Args:
+            tasks: 审查任务列表
+
+        Returns:
+            key → 审查结果，顺序与 tasks 一致；dict 结果中附带 elapsed_seconds
+        """
+        if not tasks:
+            return {}
+        start = time.perf_counter()
+        workers = min(self.max_concurrency, len(tasks))
+        if workers == 1:
+            outcomes = [self._execute(task) for task in tasks]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="review") as executor:
+                # executor.map 按输入顺序返回结果
+                outcomes = list(executor.map(self._execute, tasks))
+        wall_time = time.perf_counter() - start
+
+        results: Dict[str, Any] = {}
+        timings: Dict[str, float] = {}
+        for task, (result, elapsed, errored) in zip(tasks, outcomes):
+            if isinstance(result, dict):
+                result['elapsed_seconds'] = round(elapsed, 3)
+            results[task.key] = result
+            timings[task.key] = elapsed
+
+        with self._lock:
+            self.last_timings = timings
+            self.last_wall_time = wall_time
+            self.rounds += 1
+            self.total_wall_time += wall_time
+            self.total_review_time += sum(timings.values())
+            for task, (_, elapsed, errored) in zip(tasks, outcomes):
+                entry = self.stats.setdefault(
+                    task.key, self._empty_stats()
+                )
+                entry['runs'] += 1
+                entry['errors'] += int(errored)
+                entry['total_seconds'] += elapsed
+                entry['max_seconds'] = max(entry['max_seconds'], elapsed)
+
+        logger.info(
+            f"{len(tasks)} reviews finished in {wall_time:.2f}s "
+            f"(sequential would be {sum(timings.values()):.2f}s)"
+        )
+        return results
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, float]:
+        return {'runs': 0, 'errors': 0, 'skipped': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+
+    def run_tiered(self, tiers: List[List[ReviewTask]], gate: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        按级别执行审查：同一级别内并发，某一级有审查未通过时跳过之后的级别
+
+        Args:
+            tiers: 按级别排列的任务列表（通常来自 tiered_review_tasks）
+            gate: 是否启用分级跳过（None 时使用 Config.REVIEW_GATING；False 时所有级别一起并发执行）
+
+        Returns:
+            key → 审查结果；被跳过的审查结果为 skipped_review
+        """
+        if gate is None:
+            from config import Config
+            gate = Config.REVIEW_GATING
+        if not gate:
+            self.last_stopped_tier = None
+            return self.run([task for tier in tiers for task in tier])
+
+        results: Dict[str, Any] = {}
+        self.last_stopped_tier = None
+        for level, tier in enumerate(tiers):
+            tier_results = self.run(tier)
+            results.update(tier_results)
+            failed = [key for key, result in tier_results.items() if blocks_later_tiers(result)]
+            if failed and level + 1 < len(tiers):
+                self.last_stopped_tier = level
+                reason = f"Skipped: tier {level} review failed ({', '.join(failed)})"
+                skipped = [task.key for later in tiers[level + 1:] for task in later]
+                for key in skipped:
+                    results[key] = skipped_review(reason)
+                with self._lock:
+                    for key in skipped:
+                        self.stats.setdefault(key, self._empty_stats())['skipped'] += 1
+                logger.info(f"Review stopped at tier {level}, skipped {len(skipped)} reviews: {', '.join(skipped)}")
+                break
+        return results
+
+    def report(self) -> str:
+        """生成审查耗时报告"""
+        with self._lock:
+            stats = {key: dict(value) for key, value in self.stats.items()}
+            rounds = self.rounds
+            wall, total = self.total_wall_time, self.total_review_time
+        if not rounds:
+            return "Reviews: none run"
+        lines = [
+            f"Reviews: {rounds} rounds, wall {wall:.2f}s vs sequential {total:.2f}s "
+            f"(concurrency {self.max_concurrency})"
+        ]
+        for key, entry in sorted(stats.items(), key=lambda item: -item[1]['total_seconds']):
+            average = entry['total_seconds'] / entry['runs'] if entry['runs'] else 0.0
+            errors = f", {int(entry['errors'])} errors" if entry['errors'] else ''
+            skipped = f", {int(entry['skipped'])} skipped" if entry['skipped'] else ''
+            lines.append(
+                f"  {key}: {int(entry['runs'])} runs, avg {average:.2f}s, "
+                f"max {entry['max_seconds']:.2f}s{errors}{skipped}"
+            )
+        return "\n".join(lines)
+
+
+# 创建全局审查执行器
+review_runner = ReviewRunner()
@@ -0,0 +1,262 @@
+"""
+按 diff 划定重新审查的范围
+correct_code 通常只修改少量行，但每轮审查中所有审查 Agent 都会重新阅读并判断整个组件。
+这里记录上一轮审查时的代码和结果，下一轮：
+- 计算与上一轮代码的 unified diff
+- 变更没有触及某个审查关注范围（如只改了 className 时的 security 审查）且上一轮已通过时，沿用上一轮结论
+- 需要重新审查的 Agent 收到 diff 和自己上一轮的问题，diff 较小时 prompt 中的完整代码替换为 diff
+
+上一轮未通过的审查总是重新执行（需要确认问题是否已修复）；代码完全未改变时沿用所有结论，
+此时沿用的未通过结论与本轮的失败一样跳过之后级别的审查（见 review_runner.run_tiered）
+"""
+import difflib
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 任何代码变更都可能影响结果的审查
+ALWAYS_RERUN = ('static', 'build', 'build_execution')
+
+_STYLE_LINE = re.compile(r'className|style|styled|\bsx=|styles\.|\bcss\b|makeStyles|theme\.')
+# 不涉及组件逻辑的行：导入、注释、空行、仅样式属性
+_NON_LOGIC_LINE = re.compile(r'^(?:import\b|//|/\*|\*|$)|^(?:className|style|sx)=')
+
+# 审查键 → 关注范围的正则（变更行中任意一行匹配即需要重新审查）
+REVIEW_CONCERNS: Dict[str, re.Pattern] = {
+    'security': re.compile(
+        r'dangerouslySetInnerHTML|innerHTML|outerHTML|\beval\(|new Function|\bhref\b|\bsrc=|target=|rel=|'
+        r'window\.|document\.|localStorage|sessionStorage|cookie|fetch\(|axios|XMLHttpRequest|'
+        r'postMessage|encodeURI|decodeURI|\burl\b|URL', re.IGNORECASE
+    ),
+    'bdl': re.compile(r'^import\b|</?[A-Z]\w*|className|style|styled|\bsx='),
+    'bdl_component_usage': re.compile(r'^import\b|</?[A-Z]\w*'),
+    'css_import': re.compile(r'^import\b.*\.(?:css|scss|less)\b|className|styles\.'),
+    'component_reference': re.compile(r'^import\b|</?[A-Z]\w*|require\('),
+    'style_consistency': _STYLE_LINE,
+    'props_consistency': re.compile(
+        r'props|PropTypes|defaultProps|interface\b|^\w+\s*[?]?:|^\w+\s*=|^\(\s*\{|^\}\s*\)|^const\s+\w+\s*=\s*\('
+    ),
+}
+
+
+def _touches_logic(lines: List[str]) -> bool:
+    return any(not _NON_LOGIC_LINE.match(line) for line in lines)
+
+
+# 关注组件整体逻辑的审查：除导入、注释、纯样式属性之外的任何变更都需要重新审查
+LOGIC_REVIEWS = ('component_completeness', 'functionality_consistency')
+
+
+def code_diff(previous: str, current: str, file_name: str = 'code', context: int = 3) -> str:
+    """生成两版代码的 unified diff"""
+    return ''.join(difflib.unified_diff(
+        previous.splitlines(keepends=True),
+        current.splitlines(keepends=True),
+        fromfile=f"a/{file_name}",
+        tofile=f"b/{file_name}",
+        n=context,
+    ))
+
+
+def changed_lines(previous: str, current: str) -> List[str]:
+    """返回删除和新增的行（去除首尾空白）"""
+    lines = []
+    matcher = difflib.SequenceMatcher(None, previous.splitlines(), current.splitlines(), autojunk=False)
+    old_lines, new_lines = matcher.a, matcher.b
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        lines.extend(line.strip() for line in old_lines[i1:i2])
+        lines.extend(line.strip() for line in new_lines[j1:j2])
+    return lines
+
+
+def is_review_affected(key: str, lines: List[str]) -> bool:
+    """变更行是否触及某个审查的关注范围（未登记的审查视为受影响）"""
+    if key in ALWAYS_RERUN:
+        return True
+    if key in LOGIC_REVIEWS:
+        return _touches_logic(lines)
+    pattern = REVIEW_CONCERNS.get(key)
+    if pattern is None:
+        return True
+    return any(pattern.search(line) for line in lines)
+
+
+def _prior_findings(prior: Dict[str, Any], limit: int = 10) -> str:
+    issues = [str(issue) for issue in (prior.get('issues') or [])]
+    if not issues:
+        return "Your previous review of this code passed with no issues."
+    shown = "\n".join(f"- {issue}" for issue in issues[:limit])
+    more = f"\n- ... and {len(issues) - limit} more" if len(issues) > limit else ''
+    return f"Your previous review found these issues:\n{shown}{more}"
+
+
+def rereview_prompt(prompt: str, code: str, diff: str, prior: Optional[Dict[str, Any]],
+                    iteration: int, max_diff_ratio: float) -> str:
+    """
+    为重新审查构造 prompt：追加 diff 和上一轮的问题
+
+    diff 不超过代码长度的 max_diff_ratio 时，prompt 中内嵌的完整代码替换为说明
+    （审查 Agent 仍可用 read_code_file 工具读取完整文件）
+    """
+    if code and code in prompt and len(diff) <= len(code) * max_diff_ratio:
+        prompt = prompt.replace(
+            code,
+            "(Full code omitted: it is the previously reviewed code with the diff below applied. "
+            "Use the read_code_file tool if you need surrounding context.)",
+            1,
+        )
+    findings = _prior_findings(prior or {})
+    return (
+        f"{prompt}\n\n=== CHANGES SINCE PREVIOUS REVIEW (iteration {iteration}) ===\n"
+        f"```diff\n{diff}```\n\n{findings}\n"
+        "Verify whether each previous issue is resolved by these changes and whether the changes "
+        "introduce new problems. Report the complete current verdict, not just the changes."
+    )
+
+
+def gate_carried_failures(to_run: Dict[str, str], carried: Dict[str, Any]) -> List[str]:
+    """
+    沿用的核心审查结论未通过时，之后级别（一致性审查）不再执行，结果记为 skipped_review
+
+    run_tiered 只根据本轮执行的结果判断是否跳过，沿用的结论不在其中，需要在这里处理。
+    原地修改 to_run 和 carried，返回被跳过的审查键
+    """
+    from utils.review_runner import CONSISTENCY_REVIEWS, CORE_REVIEWS, blocks_later_tiers, skipped_review
+
+    failed = [key for key in CORE_REVIEWS if key in carried and blocks_later_tiers(carried[key])]
+    if not failed:
+        return []
+    reason = f"Skipped: tier 1 review failed ({', '.join(failed)}, carried forward)"
+    skipped = [key for key in CONSISTENCY_REVIEWS if key in to_run]
+    for key in skipped:
+        del to_run[key]
+        carried[key] = skipped_review(reason)
+    return skipped
+
+
+class ReviewScope:
+    """
+    记录每个代码文件上一轮的审查输入与结果，计算下一轮的审查范围（线程安全）
+
+    用法（review_code 节点中）：
+        prompts, carried = review_scope.plan(code_file_path, code, prompts)
+        review_results = review_runner.run_tiered(tiered_review_tasks(prompts, ...))
+        review_results.update(carried)
+        review_scope.remember(code_file_path, code, review_results)
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, max_diff_ratio: Optional[float] = None):
+        """
+        Args:
+            enabled: 是否启用（None 时使用 Config.INCREMENTAL_REVIEW）
+            max_diff_ratio: diff 长度不超过代码长度的该比例时以 diff 代替完整代码
+        """
+        from config import Config
+        self.enabled = Config.INCREMENTAL_REVIEW if enabled is None else enabled
+        self.max_diff_ratio = (
+            Config.INCREMENTAL_REVIEW_MAX_DIFF_RATIO if max_diff_ratio is None else max_diff_ratio
+        )
+        self._lock = threading.Lock()
+        # code_file_path → {'code', 'results', 'iteration'}
+        self._previous: Dict[str, Dict[str, Any]] = {}
+        self.stats = {'reviews_run': 0, 'reviews_carried': 0, 'diff_prompts': 0}
+
+    def reset(self, code_file_path: Optional[str] = None) -> None:
+        """清除记录（首轮审查前调用，避免沿用其他运行的结论）"""
+        with self._lock:
+            if code_file_path is None:
+                self._previous.clear()
+            else:
+                self._previous.pop(code_file_path, None)
+
+    def plan(self, code_file_path: str, code: str, prompts: Dict[str, str],
+             gate: Optional[bool] = None) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """
+        计算本轮审查范围
+
+        Args:
+            code_file_path: 代码文件路径
+            code: 本轮代码
+            prompts: 审查键 → 完整审查 prompt
+            gate: 沿用的未通过核心审查是否跳过一致性审查（None 时使用 Config.REVIEW_GATING）
+
+        Returns:
+            (需要执行的审查 prompt（可能已改写为 diff 形式）,
+             沿用的上一轮结果（含因沿用的失败而跳过的审查）)
+        """
+        with self._lock:
+            previous = self._previous.get(code_file_path)
+        if not self.enabled or not previous:
+            with self._lock:
+                self.stats['reviews_run'] += len(prompts)
+            return dict(prompts), {}
+
+        previous_results = previous['results']
+        iteration = previous['iteration'] + 1
+        lines = changed_lines(previous['code'], code)
+        diff = code_diff(previous['code'], code, code_file_path.rsplit('/', 1)[-1]) if lines else ''
+
+        to_run: Dict[str, str] = {}
+        carried: Dict[str, Any] = {}
+        for key, prompt in prompts.items():
+            prior = previous_results.get(key)
+            has_verdict = isinstance(prior, dict) and prior.get('passed') is not None
+            # 代码未变时沿用所有结论；否则只沿用关注范围未受影响且已通过的结论
+            if has_verdict and (not lines or (prior.get('passed') and not is_review_affected(key, lines))):
+                carried[key] = dict(prior, carried_forward=True)
+                continue
+            if has_verdict and lines:
+                to_run[key] = rereview_prompt(prompt, code, diff, prior, iteration, self.max_diff_ratio)
+            else:
+                to_run[key] = prompt
+
+        if gate is None:
+            from config import Config
+            gate = Config.REVIEW_GATING
+        skipped = gate_carried_failures(to_run, carried) if gate else []
+
+        with self._lock:
+            self.stats['reviews_run'] += len(to_run)
+            self.stats['reviews_carried'] += len(carried) - len(skipped)
+            self.stats['diff_prompts'] += sum(1 for key in to_run if to_run[key] is not prompts[key])
+        if carried:
+            logger.info(
+                f"Incremental review: {len(lines)} changed lines, carrying forward "
+                f"{', '.join(key for key in carried if key not in skipped)}; "
+                f"re-running {', '.join(to_run) or 'none'}"
+                + (f"; skipping {', '.join(skipped)} after carried-forward failures" if skipped else '')
+            )
+        return to_run, carried
+
+    def remember(self, code_file_path: str, code: str, results: Dict[str, Any]) -> None:
+        """记录本轮审查的代码和结果（沿用的结果应已合并到 results 中）"""
+        with self._lock:
+            previous = self._previous.get(code_file_path)
+            iteration = previous['iteration'] + 1 if previous else 0
+            self._previous[code_file_path] = {
+                'code': code,
+                'results': {key: dict(value) if isinstance(value, dict) else value
+                            for key, value in results.items()},
+                'iteration': iteration,
+            }
+
+    def report(self) -> str:
+        """生成增量审查统计"""
+        with self._lock:
+            stats = dict(self.stats)
+        total = stats['reviews_run'] + stats['reviews_carried']
+        if not total:
+            return "Incremental review: no reviews planned"
+        return (
+            f"Incremental review: {stats['reviews_run']} run ({stats['diff_prompts']} with diff prompts), "
+            f"{stats['reviews_carried']} carried forward ({stats['reviews_carried'] / total:.0%})"
+        )
+
+
+# 创建全局审查范围记录
+review_scope = ReviewScope()
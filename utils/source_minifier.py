@@ -0,0 +1,223 @@
+"""
+源码压缩工具
+在发送给 LLM 之前对 HTL、Dialog XML、CSS/LESS、JS 做保持语义的压缩：
+去掉缩进和空行、折叠属性间的多余空白、删除 .content.xml 中未使用的命名空间声明、
+省略 base64 data URI、删除已失效的厂商前缀声明
+
+压缩只删除整行（空行），不合并行，并记录每一行对应的原始行号，
+因此 LLM 输出中引用的行号可以通过 line_map 还原到原文件
+"""
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from utils.token_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 文件类型 → 压缩方式
+MINIFY_KINDS = {
+    'htl': 'markup',
+    'html': 'markup',
+    'dialog': 'xml',
+    'config': 'xml',
+    'xml': 'xml',
+    'css': 'css',
+    'less': 'css',
+    'scss': 'css',
+    'js': 'js',
+    'jsx': 'js',
+    'javascript': 'js',
+}
+
+# 文本中引用的行号（line 12、lines 3-5）
+_LINE_REFERENCE = re.compile(r'\b(lines?\s+)(\d+)(?:(\s*[-–]\s*|\s+to\s+)(\d+))?\b', re.IGNORECASE)
+
+# base64 data URI（短的保留，长的省略）
+_DATA_URI = re.compile(r'data:([\w.+/-]+)((?:;[\w.+-]+=[\w.+-]+)*);base64,[A-Za-z0-9+/=]{64,}')
+
+# 引号外的连续空白（引号内内容原样保留）
+_SPACES_OUTSIDE_QUOTES = re.compile(r'("[^"\n]*"|\'[^\'\n]*\')|[ \t]{2,}')
+
+# XML 命名空间声明
+_XMLNS_DECLARATION = re.compile(r'\s+xmlns:([\w.-]+)\s*=\s*("[^"]*"|\'[^\']*\')')
+
+# CSS 最内层规则块
+_CSS_BLOCK = re.compile(r'\{[^{}]*\}')
+
+# CSS 声明的属性名
+_CSS_PROPERTY = re.compile(r'(?:^|[;{\s])([a-z][\w-]*)\s*:', re.IGNORECASE)
+
+# CSS 厂商前缀声明
+_VENDOR_DECLARATION = re.compile(
+    r'(?<=[{;\s])-(?:webkit|moz|ms|o)-([\w-]+)\s*:[^;{}]*;?',
+    re.IGNORECASE
+)
+
+# 目标浏览器早已支持无前缀写法的属性，其厂商前缀版本可直接删除
+DEAD_VENDOR_PROPERTIES = {
+    'border-radius', 'box-shadow', 'box-sizing', 'background-clip',
+    'background-origin', 'background-size', 'opacity', 'text-shadow',
+    'transition', 'transition-property', 'transition-duration',
+    'transition-timing-function', 'transition-delay',
+}
+
+
+def _elide_data_uri(match: re.Match) -> str:
+    """将长 data URI 替换为占位说明"""
+    size = len(match.group()) - match.group().index(',') - 1
+    return f"data:{match.group(1)}{match.group(2)};base64,<elided {size} bytes>"
+
+
+def _collapse_spaces(match: re.Match) -> str:
+    """保留引号内内容，其余连续空白折叠为一个空格"""
+    return match.group(1) or ' '
+
+
+def _remove_unused_namespaces(content: str) -> str:
+    """删除未被任何元素或属性使用的 xmlns:prefix 声明（不改变行数）"""
+    declarations = _XMLNS_DECLARATION.findall(content)
+    if not declarations:
+        return content
+
+    body = _XMLNS_DECLARATION.sub('', content)
+    unused = {
+        prefix for prefix, _ in declarations
+        # 属性值中的前缀（如 jcr:primaryType="cq:Component"）同样算作使用
+        if not re.search(rf'(?<![\w.-]){re.escape(prefix)}:', body)
+    }
+    if not unused:
+        return content
+
+    def replace(match: re.Match) -> str:
+        if match.group(1) not in unused:
+            return match.group()
+        # 保留声明前的换行，保证行号不变
+        return '\n' * match.group().count('\n')
+
+    return _XMLNS_DECLARATION.sub(replace, content)
+
+
+def _remove_dead_vendor_prefixes(content: str) -> str:
+    """删除规则块中已有无前缀版本或已失效的厂商前缀声明（不改变行数）"""
+
+    def process_block(block_match: re.Match) -> str:
+        block = block_match.group()
+        properties = {name.lower() for name in _CSS_PROPERTY.findall(block)}
+
+        def replace(match: re.Match) -> str:
+            name = match.group(1).lower()
+            if name in properties or name in DEAD_VENDOR_PROPERTIES:
+                return '\n' * match.group().count('\n')
+            return match.group()
+
+        return _VENDOR_DECLARATION.sub(replace, block)
+
+    return _CSS_BLOCK.sub(process_block, content)
+
+
+def minify_source(content: str, file_type: Optional[str],
+                  file_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    压缩源码（保持语义，可还原行号）
+
+    Args:
+        content: 文件内容
+        file_type: 文件类型（htl, dialog, config, css, js 等）
+        file_path: 文件路径（仅用于日志）
+
+    Returns:
+        压缩结果字典：
+        - content: 压缩后的内容
+        - line_map: line_map[i] 为压缩后第 i+1 行对应的原始行号
+        - input_tokens / output_tokens: 压缩前后的 token 估算
+    """
+    kind = MINIFY_KINDS.get((file_type or '').lower())
+    input_tokens = estimate_tokens(content)
+
+    if not content or kind is None:
+        lines = content.split('\n') if content else []
+        return {
+            'content': content,
+            'line_map': list(range(1, len(lines) + 1)),
+            'input_tokens': input_tokens,
+            'output_tokens': input_tokens,
+        }
+
+    # 以下变换都不改变行数
+    text = _DATA_URI.sub(_elide_data_uri, content)
+    if kind == 'xml':
+        text = _remove_unused_namespaces(text)
+    elif kind == 'css':
+        text = _remove_dead_vendor_prefixes(text)
+
+    collapse = kind in ('markup', 'xml', 'css')
+    output_lines: List[str] = []
+    line_map: List[int] = []
+
+    for line_number, line in enumerate(text.split('\n'), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        if collapse and ('  ' in line or '\t' in line):
+            line = _SPACES_OUTSIDE_QUOTES.sub(_collapse_spaces, line)
+        output_lines.append(line)
+        line_map.append(line_number)
+
+    minified = '\n'.join(output_lines)
+    output_tokens = estimate_tokens(minified)
+
+    logger.info(
+        f"Minified {file_path or file_type}: {input_tokens} -> {output_tokens} tokens"
+    )
+
+    return {
+        'content': minified,
+        'line_map': line_map,
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+    }
+
+
+def map_line_number(line_map: List[int], minified_line: int) -> int:
+    """
+    将压缩后内容的行号还原为原文件行号
+
+    Args:
+        line_map: minify_source() 返回的 line_map
+        minified_line: 压缩后内容中的行号（从 1 开始）
+
+    Returns:
+        原文件行号（超出范围时返回最接近的行号）
+    """
+    if not line_map:
+        return minified_line
+    index = min(max(minified_line, 1), len(line_map)) - 1
+    return line_map[index]
+
+
+def remap_line_references(value: Any, line_map: Optional[List[int]]) -> Any:
+    """
+    将模型输出（字符串、列表或字典中的字符串）引用的压缩后行号还原为原文件行号
+
+    Args:
+        value: 模型输出
+        line_map: minify_source() 返回的 line_map（None 或空时原样返回）
+
+    Returns:
+        行号已还原的副本
+    """
+    if not line_map:
+        return value
+    if isinstance(value, str):
+        def replace(match: re.Match) -> str:
+            text = match.group(1) + str(map_line_number(line_map, int(match.group(2))))
+            if match.group(4):
+                text += match.group(3) + str(map_line_number(line_map, int(match.group(4))))
+            return text
+        return _LINE_REFERENCE.sub(replace, value)
+    if isinstance(value, dict):
+        return {key: remap_line_references(item, line_map) for key, item in value.items()}
+    if isinstance(value, list):
+        return [remap_line_references(item, line_map) for item in value]
+    return value
@@ -0,0 +1,432 @@
+"""
+低优先级文件的确定性分析器
+.content.xml、_cq_editConfig.xml、clientlib 的 css.txt/js.txt、CSS 和 .properties 文件
+结构完全可以机器解析，直接生成 FileAnalysisResult 格式的结果，不调用 LLM；
+HTL、复杂 JS 和 Java 仍由 AEMAnalysisAgent 分析
+"""
+import io
+import logging
+import os
+import re
+import xml.etree.ElementTree as ET
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.aem_utils import identify_aem_file_type
+
+logger = logging.getLogger(__name__)
+
+# JCR 类型前缀，如 {Boolean}true、{Long}10
+_JCR_TYPED_VALUE = re.compile(r'^\{(\w+)\}(.*)$', re.DOTALL)
+
+# .content.xml 根节点上对 React 转换有意义的属性
+_COMPONENT_PROPERTIES = (
+    'jcr:primaryType', 'jcr:title', 'jcr:description', 'componentGroup',
+    'sling:resourceSuperType', 'cq:isContainer', 'cq:icon', 'cq:noDecoration',
+    'cq:template', 'allowedPaths', 'allowedParents', 'allowedChildren',
+)
+_CLIENTLIB_PROPERTIES = (
+    'categories', 'dependencies', 'embed', 'allowProxy', 'cssProcessor', 'jsProcessor',
+)
+
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+_CSS_CLASS = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+_CSS_ID = re.compile(r'#(-?[_a-zA-Z][\w-]*)(?=[^{};]*\{)')
+_CSS_IMPORT = re.compile(r'@import\s+(?:url\()?\s*["\']?([^"\')\s;]+)', re.IGNORECASE)
+_CSS_URL = re.compile(r'url\(\s*["\']?([^"\')]+)["\']?\s*\)', re.IGNORECASE)
+_CSS_MEDIA = re.compile(r'@media\s+([^{]+)\{', re.IGNORECASE)
+_CSS_KEYFRAMES = re.compile(r'@(?:-\w+-)?keyframes\s+([\w-]+)', re.IGNORECASE)
+_CSS_CUSTOM_PROPERTY = re.compile(r'(?:^|[{;\s])(--[\w-]+)\s*:')
+_CSS_AT_RULE_PRELUDE = re.compile(r'@[^{;]*[{;]')
+_CSS_RULE = re.compile(r'[^{}@;]+\{')
+
+
+def _result(file_path: str, file_type: str, purpose: str, dependencies: List[str],
+            key_features: List[str], configuration: Dict[str, Any],
+            special_considerations: List[str], analysis: str) -> Dict[str, Any]:
+    """按 FileAnalysisResult 的字段组装结果"""
+    return {
+        'file_path': file_path,
+        'file_type': file_type,
+        'purpose': purpose,
+        'dependencies': dependencies,
+        'key_features': key_features,
+        'configuration': configuration,
+        'special_considerations': special_considerations,
+        'analysis': analysis,
+    }
+
+
+def parse_jcr_value(value: str) -> Any:
+    """
+    解析 JCR 属性值
+
+    "{Boolean}true" → True，"{Long}10" → 10，"[a,b]" → ['a', 'b']，其余保持字符串
+    """
+    value = value.strip()
+    typed = _JCR_TYPED_VALUE.match(value)
+    type_name = None
+    if typed:
+        type_name, value = typed.group(1).lower(), typed.group(2)
+
+    if value.startswith('[') and value.endswith(']'):
+        inner = value[1:-1].strip()
+        items = [item.strip() for item in inner.split(',')] if inner else []
+        return [_convert_jcr_scalar(item, type_name) for item in items]
+    return _convert_jcr_scalar(value, type_name)
+
+
+def _convert_jcr_scalar(value: str, type_name: Optional[str]) -> Any:
+    try:
+        if type_name == 'boolean':
+            return value.lower() == 'true'
+        if type_name == 'long':
+            return int(value)
+        if type_name in ('double', 'decimal'):
+            return float(value)
+    except ValueError:
+        pass
+    return value
+
+
+def parse_jcr_xml(content: str) -> Tuple[ET.Element, Dict[str, str]]:
+    """
+    解析 JCR XML（FileVault 格式）
+
+    Returns:
+        (根节点, {命名空间 URI: 前缀})
+
+    Raises:
+        ET.ParseError: XML 格式错误
+    """
+    namespaces = {}
+    root = None
+    for event, item in ET.iterparse(io.StringIO(content), events=('start-ns', 'start')):
+        if event == 'start-ns':
+            prefix, uri = item
+            namespaces.setdefault(uri, prefix)
+        elif root is None:
+            root = item
+    if root is None:
+        raise ET.ParseError('empty document')
+    return root, namespaces
+
+
+def _qualified_name(name: str, namespaces: Dict[str, str]) -> str:
+    """{uri}local → prefix:local"""
+    if name.startswith('{'):
+        uri, local = name[1:].split('}', 1)
+        prefix = namespaces.get(uri)
+        return f"{prefix}:{local}" if prefix else local
+    return name
+
+
+def _node_properties(element: ET.Element, namespaces: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        _qualified_name(name, namespaces): parse_jcr_value(value)
+        for name, value in element.attrib.items()
+    }
+
+
+def _as_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    return [str(value)]
+
+
+def analyze_content_xml(file_path: str, content: str) -> Optional[Dict[str, Any]]:
+    """分析组件或 clientlib 的 .content.xml"""
+    root, namespaces = parse_jcr_xml(content)
+    properties = _node_properties(root, namespaces)
+    primary_type = properties.get('jcr:primaryType', '')
+    file_type, _ = identify_aem_file_type(file_path)
+
+    if primary_type == 'cq:ClientLibraryFolder':
+        configuration = {name: properties[name] for name in _CLIENTLIB_PROPERTIES if name in properties}
+        categories = _as_list(properties.get('categories'))
+        dependencies = _as_list(properties.get('dependencies')) + _as_list(properties.get('embed'))
+        return _result(
+            file_path, file_type,
+            purpose=f"Client library folder definition (categories: {', '.join(categories) or 'none'})",
+            dependencies=dependencies,
+            key_features=[f"clientlib category: {category}" for category in categories],
+            configuration=configuration,
+            special_considerations=[
+                'Clientlib categories are loaded by AEM; in React import the CSS/JS modules directly',
+            ],
+            analysis=(
+                "AEM client library folder. Categories: "
+                f"{categories}. Dependencies: {_as_list(properties.get('dependencies'))}. "
+                f"Embedded: {_as_list(properties.get('embed'))}."
+            )
+        )
+
+    configuration = {name: properties[name] for name in _COMPONENT_PROPERTIES if name in properties}
+    # 组件定义上的其他自定义属性也保留
+    for name, value in properties.items():
+        if ':' not in name and name not in configuration:
+            configuration[name] = value
+
+    super_type = properties.get('sling:resourceSuperType')
+    title = properties.get('jcr:title', '')
+    child_nodes = [_qualified_name(child.tag, namespaces) for child in root]
+
+    key_features = []
+    if title:
+        key_features.append(f"component title: {title}")
+    if properties.get('componentGroup'):
+        key_features.append(f"component group: {properties['componentGroup']}")
+    if properties.get('cq:isContainer') in (True, 'true'):
+        key_features.append('container component (renders child components)')
+    if child_nodes:
+        key_features.append(f"child nodes: {', '.join(child_nodes)}")
+
+    special_considerations = []
+    if super_type:
+        special_considerations.append(
+            f"Inherits from {super_type}; the React component should extend or compose its base behaviour"
+        )
+    if properties.get('cq:isContainer') in (True, 'true'):
+        special_considerations.append('Container: accept children / child component list as props')
+
+    return _result(
+        file_path, file_type,
+        purpose=f"Component definition ({primary_type or 'unknown type'}){': ' + title if title else ''}",
+        dependencies=[super_type] if super_type else [],
+        key_features=key_features,
+        configuration=configuration,
+        special_considerations=special_considerations,
+        analysis=(
+            f"AEM node definition of type {primary_type or 'unknown'}. "
+            f"Title: {title or 'n/a'}. Super type: {super_type or 'none'}. "
+            f"Group: {properties.get('componentGroup', 'n/a')}."
+        )
+    )
+
+
+def analyze_edit_config(file_path: str, content: str) -> Optional[Dict[str, Any]]:
+    """分析 _cq_editConfig.xml（编辑行为配置）"""
+    root, namespaces = parse_jcr_xml(content)
+    properties = _node_properties(root, namespaces)
+    file_type, _ = identify_aem_file_type(file_path)
+
+    configuration: Dict[str, Any] = {
+        name: value for name, value in properties.items()
+        if name in ('cq:actions', 'cq:dialogMode', 'cq:layout', 'cq:emptyText', 'cq:inherit')
+    }
+    key_features = []
+    dependencies = []
+
+    for child in root:
+        child_name = _qualified_name(child.tag, namespaces)
+        child_properties = _node_properties(child, namespaces)
+        child_properties.pop('jcr:primaryType', None)
+
+        if child_name == 'cq:listeners':
+            configuration['listeners'] = child_properties
+            key_features.extend(f"{event} → {action}" for event, action in child_properties.items())
+        elif child_name == 'cq:dropTargets':
+            targets = {}
+            for target in child:
+                target_properties = _node_properties(target, namespaces)
+                target_properties.pop('jcr:primaryType', None)
+                targets[_qualified_name(target.tag, namespaces)] = target_properties
+                dependencies.extend(_as_list(target_properties.get('groups')))
+            configuration['dropTargets'] = targets
+            key_features.append(f"drop targets: {', '.join(targets) or 'none'}")
+        elif child_name == 'cq:inplaceEditing':
+            configuration['inplaceEditing'] = child_properties
+            key_features.append(f"in-place editing ({child_properties.get('editorType', 'default')})")
+        else:
+            configuration[child_name] = child_properties
+
+    if configuration.get('cq:actions'):
+        key_features.append(f"author actions: {', '.join(_as_list(configuration['cq:actions']))}")
+
+    return _result(
+        file_path, file_type,
+        purpose='Authoring edit configuration (author-mode behaviour only)',
+        dependencies=dependencies,
+        key_features=key_features,
+        configuration=configuration,
+        special_considerations=[
+            'Edit config only affects the AEM author UI; it has no runtime rendering behaviour in React',
+        ],
+        analysis=f"AEM cq:EditConfig. Settings: {configuration}."
+    )
+
+
+def analyze_clientlib_manifest(file_path: str, content: str) -> Optional[Dict[str, Any]]:
+    """分析 clientlib 的 css.txt / js.txt 清单"""
+    file_type, _ = identify_aem_file_type(file_path)
+    kind = 'CSS' if os.path.basename(file_path).lower() == 'css.txt' else 'JavaScript'
+
+    base = ''
+    files = []
+    for raw_line in content.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        if line.startswith('#'):
+            directive = line[1:].strip()
+            if directive.lower().startswith('base='):
+                base = directive.split('=', 1)[1].strip()
+            continue
+        files.append(f"{base}/{line}" if base else line)
+
+    return _result(
+        file_path, file_type,
+        purpose=f"Client library {kind} manifest ({len(files)} files)",
+        dependencies=files,
+        key_features=[f"{kind} load order: {' → '.join(files)}"] if files else [],
+        configuration={'base': base, 'files': files},
+        special_considerations=[
+            f"Files are concatenated in this order by AEM; import the {kind} modules in the same order",
+        ],
+        analysis=f"Clientlib {kind} manifest with base '{base or '.'}' listing: {files}."
+    )
+
+
+def analyze_css(file_path: str, content: str) -> Optional[Dict[str, Any]]:
+    """分析 CSS 样式文件"""
+    file_type, _ = identify_aem_file_type(file_path)
+    css = _CSS_COMMENT.sub('', content)
+
+    # 去掉 @media/@import 等 at-rule 的前导部分后剩下的 "xxx {" 即普通规则的选择器
+    rules = _CSS_RULE.findall(_CSS_AT_RULE_PRELUDE.sub(' ', css))
+    selectors_text = ''.join(rules)
+    classes = sorted(set(_CSS_CLASS.findall(selectors_text)))
+    ids = sorted(set(_CSS_ID.findall(selectors_text)))
+    imports = _CSS_IMPORT.findall(css)
+    urls = sorted(set(
+        url for url in _CSS_URL.findall(css)
+        if not url.startswith('data:') and url not in imports
+    ))
+    media_queries = sorted(set(query.strip() for query in _CSS_MEDIA.findall(css)))
+    keyframes = sorted(set(_CSS_KEYFRAMES.findall(css)))
+    custom_properties = sorted(set(_CSS_CUSTOM_PROPERTY.findall(css)))
+    rule_count = len(rules)
+
+    key_features = [f"{rule_count} rules, {len(classes)} classes"]
+    if media_queries:
+        key_features.append(f"responsive breakpoints: {'; '.join(media_queries)}")
+    if keyframes:
+        key_features.append(f"animations: {', '.join(keyframes)}")
+    if custom_properties:
+        key_features.append(f"CSS custom properties: {', '.join(custom_properties[:20])}")
+
+    special_considerations = []
+    if ids:
+        special_considerations.append('ID selectors are used; prefer class selectors or CSS modules in React')
+    if urls:
+        special_considerations.append('Referenced assets must be imported or moved to the React public folder')
+
+    return _result(
+        file_path, file_type,
+        purpose=f"Component stylesheet ({rule_count} rules)",
+        dependencies=imports + urls,
+        key_features=key_features,
+        configuration={
+            'classes': classes,
+            'ids': ids,
+            'media_queries': media_queries,
+            'keyframes': keyframes,
+            'custom_properties': custom_properties,
+        },
+        special_considerations=special_considerations,
+        analysis=(
+            f"CSS with {rule_count} rules. Classes: {classes[:50]}. "
+            f"Imports: {imports}. Media queries: {media_queries}."
+        )
+    )
+
+
+def parse_properties(content: str) -> Dict[str, str]:
+    """解析 Java .properties 内容（支持 = / : / 空白分隔、续行和 # ! 注释）"""
+    entries = {}
+    logical_line = ''
+    for raw_line in content.splitlines():
+        line = raw_line.lstrip()
+        if not logical_line and (not line or line[0] in '#!'):
+            continue
+        # 行尾奇数个反斜杠表示续行
+        trailing = len(line) - len(line.rstrip('\\'))
+        if trailing % 2 == 1:
+            logical_line += line[:-1]
+            continue
+        logical_line += line
+
+        match = re.match(r'((?:\\.|[^=:\s])+)\s*[=:\s]\s*(.*)$', logical_line)
+        if match:
+            entries[match.group(1).replace('\\', '')] = match.group(2)
+        elif logical_line:
+            entries[logical_line.replace('\\', '')] = ''
+        logical_line = ''
+    return entries
+
+
+def analyze_properties(file_path: str, content: str) -> Optional[Dict[str, Any]]:
+    """分析 .properties 文件（i18n 字典或 OSGi 配置）"""
+    file_type, _ = identify_aem_file_type(file_path)
+    entries = parse_properties(content)
+
+    name = os.path.basename(file_path)
+    is_i18n = 'i18n' in file_path.lower() or bool(re.search(r'_[a-z]{2}(?:_[A-Z]{2})?\.properties$', name))
+
+    return _result(
+        file_path, file_type,
+        purpose=f"{'i18n dictionary' if is_i18n else 'Properties configuration'} ({len(entries)} keys)",
+        dependencies=[],
+        key_features=[f"keys: {', '.join(list(entries)[:30])}"] if entries else [],
+        configuration=entries,
+        special_considerations=[
+            'Move these strings into the React i18n resources (e.g. react-i18next JSON)'
+            if is_i18n else 'Expose these values as React props or configuration constants',
+        ],
+        analysis=f"Properties file with {len(entries)} entries."
+    )
+
+
+def _select_analyzer(file_path: str) -> Optional[Callable[[str, str], Optional[Dict[str, Any]]]]:
+    file_name = os.path.basename(file_path).lower()
+    file_type, _ = identify_aem_file_type(file_path)
+
+    if file_name == '_cq_editconfig.xml':
+        return analyze_edit_config
+    if file_name == '.content.xml' and file_type == 'config':
+        # dialog 目录下的 .content.xml 仍由 LLM 分析
+        return analyze_content_xml
+    if file_name in ('css.txt', 'js.txt'):
+        return analyze_clientlib_manifest
+    if file_type == 'css':
+        return analyze_css
+    if file_type == 'properties':
+        return analyze_properties
+    return None
+
+
+def has_static_analyzer(file_path: str) -> bool:
+    """该文件是否可以不经 LLM 直接分析"""
+    return _select_analyzer(file_path) is not None
+
+
+def analyze_statically(file_path: str, content: str) -> Optional[Dict[str, Any]]:
+    """
+    用规则分析文件
+
+    Args:
+        file_path: 文件路径
+        content: 文件内容
+
+    Returns:
+        FileAnalysisResult 格式的字典；文件类型不支持或解析失败时返回 None（由 LLM 分析）
+    """
+    analyzer = _select_analyzer(file_path)
+    if analyzer is None:
+        return None
+    try:
+        return analyzer(file_path, content)
+    except (ET.ParseError, ValueError) as e:
+        logger.warning(f"Static analysis failed for {file_path}, falling back to LLM: {e}")
+        return None
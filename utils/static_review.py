@@ -0,0 +1,289 @@
+"""
+生成代码的确定性静态检查（审查第 0 级）
+毫秒级完成，不调用 LLM：括号配对、.jsx 中的 TypeScript 语法、
+无法解析的相对/绝对导入、缺失的 CSS 导入和默认导出。
+这些问题在测试报告中经常同时导致 build_execution、css_import、
+component_reference 等多个 LLM 审查失败，先用规则拦截可以省掉这些调用
+"""
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_IMPORT_PATTERN = re.compile(
+    r'^\s*(?:import\s+(?:[\w*{}\s,]+?\s+from\s+)?|export\s+[\w*{}\s,]+?\s+from\s+)[\'"]([^\'"]+)[\'"]',
+    re.MULTILINE,
+)
+_REQUIRE_PATTERN = re.compile(r'\brequire\(\s*[\'"]([^\'"]+)[\'"]\s*\)')
+_TYPESCRIPT_PATTERNS = (
+    (re.compile(r'^\s*(?:export\s+)?interface\s+\w+', re.MULTILINE), 'interface declaration'),
+    (re.compile(r'^\s*(?:export\s+)?type\s+\w+\s*(?:<[^>]*>)?\s*=', re.MULTILINE), 'type alias'),
+    (re.compile(r':\s*React\.(?:FC|FunctionComponent)\b'), 'React.FC annotation'),
+)
+_DEFAULT_EXPORT = re.compile(r'\bexport\s+default\b|\bmodule\.exports\s*=')
+_RESOLVE_SUFFIXES = (
+    '', '.js', '.jsx', '.ts', '.tsx', '.css', '.scss',
+    '/index.js', '/index.jsx', '/index.ts', '/index.tsx',
+)
+_BRACKETS = {')': '(', ']': '[', '}': '{'}
+
+
+def _issue_result(errors: List[str], warnings: List[str]) -> Dict[str, Any]:
+    return {
+        'passed': not errors,
+        'issues': errors,
+        'warnings': warnings,
+        'severity': 'high' if errors else ('low' if warnings else 'none'),
+    }
+
+
+# 之后的 '/' 开始正则字面量、'<' 开始 JSX 元素的字符和关键字（其余位置为除号/小于号）
+_REGEX_PRECEDERS = frozenset('(,=:[!&|?{};~+-*%<>^')
+_JSX_PRECEDERS = frozenset('(,=:?&|{[;>')
+_EXPRESSION_KEYWORDS = frozenset((
+    'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'yield', 'await', 'void', 'delete', 'throw', 'new',
+))
+
+
+def _starts_expression(code: str, index: int, preceders: frozenset) -> bool:
+    """index 处是否为表达式的开始（根据之前最后一个非空白字符或关键字判断）"""
+    position = index - 1
+    while position >= 0 and code[position] in ' \t\r\n':
+        position -= 1
+    if position < 0:
+        return True
+    char = code[position]
+    if char.isalnum() or char in '_$':
+        start = position
+        while start > 0 and (code[start - 1].isalnum() or code[start - 1] in '_$'):
+            start -= 1
+        return code[start:position + 1] in _EXPRESSION_KEYWORDS
+    return char in preceders
+
+
+def _regex_literal_end(code: str, index: int) -> int:
+    """index 处的 '/' 开始的正则字面量的结束位置（含标志），同一行内没有结束的 '/' 时返回 -1"""
+    position = index + 1
+    in_class = False
+    while position < len(code):
+        char = code[position]
+        if char == '\\':
+            position += 2
+            continue
+        if char == '\n':
+            return -1
+        if in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+        elif char == '/':
+            position += 1
+            while position < len(code) and code[position].isalpha():
+                position += 1
+            return position
+        position += 1
+    return -1
+
+
+def check_brackets(code: str) -> Optional[str]:
+    """
+    检查括号配对（跳过字符串、模板字符串、注释、正则字面量和 JSX 文本）
+
+    JSX 元素内的文本（如 <li>1) First step</li>、<p>Thanks :)</p>）不是代码，
+    只检查其中 {...} 表达式的括号；元素本身未闭合不在这里报告
+
+    Returns:
+        第一个问题的描述，配对正确时返回 None
+    """
+    # 栈元素：(开括号或 '<' 表示 JSX 元素, 行号, 闭合后恢复的模式)
+    stack: List[tuple] = []
+    mode = 'code'  # code / tag（JSX 标签内）/ text（JSX 子元素文本）
+    closing_tag = False
+    index = 0
+    length = len(code)
+    line = 1
+    while index < length:
+        char = code[index]
+        if char == '\n':
+            line += 1
+        elif mode == 'text':
+            if char == '{':
+                stack.append((char, line, 'text'))
+                mode = 'code'
+            elif char == '<':
+                mode = 'tag'
+                closing_tag = code.startswith('</', index)
+                index += closing_tag
+        elif mode == 'tag':
+            if char in '"\'':
+                end = code.find(char, index + 1)
+                end = length if end < 0 else end
+                line += code.count('\n', index, end)
+                index = end + 1
+                continue
+            if char == '{':
+                stack.append((char, line, 'tag'))
+                mode = 'code'
+            elif char == '>' or code.startswith('/>', index):
+                if closing_tag and stack and stack[-1][0] == '<':
+                    stack.pop()
+                elif char == '>' and not closing_tag:
+                    stack.append(('<', line, None))
+                index += 1 if char == '>' else 2
+                # 元素结束后回到父元素的文本或外层代码
+                mode = 'text' if stack and stack[-1][0] == '<' else 'code'
+                continue
+        elif code.startswith('//', index):
+            newline = code.find('\n', index)
+            index = length if newline < 0 else newline
+            continue
+        elif code.startswith('/*', index):
+            close = code.find('*/', index + 2)
+            end = length if close < 0 else close + 2
+            line += code.count('\n', index, end)
+            index = end
+            continue
+        elif char in '"\'`':
+            # 撇号（如 Don't）不是字符串起点
+            if char == "'" and index > 0 and code[index - 1].isalnum():
+                index += 1
+                continue
+            end = index + 1
+            while end < length and code[end] != char:
+                if code[end] == '\\':
+                    end += 1
+                elif code[end] == '\n' and char != '`':
+                    break  # 普通字符串不跨行，避免误判吞掉后续代码
+                end += 1
+            line += code.count('\n', index, min(end, length))
+            index = end + 1
+            continue
+        elif char == '/' and _starts_expression(code, index, _REGEX_PRECEDERS):
+            end = _regex_literal_end(code, index)
+            if end > 0:
+                index = end
+                continue
+        elif (char == '<' and index + 1 < length and (code[index + 1].isalpha() or code[index + 1] == '>')
+              and _starts_expression(code, index, _JSX_PRECEDERS)):
+            mode = 'tag'
+            closing_tag = False
+        elif char in '([{':
+            stack.append((char, line, 'code'))
+        elif char in ')]}':
+            if not stack or stack[-1][0] != _BRACKETS[char]:
+                return f"Unexpected '{char}' at line {line}"
+            mode = stack.pop()[2]
+        index += 1
+    unclosed = [entry for entry in stack if entry[0] != '<']
+    if unclosed:
+        opener, opened_at, _ = unclosed[-1]
+        return f"Unclosed '{opener}' opened at line {opened_at}"
+    return None
+
+
+def check_syntax(code: str, code_file_path: str = '') -> Dict[str, Any]:
+    """括号配对、.js/.jsx 文件中的 TypeScript 语法、默认导出"""
+    errors: List[str] = []
+    warnings: List[str] = []
+
+    bracket_problem = check_brackets(code)
+    if bracket_problem:
+        errors.append(f"Syntax: {bracket_problem}")
+
+    if Path(code_file_path).suffix.lower() in ('.js', '.jsx'):
+        for pattern, name in _TYPESCRIPT_PATTERNS:
+            match = pattern.search(code)
+            if match:
+                line = code.count('\n', 0, match.start()) + 1
+                errors.append(
+                    f"TypeScript {name} at line {line} in a {Path(code_file_path).suffix} file "
+                    f"(use PropTypes/JSDoc or rename to .tsx)"
+                )
+
+    if not _DEFAULT_EXPORT.search(code):
+        warnings.append("No default export found")
+
+    return _issue_result(errors, warnings)
+
+
+def extract_imports(code: str) -> List[str]:
+    """返回代码中所有 import/export from/require 的模块路径（按出现顺序去重）"""
+    specifiers = _IMPORT_PATTERN.findall(code) + _REQUIRE_PATTERN.findall(code)
+    return list(dict.fromkeys(specifiers))
+
+
+def resolve_import(specifier: str, code_file_path: str) -> Optional[str]:
+    """
+    解析相对路径或绝对路径导入，返回存在的文件路径
+
+    包名导入（react、@mui/material 等）不在这里检查，返回 None
+    """
+    if specifier.startswith('.'):
+        base = os.path.join(os.path.dirname(os.path.abspath(code_file_path)), specifier)
+    elif os.path.isabs(specifier):
+        base = specifier
+    else:
+        return None
+    for suffix in _RESOLVE_SUFFIXES:
+        candidate = base + suffix
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def check_imports(code: str, code_file_path: str, css_file_path: str = '') -> Dict[str, Any]:
+    """
+    检查本地导入是否存在、是否使用了机器相关的绝对路径，以及组件 CSS 是否被导入
+    """
+    errors: List[str] = []
+    warnings: List[str] = []
+    imports = extract_imports(code)
+
+    for specifier in imports:
+        if not (specifier.startswith('.') or os.path.isabs(specifier)):
+            continue
+        resolved = resolve_import(specifier, code_file_path) if code_file_path else None
+        if os.path.isabs(specifier):
+            message = f"Import uses an absolute filesystem path: '{specifier}'"
+            # 存在的绝对路径仍不可移植，但能构建；不存在时一定构建失败
+            (warnings if resolved else errors).append(message)
+        elif code_file_path and not resolved:
+            errors.append(f"Cannot resolve import '{specifier}'")
+
+    if css_file_path and os.path.isfile(css_file_path):
+        css_name = os.path.basename(css_file_path)
+        if not any(os.path.basename(specifier) == css_name for specifier in imports):
+            errors.append(f"CSS file {css_name} is not imported")
+
+    return _issue_result(errors, warnings)
+
+
+def run_static_review(code: str, code_file_path: str = '', css_file_path: str = '') -> Dict[str, Any]:
+    """
+    执行全部静态检查，结果结构与 LLM 审查一致（passed/issues/severity）
+
+    Args:
+        code: 生成的代码
+        code_file_path: 代码文件路径（用于解析相对导入和判断文件类型）
+        css_file_path: 组件 CSS 文件路径
+
+    Returns:
+        审查结果，另含 warnings（不影响 passed）、checks（各项检查是否通过）
+        和 blocking（未通过时是否应跳过之后的审查级别）
+    """
+    checks = {
+        'syntax': check_syntax(code, code_file_path),
+        'imports': check_imports(code, code_file_path, css_file_path),
+    }
+    errors = [issue for result in checks.values() for issue in result['issues']]
+    warnings = [warning for result in checks.values() for warning in result['warnings']]
+    result = _issue_result(errors, warnings)
+    result['checks'] = {name: check['passed'] for name, check in checks.items()}
+    # 括号配对检查是启发式的，只有括号问题时不跳过之后的 LLM 审查（见 review_runner.run_tiered）
+    result['blocking'] = any(not issue.startswith('Syntax: ') for issue in errors)
+    if errors:
+        logger.info(f"Static review found {len(errors)} issues")
+    return result
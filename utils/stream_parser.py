@@ -0,0 +1,450 @@
+"""
+流式 LLM 输出的增量解析
+在 token 到达时跟踪 markdown 代码块（```）和 JSON 嵌套：
+- 代码块闭合后立即回调（可直接写入磁盘），不必等待整个回复结束
+- 输出明显格式错误（括号不匹配、JSON 无法解析、内容退化为重复行）或偏离 schema 时
+  抛出 StreamAborted，调用方停止迭代即可中止生成，节省剩余 token
+- JSON 只从确认为值开始的 '{' / '[' 开始跟踪，JSON 之前或周围说明文字中的括号不会导致中止
+"""
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# 代码块起止行（允许缩进，起始行可带语言标记）
+_FENCE = re.compile(r'^\s*```\s*([\w+#.-]*)\s*$')
+
+# 默认限制
+MAX_OUTPUT_CHARS = 200_000        # 输出总长度上限
+MAX_PREAMBLE_CHARS = 4_000        # JSON 模式下第一个 '{' 之前允许的说明文字长度
+MAX_REPEATED_LINES = 30           # 同一非空行连续重复的次数上限（模型陷入循环）
+MIN_KEYS_FOR_SCHEMA_CHECK = 3     # 顶层出现多少个键后仍没有任何 schema 字段时判定偏离 schema
+
+_CLOSERS = {'}': '{', ']': '['}
+# '{' / '[' 之后（跳过空白）的第一个字符属于这些字符时才视为 JSON 值的开始，
+# 否则是说明文字中的括号（如 "see [1)"、"{name}"）
+_VALUE_STARTS = {'{': '"\'}', '[': '"\'{[]-0123456789tfn'}
+# JSON 值中字符串之外可能出现的字符（含可修复的 True/False/None 和单引号）
+_VALUE_CHARS = frozenset(' \t\r\n{}[]:,"\'-+.0123456789truefalsnTFNoE')
+
+
+class StreamAborted(Exception):
+    """流式输出被判定为无效，应中止生成"""
+
+    def __init__(self, reason: str, text: str = ''):
+        super().__init__(reason)
+        self.reason = reason
+        self.text = text
+
+
+def schema_fields(schema: Any) -> Optional[Dict[str, Any]]:
+    """
+    从 Pydantic 模型提取字段信息
+
+    Returns:
+        {'fields': 字段名集合, 'required': 必需字段集合, 'forbid_extra': 是否禁止额外字段}；
+        schema 为 None 时返回 None
+    """
+    if schema is None:
+        return None
+    model_fields = getattr(schema, 'model_fields', None) or {}
+    required = {
+        name for name, field in model_fields.items()
+        if getattr(field, 'is_required', lambda: False)()
+    }
+    config = getattr(schema, 'model_config', None) or {}
+    return {
+        'fields': set(model_fields),
+        'required': required,
+        'forbid_extra': config.get('extra') == 'forbid',
+    }
+
+
+class StreamingOutputParser:
+    """
+    流式输出解析器
+
+    用法：
+        parser = StreamingOutputParser(mode='code', on_code_block=writer)
+        for chunk in model.stream(messages):
+            parser.feed(chunk.content)   # 可能抛出 StreamAborted
+        parser.close()
+
+    mode：
+        - 'code'：只跟踪代码块（JSX/TSX 中的花括号不参与 JSON 跟踪）
+        - 'json'：跟踪代码块外以及 ```json 代码块中的 JSON，按 schema 校验
+    """
+
+    def __init__(
+        self,
+        mode: str = 'json',
+        schema: Any = None,
+        on_code_block: Optional[Callable[[str, str, int], None]] = None,
+        on_json: Optional[Callable[[Any], None]] = None,
+        max_output_chars: int = MAX_OUTPUT_CHARS,
+        max_preamble_chars: int = MAX_PREAMBLE_CHARS,
+        max_repeated_lines: int = MAX_REPEATED_LINES
+    ):
+        """
+        Args:
+            mode: 'code' 或 'json'
+            schema: 期望的输出 schema（Pydantic 模型类，仅 json 模式使用）
+            on_code_block: 代码块闭合时的回调 (language, code, index)
+            on_json: 顶层 JSON 值解析完成时的回调
+            max_output_chars: 输出总长度上限
+            max_preamble_chars: json 模式下第一个 JSON 值之前允许的文字长度
+            max_repeated_lines: 同一非空行连续重复的次数上限
+        """
+        self.mode = mode
+        self.schema_info = schema_fields(schema) if mode == 'json' else None
+        self.on_code_block = on_code_block
+        self.on_json = on_json
+        self.max_output_chars = max_output_chars
+        self.max_preamble_chars = max_preamble_chars
+        self.max_repeated_lines = max_repeated_lines
+
+        self.text_parts: List[str] = []
+        self.length = 0
+        self.code_blocks: List[Dict[str, str]] = []
+        self.json_values: List[Any] = []
+
+        # 行缓冲与代码块状态：未结束的行按块保存，换行时才拼接，
+        # 单行的长输出（常见的单行 JSON）不会在每块到达时重新拼接和切分整行
+        self._line_parts: List[str] = []
+        self._line_head = ''  # 当前行第一个非空白字符
+        self._unscanned: List[str] = []  # 当前行中尚未参与 JSON 跟踪的部分
+        self._line_scanned = 0
+        self._fence_language: Optional[str] = None
+        self._fence_lines: List[str] = []
+        self._last_line: Optional[str] = None
+        self._repeat_count = 0
+
+        # JSON 扫描状态（仅代码块外和 json 代码块内）
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._json_chars: List[str] = []
+        self._string_chars: List[str] = []
+        self._expect_key = False
+        self._top_level_keys: Set[str] = set()
+        self._seen_json = False
+        # 顶层的 '{' / '['：等待下一个非空白字符确认是否为 JSON 值
+        self._pending_open: Optional[str] = None
+        self._pending_chars: List[str] = []
+        self._at_line_start = True
+        self._value_at_line_start = False
+
+    @property
+    def text(self) -> str:
+        """目前收到的完整文本"""
+        return ''.join(self.text_parts)
+
+    def _abort(self, reason: str) -> None:
+        logger.warning(f"Aborting streamed generation after {self.length} chars: {reason}")
+        raise StreamAborted(reason, self.text)
+
+    def feed(self, chunk: Any) -> None:
+        """
+        处理一段新到达的输出
+
+        Args:
+            chunk: 字符串，或带 content 属性的消息块
+
+        Raises:
+            StreamAborted: 输出被判定为无效
+        """
+        if not isinstance(chunk, str):
+            chunk = getattr(chunk, 'content', '') or ''
+            if not isinstance(chunk, str):
+                chunk = str(chunk)
+        if not chunk:
+            return
+
+        self.text_parts.append(chunk)
+        self.length += len(chunk)
+        if self.length > self.max_output_chars:
+            self._abort(f"output exceeds {self.max_output_chars} chars")
+
+        # 只切分新到的块，前一块未结束的行与第一段拼接
+        first, *rest = chunk.split('\n')
+        self._append_partial(first)
+        for piece in rest:
+            line = ''.join(self._line_parts)
+            self._line_parts, self._line_head, self._unscanned = [], '', []
+            self._process_line(line, complete=True)
+            self._line_scanned = 0
+            self._append_partial(piece)
+        self._scan_partial_line()
+
+        if (self.mode == 'json' and not self._seen_json and not self._stack and not self._pending_open
+                and self.length > self.max_preamble_chars):
+            self._abort(f"no JSON value in the first {self.max_preamble_chars} chars")
+
+    def close(self) -> None:
+        """输出结束：处理最后一行，并刷新未闭合的代码块"""
+        if self._line_parts:
+            line = ''.join(self._line_parts)
+            self._line_parts, self._line_head, self._unscanned = [], '', []
+            if line:
+                self._process_line(line, complete=False)
+            self._line_scanned = 0
+        if self._fence_language is not None and self._fence_lines:
+            # 回复在代码块中途结束（常见于达到 max_tokens），仍交出已有内容
+            self._emit_code_block()
+
+    def _json_active(self) -> bool:
+        """当前位置的文本是否参与 JSON 跟踪"""
+        if self.mode != 'json':
+            return False
+        return self._fence_language is None or self._fence_language == 'json'
+
+    def _scan_partial_line(self) -> None:
+        """
+        未结束的行也立即参与 JSON 跟踪，以便尽早发现格式错误或偏离 schema
+
+        可能是代码块起止行（以 ` 开头）的行等到换行后再处理。
+        """
+        if not self._json_active() or not self._unscanned:
+            return
+        if self._line_head in ('`', ''):
+            return
+        text = ''.join(self._unscanned)
+        self._unscanned = []
+        self._scan_json(text)
+        self._line_scanned += len(text)
+
+    def _append_partial(self, text: str) -> None:
+        """追加当前行未结束的部分"""
+        if not text:
+            return
+        self._line_parts.append(text)
+        self._unscanned.append(text)
+        if not self._line_head:
+            stripped = text.lstrip()
+            self._line_head = stripped[:1]
+
+    def _process_line(self, line: str, complete: bool) -> None:
+        stripped = line.strip()
+        if stripped:
+            if stripped == self._last_line:
+                self._repeat_count += 1
+                if self._repeat_count >= self.max_repeated_lines:
+                    self._abort(f"line repeated {self._repeat_count} times: {stripped[:60]!r}")
+            else:
+                self._last_line = stripped
+                self._repeat_count = 1
+
+        fence = _FENCE.match(line)
+        if self._fence_language is None:
+            if fence and complete and not self._stack:
+                self._fence_language = fence.group(1).lower()
+                self._fence_lines = []
+                return
+            if self.mode == 'json':
+                self._scan_json(line[self._line_scanned:] + ('\n' if complete else ''))
+            return
+
+        if fence and not fence.group(1):
+            self._emit_code_block()
+            return
+
+        self._fence_lines.append(line)
+        if self.mode == 'json' and self._fence_language == 'json':
+            self._scan_json(line[self._line_scanned:] + '\n')
+
+    def _emit_code_block(self) -> None:
+        language = self._fence_language or ''
+        code = '\n'.join(self._fence_lines)
+        self._fence_language = None
+        self._fence_lines = []
+
+        index = len(self.code_blocks)
+        self.code_blocks.append({'language': language, 'code': code})
+        if self.on_code_block:
+            self.on_code_block(language, code, index)
+
+    def _scan_top_level(self, char: str) -> bool:
+        """
+        处理 JSON 值之外的字符
+
+        Returns:
+            该字符是否开始了一个 JSON 值（此时调用方按值内字符继续处理）
+        """
+        if self._pending_open:
+            if char.isspace():
+                self._pending_chars.append(char)
+                return False
+            opener = self._pending_open
+            self._pending_open = None
+            if char in _VALUE_STARTS[opener]:
+                self._stack.append(opener)
+                self._json_chars = self._pending_chars
+                self._expect_key = opener == '{'
+                self._top_level_keys = set()
+                return True
+            # 括号之后的空白中有换行时，当前字符位于行首
+            self._at_line_start = '\n' in self._pending_chars
+        if char in '{[':
+            self._pending_open = char
+            self._pending_chars = [char]
+            self._value_at_line_start = self._at_line_start
+        self._at_line_start = char == '\n' or (self._at_line_start and char.isspace())
+        return False
+
+    def _discard_value(self, reason: str) -> None:
+        """行中间开始的"JSON 值"无法解析：视为说明文字中的括号，丢弃而不中止"""
+        logger.debug(f"Ignoring bracketed prose in stream: {reason}")
+        self._stack = []
+        self._json_chars = []
+        self._in_string = False
+        self._escape = False
+        self._at_line_start = False
+
+    def _scan_json(self, segment: str) -> None:
+        """逐字符跟踪 JSON 嵌套、字符串和顶层键（只从确认为 JSON 值的 '{' / '[' 开始）"""
+        for char in segment:
+            if not self._stack and not self._scan_top_level(char):
+                continue
+
+            self._json_chars.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._expect_key and len(self._stack) == 1 and self._stack[0] == '{':
+                        self._on_top_level_key(''.join(self._string_chars))
+                else:
+                    self._string_chars.append(char)
+                continue
+
+            if char not in _VALUE_CHARS and not self._value_at_line_start:
+                # 行中间开始的值中出现 JSON 之外的字符（如 "see [1) below"）：是说明文字
+                self._discard_value(f"unexpected {char!r} in value")
+                continue
+            if char == '"':
+                self._in_string = True
+                self._string_chars = []
+            elif char in '{[':
+                self._stack.append(char)
+            elif char in '}]':
+                if self._stack[-1] != _CLOSERS[char]:
+                    reason = f"mismatched '{char}' closing '{self._stack[-1]}'"
+                    if not self._value_at_line_start:
+                        self._discard_value(reason)
+                        continue
+                    self._abort(reason)
+                self._stack.pop()
+                if not self._stack:
+                    self._complete_json()
+            elif len(self._stack) == 1 and self._stack[0] == '{':
+                if char == ',':
+                    self._expect_key = True
+                elif char == ':':
+                    self._expect_key = False
+
+    def _on_top_level_key(self, key: str) -> None:
+        self._top_level_keys.add(key)
+        info = self.schema_info
+        if not info or not info['fields']:
+            return
+        if info['forbid_extra'] and key not in info['fields']:
+            self._abort(f"unexpected field {key!r} for schema")
+        if (len(self._top_level_keys) >= MIN_KEYS_FOR_SCHEMA_CHECK
+                and not self._top_level_keys & info['fields']):
+            self._abort(f"fields {sorted(self._top_level_keys)} do not match schema")
+
+    def _complete_json(self) -> None:
+        raw = ''.join(self._json_chars)
+        self._json_chars = []
+        self._at_line_start = False
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError as e:
+            # 结构完整但内容无法解析（尾随逗号、单引号等）交给后续的修复逻辑处理，
+            # 只有在没有 schema 可以对照时才视为格式错误；行中间开始的视为说明文字
+            if self.schema_info is None:
+                if not self._value_at_line_start:
+                    self._discard_value(f"malformed JSON: {e.msg}")
+                    return
+                self._abort(f"malformed JSON: {e.msg}")
+            logger.debug(f"Streamed JSON not strictly valid, leaving to repair: {e.msg}")
+            self._seen_json = True
+            return
+
+        self._seen_json = True
+
+        info = self.schema_info
+        if isinstance(value, dict) and info and info['fields'] and not set(value) & info['fields']:
+            self._abort(f"JSON object fields {sorted(value)[:5]} do not match schema")
+
+        self.json_values.append(value)
+        if self.on_json:
+            self.on_json(value)
+
+
+class CodeBlockWriter:
+    """
+    代码块写入器：第一个匹配语言的代码块闭合时立即写入目标文件
+
+    用法：
+        writer = CodeBlockWriter(code_file_path)
+        parser = StreamingOutputParser(mode='code', on_code_block=writer)
+    """
+
+    def __init__(self, file_path: str, languages: Iterable[str] = ('tsx', 'jsx', 'typescript', 'javascript', 'ts', 'js', '')):
+        self.file_path = file_path
+        self.languages = set(languages)
+        self.written = False
+
+    def __call__(self, language: str, code: str, index: int) -> None:
+        if self.written or language not in self.languages or not code.strip():
+            return
+        path = Path(self.file_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(code.strip() + '\n', encoding='utf-8')
+        self.written = True
+        logger.info(f"Wrote streamed code block ({len(code)} chars) to {self.file_path}")
+
+
+def consume_stream(chunks: Iterable[Any], parser: StreamingOutputParser) -> Dict[str, Any]:
+    """
+    消费流式输出，无效时中止生成
+
+    中止时关闭底层迭代器（LangChain/OpenAI 的流式迭代器关闭后会断开连接，不再生成剩余 token）。
+
+    Args:
+        chunks: 模型的流式输出迭代器
+        parser: 解析器
+
+    Returns:
+        {text, aborted, reason, code_blocks, json_values}
+    """
+    iterator = iter(chunks)
+    aborted = False
+    reason = ''
+    try:
+        for chunk in iterator:
+            parser.feed(chunk)
+        parser.close()
+    except StreamAborted as e:
+        aborted = True
+        reason = e.reason
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close:
+            close()
+
+    return {
+        'text': parser.text,
+        'aborted': aborted,
+        'reason': reason,
+        'code_blocks': parser.code_blocks,
+        'json_values': parser.json_values,
+    }
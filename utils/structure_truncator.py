@@ -0,0 +1,311 @@
+"""
+结构感知的内容截断工具
+使用线性扫描的轻量 tokenizer（HTL 元素边界、JS/Java 花括号深度、CSS 规则边界）
+在结构边界处截断，并为被截掉的部分生成结构概要（签名、元素大纲、选择器），
+让 LLM 在内容被截断时仍能看到代码的整体形状
+"""
+import re
+from typing import Iterator, List, Optional, Tuple
+
+# 文件类型 → 结构类型
+STRUCTURE_KINDS = {
+    'htl': 'markup',
+    'html': 'markup',
+    'xml': 'markup',
+    'dialog': 'markup',
+    'config': 'markup',
+    'js': 'brace',
+    'jsx': 'brace',
+    'javascript': 'brace',
+    'ts': 'brace',
+    'tsx': 'brace',
+    'java': 'brace',
+    'css': 'css',
+    'less': 'css',
+    'scss': 'css',
+}
+
+# 截断位置至少保留的比例（结构边界过于靠前时退回按行截断）
+MIN_KEEP_RATIO = 0.5
+
+# 结构概要中 HTL 元素大纲的最大深度
+MAX_OUTLINE_DEPTH = 6
+
+# HTML 空元素（没有闭合标签）
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'source', 'track', 'wbr',
+}
+
+# JS/Java：注释、字符串和结构符号（字符串和注释整体匹配，其中的花括号不计入深度）
+_BRACE_TOKEN = re.compile(
+    r'//[^\n]*'
+    r'|/\*.*?(?:\*/|\Z)'
+    r'|"(?:[^"\\\n]|\\.)*"?'
+    r"|'(?:[^'\\\n]|\\.)*'?"
+    r'|`(?:[^`\\]|\\.)*`?'
+    r'|[{};]',
+    re.DOTALL
+)
+
+# CSS/LESS/SCSS：注释、字符串和规则边界
+_CSS_TOKEN = re.compile(
+    r'/\*.*?(?:\*/|\Z)'
+    r'|"(?:[^"\\\n]|\\.)*"?'
+    r"|'(?:[^'\\\n]|\\.)*'?"
+    r'|[{};]',
+    re.DOTALL
+)
+
+# HTL/XML：注释和标签
+# 属性部分（包括引号中的值）不跨越 '<'；标签名后的否定前瞻禁止名称让出字符，
+# 属性的各分支首字符互斥且每次只匹配一个字符或一个引号值，没有嵌套量词：
+# 未闭合的 '<x' 最多扫描到下一个 '<'，整体仍为线性时间（不使用 Python 3.11 才支持的占有量词）
+_MARKUP_TOKEN = re.compile(
+    r'<!--.*?(?:-->|\Z)'
+    r'|<(/?)([A-Za-z][\w:.-]*)(?![\w:.-])((?:[^<>"\'/]|/(?!>)|"[^"<]*"|\'[^\'<]*\')*)(/?)>',
+    re.DOTALL
+)
+
+# 控制流/表达式代码块（不属于签名，不写入结构概要）
+_NON_SIGNATURE = re.compile(
+    r'^(?:(?:else\s+)?if|else|for|while|switch|try|catch|finally|do|return|synchronized)\b'
+    r'|[=(,:?]$|=>$'
+)
+
+# 类型声明代码块（其中的字段声明写入结构概要）
+_TYPE_DECLARATION = re.compile(r'\b(?:class|interface|enum|record)\s+\w+')
+
+# 元素大纲中保留的关键属性
+_KEY_ATTRIBUTE = re.compile(
+    r'((?:data-sly-[\w.-]+|class|id|jcr:primaryType|sling:resourceType|name))\s*=\s*("[^"]*"|\'[^\']*\')'
+)
+
+
+def detect_structure_kind(content: str, file_type: Optional[str] = None) -> str:
+    """
+    确定内容的结构类型
+
+    Args:
+        content: 文件内容
+        file_type: 文件类型（htl, js, java, css 等，None 表示根据内容猜测）
+
+    Returns:
+        'markup'、'brace'、'css' 或 'text'
+    """
+    if file_type and file_type.lower() in STRUCTURE_KINDS:
+        return STRUCTURE_KINDS[file_type.lower()]
+
+    head = content[:2000].lstrip()
+    if head.startswith('<'):
+        return 'markup'
+    if '{' in head:
+        return 'brace'
+    return 'text'
+
+
+def _scan_braces(content: str, start: int, end: int,
+                 pattern: re.Pattern) -> Iterator[Tuple[str, int]]:
+    """
+    扫描花括号类结构符号
+
+    Yields:
+        (token, position)：token 为 '{'、'}'、';'（符号位置），
+        或 'comment'、'string'（注释/字符串的结束位置）
+    """
+    for match in pattern.finditer(content, start, end):
+        token = match.group()
+        if token in '{};':
+            yield token, match.start()
+        elif token.startswith(('//', '/*')):
+            yield 'comment', match.end()
+        else:
+            yield 'string', match.end()
+
+
+def _scan_markup(content: str, start: int, end: int) -> Iterator[Tuple[str, int, int, str, str]]:
+    """
+    扫描标签
+
+    Yields:
+        (kind, start, end, tag_name, attributes)：kind 为 'open'、'close' 或 'void'
+    """
+    for match in _MARKUP_TOKEN.finditer(content, start, end):
+        tag_name = match.group(2)
+        if tag_name is None:
+            continue
+        if match.group(1):
+            yield 'close', match.start(), match.end(), tag_name, ''
+        elif match.group(4) or tag_name.lower() in VOID_ELEMENTS:
+            yield 'void', match.start(), match.end(), tag_name, match.group(3)
+        else:
+            yield 'open', match.start(), match.end(), tag_name, match.group(3)
+
+
+def find_cut_position(content: str, limit: int, kind: str) -> Tuple[int, int]:
+    """
+    在 limit 之前找到最合适的结构边界
+
+    优先选择深度最浅的边界（顶层函数/规则/元素结束处），
+    若该边界保留的内容不足 MIN_KEEP_RATIO，则退回到更深的边界或最后一个换行。
+
+    Args:
+        content: 文件内容
+        limit: 最大保留长度
+        kind: 结构类型
+
+    Returns:
+        (cut_position, depth_at_cut)
+    """
+    limit = min(limit, len(content))
+    # boundaries[depth] = 该深度下最后一个边界位置
+    boundaries = {}
+    depth = 0
+
+    if kind in ('brace', 'css'):
+        pattern = _BRACE_TOKEN if kind == 'brace' else _CSS_TOKEN
+        for token, pos in _scan_braces(content, 0, limit, pattern):
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth = max(depth - 1, 0)
+                boundaries[depth] = pos + 1
+            elif token == ';':
+                boundaries[depth] = pos + 1
+
+    elif kind == 'markup':
+        for tag_kind, _, tag_end, _, _ in _scan_markup(content, 0, limit):
+            if tag_kind == 'open':
+                depth += 1
+                continue
+            if tag_kind == 'close':
+                depth = max(depth - 1, 0)
+            boundaries[depth] = tag_end
+
+    min_keep = int(limit * MIN_KEEP_RATIO)
+    for boundary_depth in sorted(boundaries):
+        if boundaries[boundary_depth] >= min_keep:
+            return boundaries[boundary_depth], boundary_depth
+
+    newline = content.rfind('\n', 0, limit)
+    if newline >= min_keep:
+        return newline, -1
+    return limit, -1
+
+
+def build_skeleton(content: str, kind: str, start: int = 0, max_chars: int = 5000) -> str:
+    """
+    为 content[start:] 生成结构概要
+
+    - JS/Java：深度 0/1 的函数、类、方法签名
+    - CSS：选择器和 @ 规则
+    - HTL/XML：元素大纲（标签名 + 关键属性，按深度缩进）
+
+    从头扫描以获得正确的嵌套上下文，只输出 start 之后的结构。
+
+    Args:
+        content: 文件内容
+        kind: 结构类型
+        start: 开始位置
+        max_chars: 概要的最大长度
+
+    Returns:
+        结构概要文本（没有可提取的结构时返回空字符串）
+    """
+    depth = 0
+    lines: List[str] = []
+    size = 0
+
+    def add_line(line: str) -> bool:
+        nonlocal size
+        if size + len(line) + 1 > max_chars:
+            lines.append("...")
+            return False
+        lines.append(line)
+        size += len(line) + 1
+        return True
+
+    if kind in ('brace', 'css'):
+        pattern = _BRACE_TOKEN if kind == 'brace' else _CSS_TOKEN
+        statement_start = 0
+        # 当前打开的各层代码块是否为类型声明
+        type_blocks: List[bool] = []
+        for token, pos in _scan_braces(content, 0, len(content), pattern):
+            if token == 'comment':
+                # 签名不包含前面的注释
+                statement_start = pos
+                continue
+            if token == 'string':
+                continue
+            signature = ' '.join(content[statement_start:pos].split())
+            if token == '{':
+                is_signature = pos >= start and depth <= 1 and signature and not (
+                    kind == 'brace' and _NON_SIGNATURE.search(signature)
+                )
+                if is_signature and not add_line(f"{'    ' * depth}{signature} {{ ... }}"):
+                    break
+                type_blocks.append(kind == 'brace' and bool(_TYPE_DECLARATION.search(signature)))
+                depth += 1
+            elif token == '}':
+                if type_blocks:
+                    type_blocks.pop()
+                depth = max(depth - 1, 0)
+            elif (token == ';' and pos >= start and signature
+                  and type_blocks and type_blocks[-1] and depth <= 2):
+                # 类型声明中的字段
+                if not add_line(f"{'    ' * depth}{signature};"):
+                    break
+            statement_start = pos + 1
+
+    elif kind == 'markup':
+        for tag_kind, tag_start, _, tag_name, attributes in _scan_markup(content, 0, len(content)):
+            if tag_kind == 'close':
+                depth = max(depth - 1, 0)
+                continue
+            if tag_start >= start and depth <= MAX_OUTLINE_DEPTH:
+                key_attributes = ' '.join(
+                    f"{name}={value}" for name, value in _KEY_ATTRIBUTE.findall(attributes)
+                )
+                outline = f"<{tag_name} {key_attributes}>" if key_attributes else f"<{tag_name}>"
+                if not add_line(f"{'  ' * depth}{outline}"):
+                    break
+            if tag_kind == 'open':
+                depth += 1
+
+    return "\n".join(lines)
+
+
+def truncate_with_skeleton(content: str, max_length: int,
+                           file_type: Optional[str] = None,
+                           marker: str = "... (内容已截断，超过最大长度限制)") -> str:
+    """
+    结构感知截断：在结构边界截断，并附加剩余部分的结构概要
+
+    Args:
+        content: 原始内容
+        max_length: 最大长度（包含结构概要）
+        file_type: 文件类型（None 表示根据内容猜测）
+        marker: 截断标记
+
+    Returns:
+        截断后的内容
+    """
+    if len(content) <= max_length:
+        return content
+
+    kind = detect_structure_kind(content, file_type)
+    # 正文最多占 80%，剩余空间留给结构概要
+    body_limit = int(max_length * 0.8) if kind != 'text' else max_length
+    cut, _ = find_cut_position(content, body_limit, kind)
+
+    result = content[:cut].rstrip() + f"\n\n{marker}"
+
+    if kind != 'text':
+        skeleton = build_skeleton(
+            content, kind, start=cut,
+            max_chars=max(max_length - len(result) - 64, 0)
+        )
+        if skeleton:
+            result += f"\n=== 剩余内容结构概要 ===\n{skeleton}"
+
+    return result
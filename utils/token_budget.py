@@ -0,0 +1,368 @@
+"""
+Prompt Token 预算管理
+估算各段落的 token 数，按文件优先级和依赖深度排序，在配置的输入预算内打包 prompt
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+from utils.aem_utils import AEM_FILE_PRIORITIES
+
+logger = logging.getLogger(__name__)
+
+# 非文件类段落的默认优先级（与 AEM_FILE_PRIORITIES 同一刻度，数字越小越重要）
+SECTION_KIND_PRIORITIES = {
+    'instructions': 0,          # 任务说明、转换规则
+    'file_analysis': None,      # 由文件类型决定
+    'dependency_analysis': None,
+    'bdl_source': 3,            # 选定的 BDL 组件源码
+    'template_summary': 4,      # data-sly-call 模板摘要
+    'css_summary': 5,           # CSS 摘要
+    'i18n_summary': 6,          # i18n 摘要
+}
+
+# 每增加一层依赖深度，优先级数值增加的量
+DEPTH_PENALTY = 2
+
+# 未提供摘要时，自动摘要占原文的最大比例
+DEFAULT_SUMMARY_RATIO = 0.2
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的 token 数（不依赖 tokenizer，线性时间）
+
+    ASCII 字符按约 4 字符/token 计算，CJK 等多字节字符按约 1 字符/token 计算。
+
+    Args:
+        text: 文本内容
+
+    Returns:
+        估算的 token 数
+    """
+    if not text:
+        return 0
+
+    char_count = len(text)
+    # CJK 字符在 UTF-8 中占 3 字节，多出的字节数约为多字节字符数的 2 倍
+    multibyte_count = (len(text.encode('utf-8', errors='ignore')) - char_count) // 2
+    ascii_count = max(char_count - multibyte_count, 0)
+
+    return ascii_count // 4 + multibyte_count + 1
+
+
+def summarize_text(text: str, max_tokens: int, file_type: Optional[str] = None) -> str:
+    """
+    生成文本的截断摘要（保留结构概要）
+
+    Args:
+        text: 原始文本
+        max_tokens: 摘要的最大 token 数
+        file_type: 文件类型（用于结构感知截断）
+
+    Returns:
+        摘要文本
+    """
+    from utils.prompt_cleaner import PromptCleaner
+
+    max_length = max(max_tokens * 4, 200)
+    if len(text) <= max_length:
+        return text
+
+    return PromptCleaner.truncate_long_content(text, max_length=max_length, file_type=file_type)
+
+
+def format_analysis_section(analysis: Dict[str, Any], summary_only: bool = False) -> str:
+    """
+    将文件分析结果格式化为 prompt 段落
+
+    Args:
+        analysis: 文件分析结果字典（FileAnalysisResult.model_dump() 的格式）
+        summary_only: 是否只输出摘要（文件、类型、用途、关键特性）
+
+    Returns:
+        格式化后的段落文本
+    """
+    lines = [
+        f"File: {analysis.get('file_path', 'unknown')}",
+        f"Type: {analysis.get('file_type', 'unknown')}",
+        f"Purpose: {analysis.get('purpose', 'N/A')}",
+    ]
+
+    key_features = analysis.get('key_features', [])
+    if key_features:
+        lines.append(f"Key Features: {', '.join(str(f) for f in key_features)}")
+
+    if summary_only:
+        return "\n".join(lines)
+
+    dependencies = analysis.get('dependencies', [])
+    if dependencies:
+        lines.append(f"Dependencies: {', '.join(str(d) for d in dependencies)}")
+
+    configuration = analysis.get('configuration', {})
+    if configuration:
+        lines.append(f"Configuration: {configuration}")
+
+    if analysis.get('analysis'):
+        lines.append(f"Analysis: {analysis['analysis']}")
+
+    return "\n".join(lines)
+
+
+class TokenBudgeter:
+    """
+    Prompt 段落预算打包器
+
+    用法：
+        budgeter = TokenBudgeter(max_tokens=60000)
+        budgeter.add_section("task", task_prompt, kind='instructions', required=True)
+        budgeter.add_analysis(analysis)
+        budgeter.add_analysis(dep_analysis, depth=1, kind='dependency_analysis')
+        packed = budgeter.pack()
+        prompt = packed['text']
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None, reserved_tokens: int = 0):
+        """
+        Args:
+            max_tokens: 输入 token 预算（None 表示使用 Config.MAX_INPUT_TOKENS）
+            reserved_tokens: 预留给外部内容（如系统提示词）的 token 数
+        """
+        if max_tokens is None:
+            from config import Config
+            max_tokens = Config.MAX_INPUT_TOKENS
+
+        self.max_tokens = max_tokens
+        self.reserved_tokens = reserved_tokens
+        self.sections: List[Dict[str, Any]] = []
+
+    @staticmethod
+    def get_section_priority(kind: str, file_type: Optional[str] = None, depth: int = 0) -> int:
+        """
+        计算段落优先级（数字越小越重要）
+
+        Args:
+            kind: 段落类型（见 SECTION_KIND_PRIORITIES）
+            file_type: 文件类型（用于文件分析类段落）
+            depth: 依赖深度（当前组件为 0）
+
+        Returns:
+            优先级数值
+        """
+        base = SECTION_KIND_PRIORITIES.get(kind)
+        if base is None:
+            base = AEM_FILE_PRIORITIES.get(file_type or '', 10)
+        return base + max(depth, 0) * DEPTH_PENALTY
+
+    def add_section(
+        self,
+        name: str,
+        content: str,
+        kind: str = 'file_analysis',
+        file_type: Optional[str] = None,
+        depth: int = 0,
+        required: bool = False,
+        summary: Optional[str] = None
+    ) -> None:
+        """
+        添加一个 prompt 段落
+
+        Args:
+            name: 段落名称（用于日志）
+            content: 段落完整内容
+            kind: 段落类型
+            file_type: 文件类型（用于优先级排序）
+            depth: 依赖深度
+            required: 是否必须完整保留（如任务说明）
+            summary: 预算不足时使用的摘要（None 表示自动截断生成）
+        """
+        if not content:
+            return
+
+        self.sections.append({
+            'name': name,
+            'content': content,
+            'kind': kind,
+            'file_type': file_type,
+            'depth': depth,
+            'required': required,
+            'summary': summary,
+            'priority': self.get_section_priority(kind, file_type, depth),
+            'tokens': estimate_tokens(content),
+        })
+
+    def add_analysis(self, analysis: Dict[str, Any], depth: int = 0,
+                     kind: str = 'file_analysis') -> None:
+        """
+        添加一个文件分析结果段落（摘要自动由用途和关键特性生成）
+
+        Args:
+            analysis: 文件分析结果字典
+            depth: 依赖深度
+            kind: 段落类型（file_analysis 或 dependency_analysis）
+        """
+        self.add_section(
+            name=analysis.get('file_path', 'unknown'),
+            content=format_analysis_section(analysis),
+            kind=kind,
+            file_type=analysis.get('file_type'),
+            depth=depth,
+            summary=format_analysis_section(analysis, summary_only=True)
+        )
+
+    @staticmethod
+    def _deduplicate(sections: List[Dict[str, Any]]):
+        """跨段落去重：重复内容块只在优先级最高的段落中保留原文（修改传入的段落副本）"""
+        from utils.prompt_dedup import PromptDeduplicator
+
+        deduplicator = PromptDeduplicator()
+        contents = deduplicator.deduplicate(
+            [section['content'] for section in sections],
+            [-1 if section['required'] else section['priority'] for section in sections]
+        )
+        for section, content in zip(sections, contents):
+            if content != section['content']:
+                section['content'] = content
+                section['tokens'] = estimate_tokens(content)
+
+        if deduplicator.stats['duplicates']:
+            logger.info(deduplicator.report())
+
+        return deduplicator
+
+    @staticmethod
+    def _expand_degraded_blocks(sections: List[Dict[str, Any]], deduplicator,
+                                states: List[str], costs: List[int]) -> bool:
+        """
+        原文所在段落被降级为摘要时，在优先级最高的保留完整内容的引用段落中还原原文
+
+        原文所在段落被丢弃时不还原（引用它的段落优先级更低，同样已被丢弃）
+
+        Returns:
+            是否还原了任何内容块（还原后需要重新检查预算）
+        """
+        expanded = False
+        for block_id, holder in list(deduplicator.holders.items()):
+            if states[holder] != 'summary':
+                continue
+            for i in sorted(range(len(sections)), key=lambda i: (sections[i]['priority'], i)):
+                if states[i] == 'full' and block_id in deduplicator.references.get(i, {}):
+                    section = sections[i]
+                    section['content'] = deduplicator.expand_references(section['content'], i, [block_id])
+                    section['tokens'] = estimate_tokens(section['content'])
+                    costs[i] = section['tokens']
+                    expanded = True
+                    break
+        return expanded
+
+    def pack(self, separator: str = "\n\n", deduplicate: bool = True) -> Dict[str, Any]:
+        """
+        在预算内打包所有段落
+
+        策略：
+        1. 跨段落去重（重复内容块替换为引用）
+        2. 必需段落始终完整保留
+        3. 超出预算时，从优先级最低的段落开始降级为摘要
+        4. 仍超出预算时，从优先级最低的段落开始丢弃
+        5. 重复块原文所在段落被降级时，在引用它的完整段落中还原原文，
+           还原的内容计入预算后重复 3~4
+        6. 输出保持段落的添加顺序，保证 prompt 布局稳定
+
+        去重和还原只修改段落的副本，多次调用 pack() 的结果相同
+
+        Args:
+            separator: 段落分隔符
+            deduplicate: 是否跨段落去重
+
+        Returns:
+            打包结果字典：text, tokens, budget, full, summarized, dropped, dedup
+        """
+        budget = self.max_tokens - self.reserved_tokens
+        sections = [dict(section) for section in self.sections]
+        deduplicator = self._deduplicate(sections) if deduplicate and len(sections) > 1 else None
+
+        # 每个段落的当前状态：full / summary / dropped
+        states = ['full'] * len(sections)
+        costs = [section['tokens'] for section in sections]
+        total = sum(costs)
+
+        # 可降级的段落，按优先级从低到高（数值从大到小）排序；同优先级时后添加的先降级
+        optional = sorted(
+            (i for i, section in enumerate(sections) if not section['required']),
+            key=lambda i: (sections[i]['priority'], i),
+            reverse=True
+        )
+
+        while True:
+            # 第一轮：降级为摘要
+            for i in optional:
+                if total <= budget:
+                    break
+                if states[i] != 'full':
+                    continue
+                section = sections[i]
+                summary = section['summary']
+                if summary is None:
+                    summary = summarize_text(
+                        section['content'],
+                        max(int(section['tokens'] * DEFAULT_SUMMARY_RATIO), 50),
+                        file_type=section['file_type']
+                    )
+                    section['summary'] = summary
+                summary_cost = estimate_tokens(summary)
+                if summary_cost < costs[i]:
+                    total -= costs[i] - summary_cost
+                    costs[i] = summary_cost
+                    states[i] = 'summary'
+
+            # 第二轮：丢弃
+            for i in optional:
+                if total <= budget:
+                    break
+                if states[i] == 'dropped':
+                    continue
+                total -= costs[i]
+                costs[i] = 0
+                states[i] = 'dropped'
+
+            if not deduplicator or not self._expand_degraded_blocks(sections, deduplicator, states, costs):
+                break
+            # 还原的原文计入预算后重新检查（可能需要继续降级）
+            total = sum(costs)
+
+        parts = []
+        report = {'full': [], 'summarized': [], 'dropped': []}
+        for section, state in zip(sections, states):
+            if state == 'full':
+                parts.append(section['content'])
+                report['full'].append(section['name'])
+            elif state == 'summary':
+                parts.append(section['summary'])
+                report['summarized'].append(section['name'])
+            else:
+                report['dropped'].append(section['name'])
+
+        if report['summarized']:
+            logger.info(
+                f"Token budget: summarized {len(report['summarized'])} section(s): "
+                f"{', '.join(report['summarized'])}"
+            )
+        if report['dropped']:
+            logger.warning(
+                f"Token budget: dropped {len(report['dropped'])} section(s): "
+                f"{', '.join(report['dropped'])}"
+            )
+        if total > budget:
+            logger.warning(
+                f"Token budget exceeded by required sections: {total} > {budget} tokens"
+            )
+
+        logger.debug(f"Token budget: packed {total}/{budget} tokens")
+
+        return {
+            'text': separator.join(parts),
+            'tokens': total,
+            'budget': budget,
+            'dedup': deduplicator.stats if deduplicator else {},
+            **report
+        }